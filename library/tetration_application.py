@@ -61,7 +61,9 @@ options:
     required: true
     type: string
 
-extends_documentation_fragment: tetration_doc_common
+extends_documentation_fragment:
+- tetration_doc_common
+- tetration_doc_common.preloaded
 
 notes:
 - Requires the requests Python module.
@@ -183,7 +185,8 @@ def main():
         strict_validation=dict(type='bool', required=False, default=False),
         primary=dict(type='bool', required=False),
         state=dict(required=True, choices=['present', 'absent']),
-        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC)
+        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC),
+        tetration_preloaded=dict(type='dict', required=False)
     )
 
     module = AnsibleModule(
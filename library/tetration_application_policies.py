@@ -0,0 +1,463 @@
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = '''
+---
+module: tetration_application_policies
+
+short_description: Reconciles all the policies of an application in one task
+
+version_added: '2.9'
+
+description:
+- Makes the absolute and default policies of an application, and their l4 params,
+  match a list of desired policies
+- The application, scopes, inventory filters and policies are downloaded once and
+  indexed, and only the policies and l4 params that are missing, or with C(purge)
+  no longer listed, are added or deleted
+- Changes are sent in batches, with the requests of a batch sent concurrently
+
+options:
+  app_id:
+    description:
+    - The id for the Application to which the policies belong
+    required: true
+    type: string
+  version:
+    description:
+    - Indicates the version of the Application to which the policies belong
+    required: true
+    type: string
+  policies:
+    description:
+    - List of the desired policies of the application
+    - Like with C(tetration_application_policy), a policy is identified by its
+      C(rank), C(priority), C(policy_action), consumer and provider
+    required: true
+    type: list
+    elements: dict
+    suboptions:
+      consumer_filter_id:
+        description:
+        - ID of a scope or inventory filter used as the consumer of the policy
+        - Either C(consumer_filter_id) or C(consumer_filter_name) is required
+        type: string
+      consumer_filter_name:
+        description:
+        - Name of a scope or inventory filter used as the consumer of the policy
+        - Either C(consumer_filter_id) or C(consumer_filter_name) is required
+        type: string
+      provider_filter_id:
+        description:
+        - ID of a scope or inventory filter used as the provider of the policy
+        - Either C(provider_filter_id) or C(provider_filter_name) is required
+        type: string
+      provider_filter_name:
+        description:
+        - Name of a scope or inventory filter used as the provider of the policy
+        - Either C(provider_filter_id) or C(provider_filter_name) is required
+        type: string
+      policy_action:
+        choices: [ALLOW, DENY]
+        description: Whether traffic is allowed or dropped between the consumer and provider
+        required: true
+        type: string
+      priority:
+        description: Used to sort policy
+        required: true
+        type: int
+      rank:
+        choices: [DEFAULT, ABSOLUTE]
+        description: Policy rank
+        required: true
+        type: string
+      l4_params:
+        description:
+        - List of the desired l4 params of the policy
+        type: list
+        elements: dict
+        suboptions:
+          proto_id:
+            description:
+            - Protocol Integer value (NULL means all protocols)
+            - Mutually exclusive to C(proto_name)
+            type: int
+          proto_name:
+            description:
+            - Protocol name (Any, TCP, UDP, ICMP)
+            - Mutually exclusive to C(proto_id)
+            type: string
+          start_port:
+            description:
+            - Start port of the range, required for TCP and UDP
+            type: int
+          end_port:
+            description:
+            - End port of the range, required for TCP and UDP
+            type: int
+          description:
+            description: Short string about this proto and port
+            type: string
+  purge:
+    description:
+    - Deletes the policies of the application that are not listed in C(policies),
+      and the l4 params of listed policies that are not listed in their C(l4_params)
+    default: false
+    type: bool
+  batch_size:
+    description:
+    - Number of policies changed per batch, the module stops after the first
+      batch that fails
+    default: 100
+    type: int
+  max_concurrency:
+    description:
+    - Maximum number of requests in flight at once
+    default: 8
+    type: int
+
+extends_documentation_fragment:
+- tetration_doc_common
+- tetration_doc_common.preloaded
+
+notes:
+- Requires the `requests` Python module.
+- Policies are only added or deleted, like with C(tetration_application_policy) no updates
+  are possible
+- The l4 params of one policy are changed one after the other, the l4 params of
+  different policies concurrently
+- Supports check mode, the planned changes are returned in C(counts)
+
+requirements:
+- requests
+- 'Required API Permission(s): app_policy_management'
+'''
+
+EXAMPLES = '''
+- name: Migrate the policies of a workspace
+  tetration_application_policies:
+    app_id: 59836821755f02724cbb54fb
+    version: v0
+    purge: true
+    policies:
+      - consumer_filter_name: ACME:Example:Scope2
+        provider_filter_name: ACME:Example:Scope1
+        policy_action: ALLOW
+        priority: 100
+        rank: ABSOLUTE
+        l4_params:
+          - proto_name: TCP
+            start_port: 443
+            end_port: 443
+          - proto_name: ICMP
+      - consumer_filter_name: ACME:Example:Scope2
+        provider_filter_name: ACME:Example:Scope3
+        policy_action: DENY
+        priority: 200
+        rank: DEFAULT
+    provider: "{{ provider_info }}"
+'''
+
+RETURN = '''
+---
+counts:
+  description:
+  - Number of policies C(added), C(deleted) and C(unchanged), and of l4 params
+    C(l4_params_added) and C(l4_params_deleted)
+  - In check mode, the changes that would be made
+  returned: always
+  type: dict
+failures:
+  description:
+  - Requests that failed, with the C(method) and C(route) of the request, and the
+    C(code) and C(msg) of the error
+  - The batches after the first failure are not applied
+  returned: when the module failed to change a policy
+  type: list
+  elements: dict
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.tetration import TetrationApiError
+from ansible.module_utils.tetration import TetrationApiModule
+from ansible.module_utils.tetration_constants import TETRATION_API_APPLICATIONS
+from ansible.module_utils.tetration_constants import TETRATION_API_SCOPES
+from ansible.module_utils.tetration_constants import TETRATION_API_INVENTORY_FILTER
+from ansible.module_utils.tetration_constants import TETRATION_API_APPLICATION_POLICIES
+from ansible.module_utils.tetration_constants import TETRATION_API_PROTOCOLS
+from ansible.module_utils.tetration_constants import TETRATION_PROVIDER_SPEC
+from ansible.module_utils.tetration_index import NameIndex
+from ansible.module_utils.tetration_index import PolicyIndex
+from ansible.module_utils.tetration_index import l4_param_key
+
+RANK_ROUTES = {'ABSOLUTE': 'absolute_policies', 'DEFAULT': 'default_policies'}
+
+
+class PolicyChanges(object):
+    """
+    The requests that bring one policy to its desired state: the POST creating
+    it when it is missing, then the l4 params to delete and to add. The l4
+    params of a policy are sent one after the other as each one rewrites the
+    l4 params of the policy on the cluster.
+    """
+
+    def __init__(self, policy_id=None, create_payload=None):
+        self.policy_id = policy_id
+        self.create_payload = create_payload
+        self.l4_deletes = []
+        self.l4_adds = []
+
+    def l4_calls(self):
+        calls = []
+        for l4_param_id in self.l4_deletes:
+            route = f"{TETRATION_API_APPLICATION_POLICIES}/{self.policy_id}/l4_params/{l4_param_id}"
+            calls.append(('DELETE', route, None, {'create_exclusion_filter': False}))
+        for l4_payload in self.l4_adds:
+            route = f"{TETRATION_API_APPLICATION_POLICIES}/{self.policy_id}/l4_params"
+            calls.append(('POST', route, None, l4_payload))
+        return calls
+
+    def __bool__(self):
+        return bool(self.create_payload or self.l4_deletes or self.l4_adds)
+
+
+def desired_l4_params(module, index, item):
+    ''' Returns the l4 params of the policy `item` as a key -> payload dictionary '''
+    proto_ids = {p['name']: p['value'] for p in TETRATION_API_PROTOCOLS}
+    l4_params = {}
+    for l4_param in item['l4_params'] or []:
+        proto_id = proto_ids[l4_param['proto_name']] if l4_param['proto_name'] else l4_param['proto_id']
+        if proto_id in (6, 17) and (l4_param['start_port'] is None or l4_param['end_port'] is None):
+            module.fail_json(msg=f"Item {index} of policies: TCP and UDP l4 params require start_port and end_port")
+        payload = {
+            'proto': proto_id,
+            'start_port': l4_param['start_port'],
+            'end_port': l4_param['end_port'],
+            'description': l4_param['description']
+        }
+        l4_params[l4_param_key(proto_id, l4_param['start_port'], l4_param['end_port'])] = dict(
+            (k, v) for k, v in payload.items() if v is not None or k == 'proto')
+    return l4_params
+
+
+def plan_changes(module, names, existing):
+    ''' Returns the PolicyChanges of every listed policy that needs any, the IDs of
+    the policies to delete and the number of unchanged policies
+    '''
+    changes = []
+    desired_keys = set()
+    unchanged = 0
+    for index, item in enumerate(module.params['policies']):
+        try:
+            consumer_id = names.resolve(item['consumer_filter_id'], item['consumer_filter_name'])
+            provider_id = names.resolve(item['provider_filter_id'], item['provider_filter_name'])
+        except ValueError as exc:
+            module.fail_json(msg=f"Item {index} of policies: {exc}")
+        if consumer_id is None:
+            module.fail_json(msg=f"Item {index} of policies: The provided consumer name or id is invalid")
+        if provider_id is None:
+            module.fail_json(msg=f"Item {index} of policies: The provided provider name or id is invalid")
+
+        key = (item['rank'], item['priority'], item['policy_action'], consumer_id, provider_id)
+        if key in desired_keys:
+            module.fail_json(msg=f"Item {index} of policies is listed more than once")
+        desired_keys.add(key)
+        l4_params = desired_l4_params(module, index, item)
+
+        found_policies = existing.find(key)
+        if len(found_policies) >= 2:
+            module.fail_json(
+                msg=("Multiple policies found with the given criteria.  "
+                     "Cannot use this module if multiple policies match the "
+                     "`priority`, `action`, `consumer`, and `provider` fields.  "
+                     f"Duplicate policies: {found_policies}"))
+
+        if not found_policies:
+            policy_changes = PolicyChanges(create_payload={
+                'version': module.params['version'],
+                'rank': item['rank'],
+                'policy_action': item['policy_action'],
+                'priority': item['priority'],
+                'consumer_filter_id': consumer_id,
+                'provider_filter_id': provider_id,
+            })
+            policy_changes.l4_adds = list(l4_params.values())
+        else:
+            policy = found_policies[0]
+            policy_changes = PolicyChanges(policy_id=policy['id'])
+            existing_keys = set()
+            for l4_param in policy.get('l4_params') or []:
+                port = l4_param.get('port') or [None, None]
+                l4_key = l4_param_key(l4_param.get('proto'), port[0], port[1])
+                existing_keys.add(l4_key)
+                if module.params['purge'] and l4_key not in l4_params:
+                    policy_changes.l4_deletes.append(l4_param['id'])
+            policy_changes.l4_adds = [p for k, p in l4_params.items() if k not in existing_keys]
+
+        if policy_changes:
+            changes.append(policy_changes)
+        else:
+            unchanged += 1
+
+    deletes = []
+    if module.params['purge']:
+        for key, policies in existing.items():
+            if key not in desired_keys:
+                deletes.extend(policy['id'] for policy in policies)
+    return changes, deletes, unchanged
+
+
+def batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def run_calls(module, tet_module, calls, failures):
+    ''' Sends `calls` concurrently, recording the calls that failed in `failures`
+    Returns the responses, the TetrationApiError of the failed calls
+    '''
+    responses = tet_module.run_many(calls, max_concurrency=module.params['max_concurrency'], fail_on_error=False)
+    for call, response in zip(calls, responses):
+        if isinstance(response, TetrationApiError):
+            failures.append(dict(method=call[0], route=call[1], code=response.status_code, msg=response.text))
+    return responses
+
+
+def apply_batch(module, tet_module, batch, counts, failures):
+    ''' Creates the missing policies of `batch`, then changes their l4 params '''
+    creates = [c for c in batch if c.create_payload]
+    add_policy_route = f"{TETRATION_API_APPLICATIONS}/{module.params['app_id']}/policies"
+    responses = run_calls(module, tet_module, [('POST', add_policy_route, None, c.create_payload) for c in creates],
+                          failures)
+    for policy_changes, response in zip(creates, responses):
+        if not isinstance(response, TetrationApiError):
+            policy_changes.policy_id = response['id']
+            counts['added'] += 1
+
+    # The n-th l4 param request of every policy is sent at once, so the
+    # requests of one policy never overlap
+    pending = [c.l4_calls() for c in batch if c.policy_id]
+    while any(pending):
+        calls = [policy_calls.pop(0) for policy_calls in pending if policy_calls]
+        for call, response in zip(calls, run_calls(module, tet_module, calls, failures)):
+            if not isinstance(response, TetrationApiError):
+                counts['l4_params_added' if call[0] == 'POST' else 'l4_params_deleted'] += 1
+
+
+def main():
+    valid_proto_names = [proto['name'] for proto in TETRATION_API_PROTOCOLS]
+    valid_proto_ids = [proto['value'] for proto in TETRATION_API_PROTOCOLS]
+
+    l4_param_spec = dict(
+        proto_id=dict(type='int', required=False, choices=valid_proto_ids),
+        proto_name=dict(type='str', required=False, choices=valid_proto_names),
+        start_port=dict(type='int', required=False),
+        end_port=dict(type='int', required=False),
+        description=dict(type='str', required=False),
+    )
+
+    policy_spec = dict(
+        consumer_filter_id=dict(type='str', required=False),
+        consumer_filter_name=dict(type='str', required=False),
+        provider_filter_id=dict(type='str', required=False),
+        provider_filter_name=dict(type='str', required=False),
+        policy_action=dict(type='str', required=True, choices=['ALLOW', 'DENY']),
+        priority=dict(type='int', required=True),
+        rank=dict(type='str', required=True, choices=['DEFAULT', 'ABSOLUTE']),
+        l4_params=dict(type='list', elements='dict', required=False, options=l4_param_spec,
+                       mutually_exclusive=[['proto_name', 'proto_id']],
+                       required_one_of=[['proto_name', 'proto_id']],
+                       required_together=[['start_port', 'end_port']]),
+    )
+
+    module_args = dict(
+        app_id=dict(type='str', required=True),
+        version=dict(type='str', required=True),
+        policies=dict(type='list', elements='dict', required=True, options=policy_spec,
+                      mutually_exclusive=[
+                          ['consumer_filter_id', 'consumer_filter_name'],
+                          ['provider_filter_id', 'provider_filter_name']
+                      ],
+                      required_one_of=[
+                          ['consumer_filter_id', 'consumer_filter_name'],
+                          ['provider_filter_id', 'provider_filter_name']
+                      ]),
+        purge=dict(type='bool', required=False, default=False),
+        batch_size=dict(type='int', required=False, default=100),
+        max_concurrency=dict(type='int', required=False, default=8),
+        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC),
+        tetration_preloaded=dict(type='dict', required=False)
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    if module.params['batch_size'] < 1:
+        module.fail_json(msg='batch_size must be at least 1')
+
+    tet_module = TetrationApiModule(module)
+
+    # =========================================================================
+    # Download the application, the scopes, the inventory filters and both
+    # policy lists at once, they are all indexed in memory from here on
+    route = f"{TETRATION_API_APPLICATIONS}/{module.params['app_id']}"
+    ranks = sorted(RANK_ROUTES)
+    calls = [('GET', route), ('GET', TETRATION_API_SCOPES), ('GET', TETRATION_API_INVENTORY_FILTER)]
+    calls.extend(('GET', f"{route}/{RANK_ROUTES[rank]}") for rank in ranks)
+    existing_app, existing_app_scopes, existing_inventory_filters, *existing_policies = tet_module.run_many(
+        calls, max_concurrency=module.params['max_concurrency'])
+
+    if not existing_app:
+        module.fail_json(msg='Unable to find existing application id')
+
+    try:
+        names = NameIndex(existing_app_scopes, existing_inventory_filters)
+    except ValueError as exc:
+        module.fail_json(msg=str(exc))
+    existing = PolicyIndex(dict(zip(ranks, existing_policies)))
+
+    changes, deletes, unchanged = plan_changes(module, names, existing)
+
+    result = {
+        'changed': bool(changes or deletes),
+        'counts': {
+            'added': 0,
+            'deleted': 0,
+            'unchanged': unchanged,
+            'l4_params_added': 0,
+            'l4_params_deleted': 0
+        }
+    }
+    counts = result['counts']
+
+    if module.check_mode:
+        counts['added'] = sum(1 for c in changes if c.create_payload)
+        counts['deleted'] = len(deletes)
+        counts['l4_params_added'] = sum(len(c.l4_adds) for c in changes)
+        counts['l4_params_deleted'] = sum(len(c.l4_deletes) for c in changes)
+        module.exit_json(**result)
+
+    # =========================================================================
+    # Apply the deletes first, then the adds, one batch at a time
+    failures = []
+    for batch in batches(deletes, module.params['batch_size']):
+        calls = [('DELETE', f"{TETRATION_API_APPLICATION_POLICIES}/{policy_id}") for policy_id in batch]
+        responses = run_calls(module, tet_module, calls, failures)
+        counts['deleted'] += sum(1 for r in responses if not isinstance(r, TetrationApiError))
+        if failures:
+            module.fail_json(msg=f"Unable to delete {len(failures)} policies", failures=failures, **result)
+
+    for batch in batches(changes, module.params['batch_size']):
+        apply_batch(module, tet_module, batch, counts, failures)
+        if failures:
+            module.fail_json(msg=f"Unable to apply {len(failures)} policy changes", failures=failures, **result)
+
+    # Return result
+    module.exit_json(**result)
+
+
+if __name__ == '__main__':
+    main()
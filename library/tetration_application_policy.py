@@ -75,7 +75,9 @@ options:
     required: true
     type: string
 
-extends_documentation_fragment: tetration_doc_common
+extends_documentation_fragment:
+- tetration_doc_common
+- tetration_doc_common.preloaded
 
 notes:
 - Requires the `requests` Python module.
@@ -212,7 +214,8 @@ def main():
         policy_action=dict(type='str', required=True, choices=['ALLOW', 'DENY']),
         priority=dict(type='int', required=True),
         state=dict(required=True, choices=['present', 'absent', 'query']),
-        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC)
+        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC),
+        tetration_preloaded=dict(type='dict', required=False)
     )
 
     module = AnsibleModule(
@@ -0,0 +1,284 @@
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = '''
+---
+module: tetration_application_policy_ports_bulk
+
+short_description: Adds many ports to an application policy in one task
+
+version_added: '2.9'
+
+description:
+- Adds a list of protocols and port ranges to an application policy
+- The policy is fetched once and its ports are indexed by protocol and port range, so
+  only the ranges the policy does not have yet are added
+- The missing ranges are added one after the other, as each one rewrites the l4 params
+  of the policy on the cluster
+
+options:
+  policy_id:
+    description: Unique identifier for the policy the ports are added to
+    type: string
+    required: true
+  l4_params:
+    description: List of the protocols and port ranges to add to the policy
+    required: true
+    type: list
+    elements: dict
+    suboptions:
+      proto_id:
+        description:
+        - Protocol Integer value
+        - Mutually exclusive to C(proto_name)
+        type: int
+      proto_name:
+        description:
+        - Protocol name (Ex TCP, UDP, ICMP, ANY)
+        - Mutually exclusive to C(proto_id)
+        type: string
+      start_port:
+        description:
+        - Start port of the range
+        - Required when the protocol is TCP or UDP
+        type: int
+      end_port:
+        description:
+        - End port of the range
+        - Required when the protocol is TCP or UDP
+        type: int
+      description:
+        description: User defined description of the entry
+        type: string
+  skip_covered:
+    description:
+    - Does not add a range that lies within a range the policy already has, e.g. 443
+      when the policy has 400-500
+    - Ranges that only partially overlap a range of the policy are added and listed in
+      C(overlaps)
+    default: true
+    type: bool
+  merge_ranges:
+    description:
+    - Merges overlapping and adjacent ranges of the same protocol in C(l4_params) into
+      one range before adding them, e.g. 80-90 and 91-100 are added as 80-100
+    - The description of the first merged range is used
+    default: false
+    type: bool
+
+extends_documentation_fragment: tetration_doc_common
+
+notes:
+- Requires the `requests` Python module.
+- Ports are only added, use C(tetration_application_policy_ports) or C(tetration_application_policies)
+  to delete them
+- Supports check mode, the ports that would be added are returned in C(added)
+
+requirements:
+- requests
+- 'Required API Permission(s): app_policy_management'
+'''
+
+EXAMPLES = '''
+- name: Add the ports of a service to a policy
+  tetration_application_policy_ports_bulk:
+    policy_id: 5a2e8579497d4f415ea20e38
+    l4_params:
+      - proto_name: TCP
+        start_port: 443
+        end_port: 443
+      - proto_name: TCP
+        start_port: 8000
+        end_port: 8099
+      - proto_name: UDP
+        start_port: 53
+        end_port: 53
+      - proto_name: ICMP
+    provider: "{{ provider_info }}"
+
+- name: Add a long list of ports, merging adjacent ranges
+  tetration_application_policy_ports_bulk:
+    policy_id: 5a2e8579497d4f415ea20e38
+    l4_params: "{{ service_ports }}"
+    merge_ranges: true
+    provider: "{{ provider_info }}"
+'''
+
+RETURN = '''
+---
+added:
+  description:
+  - The ports added to the policy, or that would be added in check mode
+  - Each item has the C(proto), C(start_port), C(end_port) and C(description) sent
+  returned: always
+  type: list
+  elements: dict
+counts:
+  description:
+  - Number of ports C(added), C(existing) (the policy had the exact range), C(covered)
+    (a range of the policy contains it), C(duplicate) (listed more than once) and
+    C(merged) (merged into another range of the list)
+  returned: always
+  type: dict
+overlaps:
+  description:
+  - Ports added that partially overlap ports of the policy, with the C(l4_param) added
+    and the C(overlapping) l4 params of the policy
+  returned: always
+  type: list
+  elements: dict
+failures:
+  description: Ports that could not be added, with the C(l4_param) and the C(code) and C(msg) of the error
+  returned: when the module failed to add a port
+  type: list
+  elements: dict
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.tetration import TetrationApiError
+from ansible.module_utils.tetration import TetrationApiModule
+from ansible.module_utils.tetration_constants import TETRATION_API_APPLICATION_POLICIES
+from ansible.module_utils.tetration_constants import TETRATION_API_PROTOCOLS
+from ansible.module_utils.tetration_constants import TETRATION_PROVIDER_SPEC
+from ansible.module_utils.tetration_index import PortRangeIndex
+from ansible.module_utils.tetration_index import l4_param_key
+from ansible.module_utils.tetration_index import merge_port_ranges
+
+
+def desired_ranges(module):
+    ''' Returns the l4 params to add as payloads, without the duplicates '''
+    proto_ids = {p['name']: p['value'] for p in TETRATION_API_PROTOCOLS}
+    counts = {'duplicate': 0, 'merged': 0}
+    payloads = {}
+    for index, l4_param in enumerate(module.params['l4_params']):
+        proto_id = proto_ids[l4_param['proto_name']] if l4_param['proto_name'] else l4_param['proto_id']
+        if proto_id in (6, 17):
+            if l4_param['start_port'] is None or l4_param['end_port'] is None:
+                module.fail_json(msg=f"Item {index} of l4_params: TCP and UDP require start_port and end_port")
+            if l4_param['start_port'] > l4_param['end_port']:
+                module.fail_json(msg=f"Item {index} of l4_params: start_port is greater than end_port")
+        key = l4_param_key(proto_id, l4_param['start_port'], l4_param['end_port'])
+        if key in payloads:
+            counts['duplicate'] += 1
+            continue
+        payloads[key] = {
+            'proto': proto_id,
+            'start_port': key[1],
+            'end_port': key[2],
+            'description': l4_param['description']
+        }
+
+    if module.params['merge_ranges']:
+        order = dict((key, index) for index, key in enumerate(payloads))
+        for proto in (6, 17):
+            ranges = [(p['start_port'], p['end_port'], k) for k, p in payloads.items() if p['proto'] == proto]
+            for start, end, keys in merge_port_ranges(ranges):
+                if len(keys) == 1:
+                    continue
+                first = payloads[min(keys, key=order.get)]
+                for key in keys:
+                    payloads.pop(key)
+                counts['merged'] += len(keys) - 1
+                payloads[(proto, start, end)] = dict(first, start_port=start, end_port=end)
+    return list(payloads.values()), counts
+
+
+def main():
+    valid_proto_names = [proto['name'] for proto in TETRATION_API_PROTOCOLS]
+    valid_proto_ids = [proto['value'] for proto in TETRATION_API_PROTOCOLS]
+
+    l4_param_spec = dict(
+        proto_id=dict(type='int', required=False, choices=valid_proto_ids),
+        proto_name=dict(type='str', required=False, choices=valid_proto_names),
+        start_port=dict(type='int', required=False),
+        end_port=dict(type='int', required=False),
+        description=dict(type='str', required=False),
+    )
+
+    module_args = dict(
+        policy_id=dict(type='str', required=True),
+        l4_params=dict(type='list', elements='dict', required=True, options=l4_param_spec,
+                       mutually_exclusive=[['proto_name', 'proto_id']],
+                       required_one_of=[['proto_name', 'proto_id']],
+                       required_together=[['start_port', 'end_port']]),
+        skip_covered=dict(type='bool', required=False, default=True),
+        merge_ranges=dict(type='bool', required=False, default=False),
+        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC)
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    tet_module = TetrationApiModule(module)
+
+    # =========================================================================
+    # Get current state of the object
+    route = f"{TETRATION_API_APPLICATION_POLICIES}/{module.params['policy_id']}"
+
+    existing_policy = tet_module.run_method('GET', route)
+    if not existing_policy:
+        module.fail_json(msg=f"Unable to find existing application policy with id: {module.params['policy_id']}")
+
+    existing_ranges = []
+    for l4_param in existing_policy['l4_params'] or []:
+        port = l4_param.get('port') or [None, None]
+        key = l4_param_key(l4_param.get('proto'), port[0], port[1])
+        existing_ranges.append(key + (l4_param,))
+    existing = PortRangeIndex(existing_ranges)
+
+    payloads, counts = desired_ranges(module)
+    counts.update({'added': 0, 'existing': 0, 'covered': 0})
+    result = {
+        'changed': False,
+        'added': [],
+        'counts': counts,
+        'overlaps': []
+    }
+
+    missing = []
+    for payload in payloads:
+        key = l4_param_key(payload['proto'], payload['start_port'], payload['end_port'])
+        if existing.exact(*key):
+            counts['existing'] += 1
+        elif module.params['skip_covered'] and existing.covering(*key):
+            counts['covered'] += 1
+        else:
+            missing.append(dict((k, v) for k, v in payload.items() if v is not None or k == 'proto'))
+            overlapping = existing.overlapping(*key) if payload['proto'] in (6, 17) else []
+            if overlapping:
+                result['overlaps'].append(dict(l4_param=missing[-1], overlapping=overlapping))
+
+    if missing:
+        result['changed'] = True
+    if module.check_mode or not missing:
+        result['added'] = missing
+        counts['added'] = len(missing)
+        module.exit_json(**result)
+
+    # =========================================================================
+    # Add the missing ports one after the other, each request rewrites the
+    # l4 params of the policy so concurrent ones could drop each other's port
+    route = f"{route}/l4_params"
+    calls = [('POST', route, None, payload) for payload in missing]
+    responses = tet_module.run_many(calls, max_concurrency=1, fail_on_error=False)
+
+    failures = []
+    for payload, response in zip(missing, responses):
+        if isinstance(response, TetrationApiError):
+            failures.append(dict(l4_param=payload, code=response.status_code, msg=response.text))
+        else:
+            result['added'].append(payload)
+    counts['added'] = len(result['added'])
+
+    if failures:
+        module.fail_json(msg=f"Unable to add {len(failures)} of {len(missing)} ports", failures=failures, **result)
+
+    # Return result
+    module.exit_json(**result)
+
+
+if __name__ == '__main__':
+    main()
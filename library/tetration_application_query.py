@@ -49,6 +49,15 @@ options:
         required: false
         default: false
         type: boolean
+    max_concurrency:
+        description:
+          - Maximum number of application details requested at the same time
+            when C(return_details) is true
+          - Details that could not be fetched are listed in C(failures) instead
+            of failing the whole search
+        required: false
+        default: 8
+        type: int
 
 extends_documentation_fragment: tetration_doc_common
 
@@ -75,6 +84,13 @@ EXAMPLES = '''
     return_details: true
     provider: "{{ provider_info }}"
 
+- name: Return the details of every primary application, 16 requests at a time
+  tetration_application_query:
+    is_primary: true
+    return_details: true
+    max_concurrency: 16
+    provider: "{{ provider_info }}"
+
 - name: Search for object with a value in the name and that are primary and enforcing
   tetration_application_query:
     app_name: partial
@@ -143,11 +159,18 @@ items_found:
     description: Number of items found when searching
     returned: always
     type: int
+failures:
+    description:
+      - Applications whose details could not be fetched, in search order
+      - Each item has the C(id) and C(name) of the application and the C(code) and C(msg) of the error
+    returned: when return_details is true and fetching any of the details failed
+    type: list of object
 '''
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.tetration_constants import TETRATION_API_APPLICATIONS
 from ansible.module_utils.tetration_constants import TETRATION_PROVIDER_SPEC
+from ansible.module_utils.tetration import TetrationApiError
 from ansible.module_utils.tetration import TetrationApiModule
 
 
@@ -159,6 +182,7 @@ def run_module():
         is_primary=dict(type='bool', required=False),
         is_enforcing=dict(type='bool', required=False),
         return_details=dict(type='bool', required=False, default=False),
+        max_concurrency=dict(type='int', required=False, default=8),
         provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC)
     )
 
@@ -190,6 +214,7 @@ def run_module():
     else:
         all_apps_response = tet_module.run_method('GET', TETRATION_API_APPLICATIONS)
 
+        matched_apps = []
         for app in all_apps_response:
             if module.params['app_name'] and module.params['app_name'] not in app['name']:
                 continue
@@ -198,12 +223,25 @@ def run_module():
             if module.params['is_enforcing'] is not None and module.params['is_enforcing'] != app['enforement_enabled']:
                 continue
 
-            if module.params['return_details']:
-                route = f"{TETRATION_API_APPLICATIONS}/{app['id']}/details"
-                details = tet_module.run_method('GET', route)
-                result['objects'].append(details)
-            else:
-                result['objects'].append(app)
+            matched_apps.append(app)
+
+        if module.params['return_details']:
+            # Fetch the details concurrently, results come back in search order
+            calls = [('GET', f"{TETRATION_API_APPLICATIONS}/{app['id']}/details") for app in matched_apps]
+            all_details = tet_module.run_many(
+                calls, max_concurrency=module.params['max_concurrency'], fail_on_error=False)
+
+            failures = []
+            for app, details in zip(matched_apps, all_details):
+                if isinstance(details, TetrationApiError):
+                    failures.append(dict(id=app['id'], name=app['name'], code=details.status_code, msg=details.text))
+                else:
+                    result['objects'].append(details)
+            if failures:
+                result['failures'] = failures
+                module.warn(f"Unable to fetch the details of {len(failures)} of {len(matched_apps)} applications")
+        else:
+            result['objects'] = matched_apps
 
         result['items_found'] = len(result['objects'])
         if result['objects']:
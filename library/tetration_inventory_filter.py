@@ -69,7 +69,9 @@ options:
     required: true
     type: string
 
-extends_documentation_fragment: tetration_doc_common
+extends_documentation_fragment:
+- tetration_doc_common
+- tetration_doc_common.preloaded
 
 notes:
 - Requires the `requests` Python module.
@@ -292,7 +294,8 @@ def run_module():
         primary=dict(type='bool', required=False, default=False),
         public=dict(type='bool', required=False, default=False),
         state=dict(choices=['present', 'absent', 'query'], required=True),
-        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC)
+        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC),
+        tetration_preloaded=dict(type='dict', required=False)
     )
 
     result = {
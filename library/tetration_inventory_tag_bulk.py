@@ -0,0 +1,300 @@
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+
+DOCUMENTATION = '''
+---
+module: tetration_inventory_tag_bulk
+
+short_description: Uploads user annotations for many IPs and subnets at once
+
+version_added: '2.9'
+
+description:
+- Uploads Cisco Tetration user annotations for any number of IP addresses and
+  subnets with a single CSV upload instead of one request per IP.
+- The CSV is built from C(tags) or read from the local file C(src) and streamed
+  to the cluster, so uploads with hundreds of thousands of rows are supported.
+- The module always reports a change unless the upload is empty, as the upload
+  API does not return what was modified.
+
+options:
+  root_scope_name:
+    description: Name of the root scope the annotations belong to
+    required: true
+    type: string
+  operation:
+    choices: [add, merge, delete]
+    default: merge
+    description:
+    - C(add) sets the annotations of each row, replacing any annotations the
+      IP or subnet already has
+    - C(merge) only updates the columns present in the upload and keeps the
+      other annotations of each IP or subnet
+    - C(delete) removes the annotations of each IP or subnet, attribute columns
+      are ignored
+    type: string
+  tags:
+    description:
+    - List of annotations to upload
+    - Each item needs the key C(ip) with an IP address or subnet, and can have
+      the key C(vrf) with the VRF of the IP
+    - All other keys of an item are annotation columns, items without a column
+      upload an empty value for it
+    - Mutually exclusive with C(src)
+    type: list
+    elements: dict
+  src:
+    description:
+    - Path of a CSV file on the host running the module to upload as is
+    - The first row holds the column names, starting with C(IP) and optionally
+      C(VRF)
+    - Mutually exclusive with C(tags)
+    type: path
+  only_changes:
+    description:
+    - Downloads the current annotations of the root scope first and uploads only
+      the rows that are new or change an annotation
+    - Rows are compared per IP/subnet, and per VRF when the upload has a VRF column
+    - With C(operation=delete) only IPs and subnets that have annotations are deleted
+    default: false
+    type: bool
+  prune:
+    description:
+    - Deletes the annotations of every IP and subnet of the root scope that is not
+      part of the upload
+    - Requires C(only_changes)
+    default: false
+    type: bool
+
+extends_documentation_fragment: tetration_doc_common
+
+notes:
+- Requires the `requests` Python module.
+- Uploads are not supported over the C(httpapi) connection plugin.
+
+requirements:
+- requests
+- 'Required API Permission(s): user_data_upload'
+'''
+
+EXAMPLES = '''
+- name: Assign or update annotations of many hosts
+  tetration_inventory_tag_bulk:
+    root_scope_name: Default
+    operation: merge
+    tags:
+      - ip: 172.16.1.10
+        location: us-dc-01
+        owner: user@company.com
+      - ip: 172.16.2.0/24
+        location: us-dc-02
+    provider: "{{ provider_info }}"
+
+- name: Upload the nightly CMDB export
+  tetration_inventory_tag_bulk:
+    root_scope_name: Default
+    operation: add
+    src: /var/exports/cmdb_annotations.csv
+    provider: "{{ provider_info }}"
+
+- name: Sync the nightly CMDB export, uploading only what changed since last night
+  tetration_inventory_tag_bulk:
+    root_scope_name: Default
+    operation: add
+    src: /var/exports/cmdb_annotations.csv
+    only_changes: true
+    prune: true
+    provider: "{{ provider_info }}"
+
+- name: Remove all annotations from a list of hosts
+  tetration_inventory_tag_bulk:
+    root_scope_name: Default
+    operation: delete
+    tags:
+      - ip: 172.16.1.10
+      - ip: 172.16.1.11
+    provider: "{{ provider_info }}"
+'''
+
+RETURN = '''
+---
+rows:
+  description: Number of rows uploaded, not counting the header rows
+  returned: always
+  type: int
+counts:
+  description: Number of C(new), C(changed), C(unchanged) and C(deleted) rows
+  returned: when only_changes is true
+  type: dict
+tet_warnings:
+  description: the response of the upload, containing any warnings encountered while setting annotations
+  returned: when the upload was sent
+  type: dict
+tet_delete_warnings:
+  description: the response of the upload deleting annotations when only_changes is true
+  returned: when annotations were deleted
+  type: dict
+'''
+
+import csv
+import os
+import tempfile
+
+from ipaddress import ip_address, ip_network
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.tetration import MultiPartOption
+from ansible.module_utils.tetration_annotations import AnnotationDiff
+from ansible.module_utils.tetration import TetrationApiModule
+from ansible.module_utils.tetration_constants import TETRATION_API_INVENTORY_TAG_DOWNLOAD
+from ansible.module_utils.tetration_constants import TETRATION_API_INVENTORY_TAG_UPLOAD
+from ansible.module_utils.tetration_constants import TETRATION_API_INVENTORY_TAG_UPLOAD_OPERATIONS
+from ansible.module_utils.tetration_constants import TETRATION_PROVIDER_SPEC
+
+
+def write_tags_csv(module, tags, csv_file):
+    ''' Writes `tags` as an annotation CSV, failing the module on invalid rows
+    '''
+    has_vrf = any('vrf' in tag for tag in tags)
+    columns = []
+    if module.params['operation'] != 'delete':
+        seen = set(['ip', 'vrf'])
+        for tag in tags:
+            for key in tag:
+                if key not in seen:
+                    seen.add(key)
+                    columns.append(key)
+
+    header = ['IP'] + (['VRF'] if has_vrf else []) + columns
+    writer = csv.writer(csv_file)
+    writer.writerow(header)
+    for index, tag in enumerate(tags):
+        if not tag.get('ip'):
+            module.fail_json(msg=f"Item {index} of tags has no ip")
+        try:
+            if '/' in str(tag['ip']):
+                ip_object = str(ip_network(tag['ip']))
+            else:
+                ip_object = str(ip_address(tag['ip']))
+        except ValueError:
+            module.fail_json(
+                msg=f"Invalid IPv4 or IPv6 address or subnet in item {index} of tags.  Value entered: {tag['ip']}")
+        row = [ip_object] + ([tag.get('vrf', '')] if has_vrf else [])
+        row.extend('' if tag.get(column) is None else tag[column] for column in columns)
+        writer.writerow(row)
+
+
+def count_rows(file_path):
+    with open(file_path, newline='') as f:
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+
+def make_temp_csv(tmp_paths):
+    fd, tmp_path = tempfile.mkstemp(suffix='.csv')
+    tmp_paths.append(tmp_path)
+    return fd, tmp_path
+
+
+def diff_against_current(module, tet_module, src, tmp_paths):
+    ''' Downloads the current annotations and writes the rows of `src` that
+    change anything to one file and the keys to delete to another
+    Returns the paths of both files and the counts of the diff
+    '''
+    fd, current_path = make_temp_csv(tmp_paths)
+    os.close(fd)
+    tet_module.download(f"{TETRATION_API_INVENTORY_TAG_DOWNLOAD}/{module.params['root_scope_name']}", current_path)
+
+    changes_fd, changes_path = make_temp_csv(tmp_paths)
+    deletes_fd, deletes_path = make_temp_csv(tmp_paths)
+    diff = AnnotationDiff(operation=module.params['operation'], prune=module.params['prune'])
+    with open(current_path, newline='') as current_file, open(src, newline='') as desired_file, \
+            os.fdopen(changes_fd, 'w', newline='') as changes_file, \
+            os.fdopen(deletes_fd, 'w', newline='') as deletes_file:
+        try:
+            counts = diff.compare(current_file, desired_file, changes_file, deletes_file)
+        except ValueError as exc:
+            module.fail_json(msg=str(exc))
+    return changes_path, deletes_path, counts
+
+
+def main():
+    ''' Main entry point for module execution
+    '''
+    # Module specific spec
+    module_args = dict(
+        root_scope_name=dict(type='str', required=True),
+        operation=dict(type='str', required=False, default='merge',
+                       choices=TETRATION_API_INVENTORY_TAG_UPLOAD_OPERATIONS),
+        tags=dict(type='list', elements='dict', required=False),
+        src=dict(type='path', required=False),
+        only_changes=dict(type='bool', required=False, default=False),
+        prune=dict(type='bool', required=False, default=False),
+        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC)
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        required_one_of=[
+            ['tags', 'src']
+        ],
+        mutually_exclusive=[
+            ['tags', 'src']
+        ],
+        supports_check_mode=True
+    )
+
+    if module.params['src'] and not os.path.isfile(module.params['src']):
+        module.fail_json(msg=f"src file not found: {module.params['src']}")
+    if module.params['prune'] and not module.params['only_changes']:
+        module.fail_json(msg='prune requires only_changes')
+
+    tet_module = TetrationApiModule(module)
+
+    # These are all elements we put in our return JSON object for clarity
+    result = {
+        "changed": False,
+        "rows": 0
+    }
+    route = f"{TETRATION_API_INVENTORY_TAG_UPLOAD}/{module.params['root_scope_name']}"
+
+    tmp_paths = []
+    try:
+        if module.params['tags'] is not None:
+            # Written to disk so the upload is streamed like a src file
+            fd, src = make_temp_csv(tmp_paths)
+            with os.fdopen(fd, 'w', newline='') as csv_file:
+                write_tags_csv(module, module.params['tags'], csv_file)
+        else:
+            src = module.params['src']
+
+        uploads = []
+        if module.params['only_changes']:
+            changes_path, deletes_path, counts = diff_against_current(module, tet_module, src, tmp_paths)
+            result['counts'] = counts
+            if module.params['operation'] != 'delete' and counts['new'] + counts['changed']:
+                uploads.append(('tet_warnings', changes_path, module.params['operation']))
+            if counts['deleted']:
+                uploads.append(('tet_delete_warnings', deletes_path, 'delete'))
+            result['rows'] = counts['new'] + counts['changed'] + counts['deleted']
+        else:
+            result['rows'] = len(module.params['tags']) if module.params['tags'] is not None else count_rows(src)
+            if result['rows']:
+                uploads.append(('tet_warnings', src, module.params['operation']))
+
+        if uploads:
+            result['changed'] = True
+        if not module.check_mode:
+            for result_key, upload_path, operation in uploads:
+                multipart_args = [MultiPartOption('X-Tetration-Oper', operation)]
+                result[result_key] = tet_module.upload(route, upload_path, multipart_args=multipart_args)
+    finally:
+        for tmp_path in tmp_paths:
+            os.remove(tmp_path)
+
+    module.exit_json(**result)
+
+
+if __name__ == '__main__':
+    main()
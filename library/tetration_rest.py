@@ -128,7 +128,8 @@ from ansible.module_utils.basic import AnsibleModule
 
 from ansible.module_utils.tetration_constants import TETRATION_PROVIDER_SPEC
 from ansible.module_utils.tetration_constants import TETRATION_API_SUCCESS_CODES
-from ansible.module_utils.tetration import RestClient
+from ansible.module_utils.tetration import TetrationApiModule
+from ansible.module_utils.tetration import route_of
 
 
 def main():
@@ -144,38 +145,40 @@ def main():
         supports_check_mode=False
     )
 
+    # The client applies the timeout, retry and rate limit options and returns
+    # the statistics of the run like the other tetration modules do
+    tet_module = TetrationApiModule(module)
+
     method = module.params['method']
-    api_route = '/openapi/' + \
-        module.params['provider']['api_version'] + '/' + module.params['route']
+    uri_prefix = '/openapi/' + module.params['provider']['api_version']
+    api_route = uri_prefix + '/' + module.params['route']
     req_payload = module.params['payload']
 
-    restclient = RestClient(
-        module.params['provider']['server_endpoint'],
-        api_key=module.params['provider']['api_key'],
-        api_secret=module.params['provider']['api_secret'],
-        verify=module.params['provider']['verify'],
-        max_retries=module.params['provider']['max_retries']
-    )
-
     # Do our best to provide "changed" status accurately, but it's not possible
     # as different Tetration APIs react differently to operations like creating
     # an element that already exists.
     changed = False
     if method == 'get':
-        response = restclient.get(api_route, params=module.params['params'])
+        response = tet_module.request('get', api_route, params=module.params['params'])
     elif method == 'delete':
-        response = restclient.delete(api_route)
+        response = tet_module.request('delete', api_route)
         changed = True if response.status_code in TETRATION_API_SUCCESS_CODES else False
     elif method == 'post':
-        response = restclient.post(api_route, json_body=json.dumps(req_payload))
+        response = tet_module.request('post', api_route, json_body=json.dumps(req_payload))
         changed = True if response.status_code in TETRATION_API_SUCCESS_CODES else False
     elif method == 'put':
-        response = restclient.put(api_route, json_body=json.dumps(req_payload))
+        response = tet_module.request('put', api_route, json_body=json.dumps(req_payload))
         changed = True if response.status_code in TETRATION_API_SUCCESS_CODES else False
     else:
         response = None
         module.fail_json(msg='Unsupported HTTP Verb, only supported Methods are get, delete, post, and put')
 
+    # Writes made through this module must not leave stale reference data
+    # behind for the other tetration modules, the cache knows the route
+    # without the API prefix like RestClient does
+    if method != 'get' and tet_module.cache is not None:
+        tet_module.cache.invalidate(route_of(api_route, uri_prefix))
+
     # Put status_code in the return JSON. If the status_code is not 200, we
     # add the text that came from the REST call and the payload to make
     # debugging easier.
@@ -50,7 +50,9 @@ options:
     required: true
     type: string
 
-extends_documentation_fragment: tetration_doc_common
+extends_documentation_fragment:
+- tetration_doc_common
+- tetration_doc_common.preloaded
 
 notes:
 - Requires the `requests` Python module.
@@ -167,7 +169,8 @@ def run_module():
         capability_app_scope_id=dict(type='str', required=False),
         capability_ability=dict(type='str', required=False, choices=TETRATION_API_APP_SCOPE_CAPABILITIES),
         state=dict(type='str', required=True, choices=['present', 'absent', 'query']),
-        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC)
+        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC),
+        tetration_preloaded=dict(type='dict', required=False)
     )
 
     # Create the objects that will be returned
@@ -70,7 +70,9 @@ options:
     required: true
     type: string
 
-extends_documentation_fragment: tetration_doc_common
+extends_documentation_fragment:
+- tetration_doc_common
+- tetration_doc_common.preloaded
 
 notes:
 - Requires the `requests` Python module.
@@ -281,7 +283,8 @@ def run_module():
         parent_app_scope_id=dict(type='str', required=False),
         policy_priority=dict(type='int', required=False),
         state=dict(choices=['present', 'absent'], required=True),
-        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC)
+        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC),
+        tetration_preloaded=dict(type='dict', required=False)
     )
 
     # Create the objects that will be returned
@@ -31,7 +31,9 @@ options:
         default: false
         type: bool
 
-extends_documentation_fragment: tetration_doc_common
+extends_documentation_fragment:
+- tetration_doc_common
+- tetration_doc_common.preloaded
 
 notes:
 - If the command successfully runs, always returns as changed even if no short queries need updating
@@ -83,7 +85,8 @@ def run_module():
     module_args = dict(
         root_app_scope_id=dict(type='str', required=True),
         sync=dict(type='bool', required=False, default=False),
-        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC)
+        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC),
+        tetration_preloaded=dict(type='dict', required=False)
     )
 
     result = dict(
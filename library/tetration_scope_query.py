@@ -46,7 +46,9 @@ options:
         default: False
 
 
-extends_documentation_fragment: tetration_doc_common
+extends_documentation_fragment:
+- tetration_doc_common
+- tetration_doc_common.preloaded
 
 notes:
 - Requires the `requests` Python module.
@@ -168,7 +170,8 @@ def run_module():
         scope_id=dict(type='str', required=False),
         short_name=dict(type='str', required=False),
         only_dirty=dict(type='bool', required=False, default=False),
-        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC)
+        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC),
+        tetration_preloaded=dict(type='dict', required=False)
     )
 
     result = {
@@ -0,0 +1,268 @@
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: tetration_scope_tree
+
+short_description: Builds a whole hierarchy of scopes in one task
+
+version_added: '2.9'
+
+description:
+- Creates and updates the scopes of a nested tree below a parent scope, and optionally
+  deletes the child scopes that are not part of the tree
+- All scopes are listed once and the changes are planned from that listing, instead of
+  listing every scope again for each scope like C(tetration_scope) does
+- Changes are applied one level of the tree at a time, parents before their children,
+  with the scopes of a level sent concurrently
+- Query changes are committed once at the end, see C(tetration_scope_commit_query_changes)
+
+options:
+  parent_app_scope_id:
+    description:
+    - ID of the scope the tree is built below
+    - Mutually exclusive with C(parent_app_scope_name)
+    type: string
+  parent_app_scope_name:
+    description:
+    - Full name of the scope the tree is built below, e.g. C(Default:Apps)
+    - Mutually exclusive with C(parent_app_scope_id)
+    type: string
+  tree:
+    description:
+    - List of the child scopes of the parent scope
+    - Each item needs the key C(short_name), and can have the keys C(description),
+      C(query), C(policy_priority) and C(children)
+    - C(query) is the query of the scope in the format of C(query_raw) of
+      C(tetration_scope), it is required to create a scope
+    - C(children) is a list of the child scopes of the item, in the same format
+    - Attributes an item leaves out are not changed on existing scopes
+    required: true
+    type: list
+    elements: dict
+  prune:
+    description:
+    - Deletes the child scopes of the parent scope and of every scope of the tree
+      that are not part of the tree, together with all of their children
+    default: false
+    type: bool
+  commit:
+    description:
+    - Commits the query changes below the root scope once all changes are applied
+    - Only done when a scope was created or deleted, or a query changed
+    default: true
+    type: bool
+  sync:
+    description:
+    - Runs the commit immediately (True) instead of queuing the job
+    default: false
+    type: bool
+  max_concurrency:
+    description:
+    - Maximum number of scopes of the same level changed at once
+    default: 8
+    type: int
+
+extends_documentation_fragment:
+- tetration_doc_common
+- tetration_doc_common.preloaded
+
+notes:
+- Requires the `requests` Python module.
+- Supports check mode, the planned changes are returned in C(plan)
+
+requirements:
+- requests
+- 'Required API Permission(s): app_policy_management or user_role_scope_management or sensor_management'
+'''
+
+EXAMPLES = '''
+- name: Build the scopes of the data centers
+  tetration_scope_tree:
+    parent_app_scope_name: Default
+    tree:
+      - short_name: DC1
+        description: First data center
+        query:
+          type: subnet
+          field: ip
+          value: 10.1.0.0/16
+        children:
+          - short_name: Web
+            query:
+              type: eq
+              field: user_Tier
+              value: Web
+          - short_name: Database
+            query:
+              type: eq
+              field: user_Tier
+              value: Database
+      - short_name: DC2
+        query:
+          type: subnet
+          field: ip
+          value: 10.2.0.0/16
+    provider: "{{ provider_info }}"
+
+- name: Make the scopes below Default:DC1 match the tree exactly
+  tetration_scope_tree:
+    parent_app_scope_name: Default:DC1
+    tree: "{{ dc1_scopes }}"
+    prune: true
+    sync: true
+    provider: "{{ provider_info }}"
+'''
+
+RETURN = '''
+---
+plan:
+  description:
+  - The changes applied, or planned in check mode, in the order they are applied
+  - Each item has the C(action) (create, update or delete), the full C(name) and C(id)
+    of the scope, the full name of its C(parent), its C(depth) below the parent scope,
+    and the C(payload) sent
+  returned: always
+  type: list
+  elements: dict
+counts:
+  description: Number of scopes to C(create), C(update) and C(delete)
+  returned: always
+  type: dict
+scopes:
+  description: The full name of every scope of the tree and of the parent scope mapped to its ID
+  returned: always
+  type: dict
+commit:
+  description: Response of the query commit
+  returned: when the query changes were committed
+  type: dict
+failures:
+  description:
+  - Scopes that could not be changed, with the C(name), C(action), C(code) and C(msg) of the error
+  - The levels of the tree after the first failure are not applied
+  returned: when the module failed to change a scope
+  type: list
+  elements: dict
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.tetration_constants import TETRATION_API_SCOPES
+from ansible.module_utils.tetration_constants import TETRATION_PROVIDER_SPEC
+from ansible.module_utils.tetration_scope_tree import ScopeTreePlan
+from ansible.module_utils.tetration import TetrationApiError
+from ansible.module_utils.tetration import TetrationApiModule
+
+
+def step_call(plan, step):
+    ''' Returns the run_many call applying `step` of `plan` '''
+    if step['action'] == 'create':
+        req_payload = dict(step['payload'], parent_app_scope_id=plan.ids[step['parent']])
+        return ('POST', TETRATION_API_SCOPES, None, req_payload)
+    route = f"{TETRATION_API_SCOPES}/{step['id']}"
+    if step['action'] == 'delete':
+        return ('DELETE', route)
+    return ('PUT', route, None, step['payload'])
+
+
+def apply_level(module, tet_module, plan, level):
+    ''' Applies the steps of one level concurrently
+    Returns the list of the steps that failed
+    '''
+    calls = [step_call(plan, step) for step in level]
+    responses = tet_module.run_many(calls, max_concurrency=module.params['max_concurrency'], fail_on_error=False)
+
+    failures = []
+    for step, response in zip(level, responses):
+        if isinstance(response, TetrationApiError):
+            failures.append(dict(name=step['name'], action=step['action'], code=response.status_code, msg=response.text))
+        elif step['action'] == 'delete' and response and response.get('details'):
+            failures.append(dict(name=step['name'], action=step['action'], code=None,
+                                 msg='There are objects using this scope.', details=response['details']))
+        elif step['action'] == 'create':
+            step['id'] = response['id']
+            plan.ids[step['name']] = response['id']
+    return failures
+
+
+def run_module():
+    # define available arguments/parameters a user can pass to the module
+    module_args = dict(
+        parent_app_scope_id=dict(type='str', required=False),
+        parent_app_scope_name=dict(type='str', required=False),
+        tree=dict(type='list', elements='dict', required=True),
+        prune=dict(type='bool', required=False, default=False),
+        commit=dict(type='bool', required=False, default=True),
+        sync=dict(type='bool', required=False, default=False),
+        max_concurrency=dict(type='int', required=False, default=8),
+        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC),
+        tetration_preloaded=dict(type='dict', required=False)
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True,
+        required_one_of=[
+            ['parent_app_scope_id', 'parent_app_scope_name'],
+        ],
+        mutually_exclusive=[
+            ['parent_app_scope_id', 'parent_app_scope_name']
+        ],
+    )
+
+    # The only listing of the scopes, every change is planned from it
+    tet_module = TetrationApiModule(module)
+    all_scopes_response = tet_module.run_method('GET', TETRATION_API_SCOPES)
+
+    parent_id = module.params['parent_app_scope_id']
+    if module.params['parent_app_scope_name']:
+        scope_ids_by_name = {s['name']: s['id'] for s in all_scopes_response}
+        parent_id = scope_ids_by_name.get(module.params['parent_app_scope_name'])
+        if parent_id is None:
+            error_message = "`parent_app_scope_name` passed into the module does not exist."
+            module.fail_json(msg=error_message, searched_scope=module.params['parent_app_scope_name'])
+
+    try:
+        plan = ScopeTreePlan(all_scopes_response, parent_id, module.params['tree'], prune=module.params['prune'])
+    except ValueError as exc:
+        module.fail_json(msg=str(exc))
+
+    result = {
+        'changed': plan.changed,
+        'plan': plan.steps,
+        'counts': plan.counts(),
+        'scopes': plan.ids
+    }
+
+    if module.check_mode or not plan.changed:
+        module.exit_json(**result)
+
+    # Parents are created before their children, and children are deleted
+    # before their parents, the scopes of a level do not depend on each other
+    for level in plan.levels() + plan.delete_levels():
+        failures = apply_level(module, tet_module, plan, level)
+        if failures:
+            error_message = f"Unable to change {len(failures)} of {len(level)} scopes at depth {level[0]['depth']}"
+            module.fail_json(msg=error_message, failures=failures, **result)
+
+    if module.params['commit'] and plan.changes_queries():
+        req_payload = {
+            'root_app_scope_id': plan.parent.get('root_app_scope_id') or plan.parent['id'],
+            'sync': module.params['sync']
+        }
+        route = f"{TETRATION_API_SCOPES}/commit_dirty"
+        result['commit'] = tet_module.run_method('POST', route, req_payload=req_payload)
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
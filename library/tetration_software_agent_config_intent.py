@@ -52,7 +52,9 @@ options:
     description: Tenant name to which an agent config profile should be applied
     type: string
 
-extends_documentation_fragment: tetration_doc_common
+extends_documentation_fragment:
+- tetration_doc_common
+- tetration_doc_common.preloaded
 
 notes:
 - Requires the `requests` Python module.
@@ -155,7 +157,8 @@ def main():
         filter_id=dict(type='str', required=False),
         filter_name=dict(type='str', required=False),
         state=dict(default='present', choices=['present', 'absent', 'query']),
-        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC)
+        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC),
+        tetration_preloaded=dict(type='dict', required=False)
     )
 
     module = AnsibleModule(
@@ -259,7 +259,9 @@ options:
         required: true
         type: string
 
-extends_documentation_fragment: tetration_doc_common
+extends_documentation_fragment:
+- tetration_doc_common
+- tetration_doc_common.preloaded
 
 notes:
 - Requires the `requests` Python module.
@@ -616,7 +618,8 @@ def main():
         max_rss_limit_mb=dict(type='int', required=False),
         preserve_existing_rules=dict(type='bool', required=False),
         state=dict(choices=['present', 'absent', 'query']),
-        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC)
+        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC),
+        tetration_preloaded=dict(type='dict', required=False)
     )
 
     # Building custom error handling to display custom error messages
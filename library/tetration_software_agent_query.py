@@ -40,6 +40,37 @@ options:
     - Does not have to be an exact, can put in an IP and the subnet and will convert to the appropriate network
     - See examples for exact format
     type: string
+  max_results:
+    description:
+    - Stop searching once this many matching software agents have been found
+    - Remaining pages of software agents are not downloaded
+    - Leave blank to return every match
+    type: int
+  interface_ips:
+    description:
+    - List of IPv4 or IPv6 addresses to find the software agents of
+    - The software agents of each address are returned in C(matches)
+    - Can be combined with the other list options, but not with the options above
+    type: list
+    elements: str
+  interface_networks:
+    description:
+    - List of IPv4 or IPv6 networks to find the software agents with an interface in
+    - The software agents of each network are returned in C(matches)
+    type: list
+    elements: str
+  host_names:
+    description:
+    - List of host names to find the software agents named exactly like
+    - The software agents of each host name are returned in C(matches)
+    type: list
+    elements: str
+  host_name_prefixes:
+    description:
+    - List of strings to find the software agents whose name starts with
+    - The software agents of each prefix are returned in C(matches)
+    type: list
+    elements: str
 
 extends_documentation_fragment: tetration_doc_common
 
@@ -47,6 +78,8 @@ notes:
 - Requires the `requests` Python module.
 - This module only queries.  Use M(tetration_software_agent) to delete or query an agent by UUID
 - If you don't provide any parameters, will return all agents in the system
+- The list options download the software agents once and index them by interface
+  address and host name, so thousands of hosts can be looked up in one task
 
 requirements:
 - requests
@@ -112,6 +145,29 @@ tetration_software_agent_query:
       host: "https://tetration-cluster.company.com"
       api_key: 1234567890QWERTY
       api_secret: 1234567890QWERTY
+
+# Find the agents of many hosts at once
+tetration_software_agent_query:
+    interface_ips:
+      - 10.138.0.21
+      - 10.138.0.22
+    interface_networks:
+      - 10.139.0.0/24
+    host_names:
+      - student-867-0
+    provider:
+      host: "https://tetration-cluster.company.com"
+      api_key: 1234567890QWERTY
+      api_secret: 1234567890QWERTY
+
+# Find the first agent whos name contains a string
+tetration_software_agent_query:
+    host_name_contains: student
+    max_results: 1
+    provider:
+      host: "https://tetration-cluster.company.com"
+      api_key: 1234567890QWERTY
+      api_secret: 1234567890QWERTY
 '''
 
 RETURN = '''
@@ -205,6 +261,19 @@ items_found:
   description: the number of items found
   returned: always
   type: int
+matches:
+  description:
+  - For each list option used, the queries of the option mapped to the UUIDs of the
+    software agents they match
+  - The software agents themselves are returned once in C(object)
+  returned: when a list option is used
+  type: dict
+  sample: '{"interface_ips": {"10.138.0.21": ["d322189839fb70b2f4569f3657eea58f096c0686"]}}'
+not_found:
+  description: For each list option used, the queries that match no software agent
+  returned: when a list option is used
+  type: dict
+  sample: '{"interface_ips": ["10.138.0.22"]}'
 '''
 
 import ipaddress
@@ -214,6 +283,54 @@ from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.tetration_constants import TETRATION_PROVIDER_SPEC
 from ansible.module_utils.tetration_constants import TETRATION_API_SENSORS
 from ansible.module_utils.tetration import TetrationApiModule
+from ansible.module_utils.tetration_index import SensorIndex
+
+SINGLE_QUERY_OPTIONS = ['host_name_contains', 'host_name_is_exactly', 'interface_ip_is_exactly',
+                        'interface_ip_in_network', 'max_results']
+LIST_QUERY_OPTIONS = ['interface_ips', 'interface_networks', 'host_names', 'host_name_prefixes']
+
+
+def parse_queries(module):
+    ''' Returns the queries of the list options as (option, query, parsed query) tuples '''
+    queries = []
+    for query in module.params['interface_ips'] or []:
+        try:
+            queries.append(('interface_ips', query, ipaddress.ip_address(query)))
+        except ValueError:
+            module.fail_json(msg=f"Invalid IPv4 or IPv6 Address entered.  Value entered: {query}")
+    for query in module.params['interface_networks'] or []:
+        try:
+            queries.append(('interface_networks', query, ipaddress.ip_network(query, strict=False)))
+        except ValueError:
+            module.fail_json(msg=f"Invalid IPv4 or IPv6 Network entered.  Value entered: {query}")
+    for option in ['host_names', 'host_name_prefixes']:
+        queries.extend((option, query, query) for query in module.params[option] or [])
+    return queries
+
+
+def run_list_queries(module, tet_module, result):
+    ''' Answers all the queries of the list options from one download of the software agents '''
+    queries = parse_queries(module)
+    index = SensorIndex(s for s in tet_module.iter_paginated('GET', TETRATION_API_SENSORS)
+                        if 'deleted_at' not in s.keys())
+    lookups = {
+        'interface_ips': index.by_address,
+        'interface_networks': index.in_network,
+        'host_names': index.by_host_name,
+        'host_name_prefixes': index.by_host_name_prefix,
+    }
+
+    result['matches'] = dict((o, {}) for o in LIST_QUERY_OPTIONS if module.params[o] is not None)
+    result['not_found'] = dict((o, []) for o in result['matches'])
+    found = {}
+    for option, query, parsed_query in queries:
+        sensors = lookups[option](parsed_query)
+        result['matches'][option][query] = [s['uuid'] for s in sensors]
+        if not sensors:
+            result['not_found'][option].append(query)
+        for sensor in sensors:
+            found[sensor['uuid']] = sensor
+    result['object'] = list(found.values())
 
 
 def run_module():
@@ -223,6 +340,11 @@ def run_module():
         host_name_is_exactly=dict(type='str'),
         interface_ip_is_exactly=dict(type='str'),
         interface_ip_in_network=dict(type='str'),
+        max_results=dict(type='int'),
+        interface_ips=dict(type='list', elements='str'),
+        interface_networks=dict(type='list', elements='str'),
+        host_names=dict(type='list', elements='str'),
+        host_name_prefixes=dict(type='list', elements='str'),
         provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC)
     )
 
@@ -239,6 +361,14 @@ def run_module():
 
     tet_module = TetrationApiModule(module)
 
+    if any(module.params[o] is not None for o in LIST_QUERY_OPTIONS):
+        single_options = [o for o in SINGLE_QUERY_OPTIONS if module.params[o] is not None]
+        if single_options:
+            module.fail_json(msg=f"The list options cannot be combined with: {', '.join(single_options)}")
+        run_list_queries(module, tet_module, result)
+        result['items_found'] = len(result['object'])
+        module.exit_json(**result)
+
     # Verify a valid IP address was passed in
     if module.params['interface_ip_is_exactly']:
         try:
@@ -256,9 +386,7 @@ def run_module():
             error_message = f"Invalid IPv4 or IPv6 Network entered.  Value entered: {module.params['interface_ip_in_network']}"
             module.fail_json(msg=error_message)
 
-    response = tet_module.run_method_paginated('GET', TETRATION_API_SENSORS)
-
-    for s in response:
+    for s in tet_module.iter_paginated('GET', TETRATION_API_SENSORS):
         if 'deleted_at' not in s.keys():
             to_append = s
             if module.params['host_name_contains'] and module.params['host_name_contains'] not in s['host_name']:
@@ -299,6 +427,9 @@ def run_module():
 
             if to_append is not None:
                 result['object'].append(to_append)
+                if module.params['max_results'] and len(result['object']) >= module.params['max_results']:
+                    # Stops iterating, so no further pages are requested
+                    break
 
     result['items_found'] = len(result['object'])
     module.exit_json(**result)
@@ -70,7 +70,9 @@ options:
         type: string
         required: true
 
-extends_documentation_fragment: tetration_doc_common
+extends_documentation_fragment:
+- tetration_doc_common
+- tetration_doc_common.preloaded
 
 notes:
 - Requires the `requests` Python module.
@@ -186,7 +188,8 @@ def run_module():
         last_name=dict(type='str', required=False, default=''),
         state=dict(type='str', required=True, choices=[
                    'present', 'absent', 'query']),
-        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC)
+        provider=dict(type='dict', options=TETRATION_PROVIDER_SPEC),
+        tetration_preloaded=dict(type='dict', required=False)
     )
 
     # Create the objects that will be returned
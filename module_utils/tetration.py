@@ -1,51 +1,108 @@
 import os
+import asyncio
+import functools
 import json
 import requests
 import hmac
 import hashlib
 import base64
+import shutil
+import tempfile
 import time
 import warnings
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from six.moves.urllib.parse import urljoin
 from ansible.module_utils.six import iteritems
 from ansible.module_utils._text import to_text
+from ansible.module_utils.connection import Connection
+from ansible.module_utils.parsing.convert_bool import boolean
 from . import tetration_constants
+from .tetration_cache import ReferenceDataCache
+from .tetration_cache import ResponseMemo
+from .tetration_cache import routes_overlap
+from .tetration_metrics import RequestMetrics
+from .tetration_paging import PageSize
+from .tetration_profile import ModuleProfiler
+from .tetration_ratelimit import TokenBucket
+from .tetration_retry import RetryPolicy
+from .tetration_timeout import DeadlineExceeded
+from .tetration_timeout import RequestTimeouts
 from requests.packages.urllib3 import disable_warnings
 
 # Disable SSL Warnings
 disable_warnings()
 
 
+def resolve_provider(provider, credentials_required=True):
+    ''' Drops the unknown keys of the `provider` dict and fills in the defaults
+    and the TETRATION_* environment variables of the missing keys, in place
+
+    Raises ValueError when a required key is missing and `credentials_required`
+    '''
+    if len(provider.keys()) > 0:
+        to_del = []
+        for key in provider.keys():
+            if key not in tetration_constants.TETRATION_PROVIDER_SPEC.keys():
+                to_del.append(key)
+        for key in to_del:
+            provider.pop(key)
+    for key, value in iteritems(tetration_constants.TETRATION_PROVIDER_SPEC):
+        if key not in provider:
+            # apply default values from NIOS_PROVIDER_SPEC since we cannot just
+            # assume the provider values are coming from AnsibleModule
+            if 'default' in value:
+                provider[key] = value['default']
+            # override any values with env variables unless they were
+            # explicitly set
+            env = ('TETRATION_%s' % key).upper()
+            if env in os.environ:
+                provider[key] = os.environ.get(env)
+            # if key is required but still not defined raise Exception
+            if credentials_required and key not in provider and 'required' in value and value['required']:
+                raise ValueError('option: %s is required' % key)
+    return provider
+
+
+def route_of(uri_path, uri_prefix):
+    ''' Returns the route of `uri_path` below the API prefix `uri_prefix`,
+    without its query string, e.g. `/app_scopes` for `/openapi/v1/app_scopes`.
+    The reference data cache, the timeouts and the metrics know requests by it.
+    '''
+    route = uri_path.split('?', 1)[0]
+    if route.startswith(uri_prefix):
+        route = route[len(uri_prefix):]
+    return '/' + route.lstrip('/')
+
+
 class TetrationApiBase(object):
     ''' Base class for implementing Tetration API '''
     provider_spec = {'provider': dict(
         type='dict', options=tetration_constants.TETRATION_PROVIDER_SPEC)}
 
-    def __init__(self, provider, module):
-        if len(provider.keys()) > 0:
-            to_del = []
-            for key in provider.keys():
-                if key not in tetration_constants.TETRATION_PROVIDER_SPEC.keys():
-                    to_del.append(key)
-            for key in to_del:
-                provider.pop(key)
-        for key, value in iteritems(tetration_constants.TETRATION_PROVIDER_SPEC):
-            if key not in provider:
-                # apply default values from NIOS_PROVIDER_SPEC since we cannot just
-                # assume the provider values are coming from AnsibleModule
-                if 'default' in value:
-                    provider[key] = value['default']
-                # override any values with env variables unless they were
-                # explicitly set
-                env = ('TETRATION_%s' % key).upper()
-                if env in os.environ:
-                    provider[key] = os.environ.get(env)
-                # if key is required but still not defined raise Exception
-                if key not in provider and 'required' in value and value['required']:
-                    raise ValueError('option: %s is required' % key)
-        self.rc = RestClient(**provider)
+    def __init__(self, provider, module, connection=None):
+        # Under `connection: httpapi` the credentials live in the connection
+        # plugin, so only the tuning options of the provider are used
+        resolve_provider(provider, credentials_required=connection is None)
+        if connection is None:
+            self.rc = RestClient(**provider)
+        else:
+            self.rc = HttpApiRestClient(connection, timeouts=RequestTimeouts.from_options(provider),
+                                        metrics=RequestMetrics.from_options(provider), tuning=provider)
+            if int(provider.get('cache_ttl') or 0) > 0:
+                # Cache entries are keyed on the cluster the connection talks to
+                provider.update(self.rc.get_identity())
+        self.cache = ReferenceDataCache.from_provider(provider)
+        self.rate_limited = float(provider.get('rate_limit') or 0) > 0
+        # Collapses the GETs a run repeats, None when `memoize_gets` is disabled
+        self.get_memo = ResponseMemo.from_options(provider)
+        self.pagination_prefetch = boolean(provider.get('pagination_prefetch') or False)
+        self.page_size = PageSize.from_options(provider)
+        # Telemetry of the requests, None unless the provider enables `metrics`
+        self.metrics = self.rc.metrics
+        # Collection listings passed in by the action plugins, by route
+        self.preloaded = {}
 
 
 class TetrationApiModule(TetrationApiBase):
@@ -55,10 +112,62 @@ class TetrationApiModule(TetrationApiBase):
         self.module = module
         provider = module.params.get(
             'provider') if module.params.get('provider') else dict()
+        # Modules run with `connection: httpapi` get a socket to the
+        # persistent connection, which keeps one signed session per host
+        connection = Connection(module._socket_path) if getattr(module, '_socket_path', None) else None
         try:
-            super(TetrationApiModule, self).__init__(provider, module)
+            super(TetrationApiModule, self).__init__(provider, module, connection=connection)
         except Exception as exc:
             self.module.fail_json(msg=to_text(exc))
+        # Reference data the action plugin fetched once for the whole play
+        self.preloaded = dict(module.params.get('tetration_preloaded') or {})
+        # Profiles the rest of the run when the provider enables `profile`.
+        # Outside of ansible the module name is not passed in and defaults
+        # to the file name of AnsibleModule
+        module_name = getattr(module, '_name', None)
+        if not module_name or module_name.endswith('.py'):
+            module_name = 'tetration'
+        self.profiler = ModuleProfiler.from_options(provider, module_name)
+        self._wrap_result_methods()
+
+    def _wrap_result_methods(self):
+        ''' Adds the statistics of this run to whatever the module returns,
+        without every module having to collect them itself
+        '''
+        exit_json = self.module.exit_json
+        fail_json = self.module.fail_json
+
+        def exit_with_stats(**kwargs):
+            exit_json(**self._add_result_stats(kwargs))
+
+        def fail_with_stats(**kwargs):
+            fail_json(**self._add_result_stats(kwargs))
+
+        self.module.exit_json = exit_with_stats
+        self.module.fail_json = fail_with_stats
+
+    def _add_result_stats(self, result):
+        if self.profiler is not None:
+            # Stopped first so assembling the result is not part of the profile
+            result.setdefault('tet_profile', self.profiler.stop())
+        retry_stats = getattr(self.rc, 'retry_stats', None)
+        if retry_stats is not None:
+            result.setdefault('tet_retries', dict(retry_stats))
+        # Seconds spent waiting for the token bucket of the `rate_limit` option
+        rate_limit_wait = round(getattr(self.rc, 'rate_limit_wait', 0.0), 4)
+        if self.rate_limited:
+            result.setdefault('tet_rate_limit_wait', rate_limit_wait)
+        if self.page_size.used:
+            result.setdefault('tet_page_size', self.page_size.size)
+        if self.metrics is not None:
+            metrics = self.metrics.as_result()
+            metrics['summary']['rate_limit_wait_seconds'] = rate_limit_wait
+            if self.get_memo is not None:
+                memo_stats = self.get_memo.stats()
+                metrics['summary']['memo_hits'] = memo_stats['hits']
+                metrics['summary']['memo_misses'] = memo_stats['misses']
+            result.setdefault('tet_metrics', metrics)
+        return result
 
     def _handle_exception(self, method_name, exc):
         ''' Handles any exceptions raised
@@ -71,17 +180,68 @@ class TetrationApiModule(TetrationApiBase):
             operation=method_name
         )
 
+    def _handle_deadline(self, method_name, exc):
+        ''' Fails the module once the task deadline passed instead of
+        letting it run into the next request
+        '''
+        self.module.fail_json(msg=to_text(exc), operation=method_name)
+
+    def _request(self, method_name, *args, **kwargs):
+        try:
+            return getattr(self.rc, method_name)(*args, **kwargs)
+        except DeadlineExceeded as exc:
+            self._handle_deadline(method_name, exc)
+
+    def request(self, method_name, target, **kwargs):
+        ''' Sends a request to `target` and returns the response undecoded,
+        for modules that report the status code themselves like `tetration_rest`
+        '''
+        return self._request(method_name.lower(), target, **kwargs)
+
+    def upload(self, target, file_path, multipart_args=None):
+        ''' Uploads the file at `file_path` to `target` as multipart form data
+        and returns the decoded response
+
+        The file is streamed, so it can be far larger than any JSON payload
+        sent with `run_method`.
+        '''
+        if not hasattr(self.rc, 'upload'):
+            self.module.fail_json(
+                msg='File uploads are not supported over the httpapi connection, run the task with connection: local')
+        if self.get_memo is not None:
+            # Uploads such as annotations change what many routes return
+            self.get_memo.clear()
+        return self._decode('post', self._request('upload', file_path, target, multipart_args=multipart_args))
+
+    def download(self, target, file_path):
+        ''' Streams the response of a GET to `target` into the file at
+        `file_path`, e.g. the CSV of all annotations of a root scope
+        '''
+        if not hasattr(self.rc, 'download'):
+            self.module.fail_json(
+                msg='File downloads are not supported over the httpapi connection, run the task with connection: local')
+        resp = self._request('download', file_path, target)
+        if resp.status_code != 200:
+            self._handle_exception('get', resp)
+
     def get_object(self, filter, target=None, params=None, sub_element=None, allow_multiple=False, search_array=None):
         '''Returns a single object from Tetration that exactly matches every
         value specified in filter.
         '''
-        result_array = []
-        while True:
-            if search_array:
-                query_result = search_array
-            else:
-                query_result = self._get(
-                    target=target, params=params, req_payload=None)
+        matches = self.iter_objects(
+            filter, target=target, params=params, sub_element=sub_element, search_array=search_array)
+        if allow_multiple:
+            return list(matches) or None
+        # Stops requesting pages as soon as the first match is found
+        return next(matches, None)
+
+    def iter_objects(self, filter, target=None, params=None, sub_element=None, search_array=None):
+        '''Yields every object from Tetration that exactly matches every
+        value specified in filter, requesting further pages only while the
+        caller keeps iterating.
+        '''
+        pages = [search_array] if search_array else self._iter_pages('get', target, params)
+        for query_result in pages:
             search_objects = query_result[sub_element] if sub_element and sub_element in query_result else query_result
             for obj in search_objects:
                 match = True
@@ -89,96 +249,319 @@ class TetrationApiModule(TetrationApiBase):
                     if k in obj and obj[k] != v:
                         match = False
                 if match:
-                    if allow_multiple:
-                        result_array.append(obj)
-                    else:
-                        return obj
-            if 'offset' in query_result and not search_array:
-                params['offset'] = query_result['offset']
-            else:
-                return result_array if result_array else None
+                    yield obj
 
-    def run_method(self, method_name, target, params=None, req_payload=None):
+    def _iter_pages(self, method_name, target, params=None, req_payload=None, page_size=None):
+        ''' Yields each page of a request that continues at the `offset`
+        returned with the previous page
+
+        With `pagination_prefetch` enabled the GET for the next page is sent on
+        a background thread as soon as its offset is known, so it is in flight
+        while the caller decodes and filters the current page. A `page_size`
+        sets the `limit` of every GET page.
+        '''
         methods = {
             'get': self._get,
             'post': self._post,
             'put': self._put,
             'delete': self._delete
         }
-        return methods[method_name.lower()](target, params, req_payload)
+        method_name = method_name.lower()
+        params = dict(params) if params else {}
+        if method_name != 'get':
+            page_size = None
+        if page_size is not None:
+            params['limit'] = page_size.size
+        executor = None
+        if self.pagination_prefetch and method_name == 'get':
+            executor = ThreadPoolExecutor(max_workers=1)
+        pending = None
+        try:
+            while True:
+                if method_name == 'get':
+                    page = self._get_page(target, params, pending, page_size)
+                    pending = None
+                else:
+                    page = methods[method_name](target, params, req_payload)
+                if page is None:
+                    return
+                has_next = isinstance(page, dict) and 'offset' in page
+                if has_next:
+                    params = dict(params, offset=page['offset'])
+                    if page_size is not None:
+                        params['limit'] = page_size.size
+                    if executor is not None:
+                        pending = executor.submit(self._timed_get, target, params)
+                yield page
+                if not has_next:
+                    return
+        finally:
+            if executor is not None:
+                # The caller stopped early, drop the prefetch if it has not
+                # started, else wait for it so its request is counted before
+                # the module exits
+                if pending is not None:
+                    pending.cancel()
+                executor.shutdown(wait=True)
+
+    def _get_page(self, target, params, pending=None, page_size=None):
+        ''' Returns one decoded GET page, or None like `_get`
+
+        Only the request of a prefetched page runs on the background thread,
+        failures are reported from here like for any other request. An
+        adaptive page size retries a page that timed out or failed with a
+        server error with fewer records.
+        '''
+        while True:
+            try:
+                response, elapsed = pending.result() if pending is not None else self._timed_get(target, params)
+            except DeadlineExceeded as exc:
+                self._handle_deadline('get', exc)
+            except requests.exceptions.Timeout:
+                if page_size is None or not page_size.shrink():
+                    raise
+            else:
+                if response.status_code < 500 or page_size is None or not page_size.shrink():
+                    page = self._decode('get', response)
+                    if page_size is not None and isinstance(page, dict):
+                        page_size.record(len(page.get('results') or []), elapsed)
+                    return page
+            pending = None
+            params['limit'] = page_size.size
+
+    def _timed_get(self, target, params):
+        started_at = time.time()
+        response = self.rc.get(target, params=params)
+        return response, time.time() - started_at
 
-    def run_method_paginated(self, method_name, target, params=None, req_payload=None, offset=None):
+    def run_method(self, method_name, target, params=None, req_payload=None):
         methods = {
             'get': self._get,
             'post': self._post,
             'put': self._put,
             'delete': self._delete
         }
-        if params is None:
-            params = {
-                'limit': tetration_constants.TETRATION_API_PAGINATION_SIZE,
-                'offset': offset
-            }
+        method_name = method_name.lower()
+        if method_name == 'get':
+            preloaded = self._preloaded_get(target, params)
+            if preloaded is not None:
+                self._record_served('preloaded')
+                return preloaded
         else:
-            params['limit'] = tetration_constants.TETRATION_API_PAGINATION_SIZE
-            params['offset'] = offset
+            self._drop_preloaded(target)
+            self._drop_memoized(target)
+        if self.cache is None:
+            return methods[method_name](target, params, req_payload)
 
-        keep_searching = True
-        all_results = []
-        while keep_searching:
-            results = methods[method_name.lower()](target, params, req_payload)
+        if method_name == 'get':
+            return self._cached_get(target, params, req_payload)
+        try:
+            return methods[method_name](target, params, req_payload)
+        finally:
+            # Evict even when the write failed part way through
+            self.cache.invalidate(target)
+
+    def _preloaded_get(self, target, params):
+        ''' Returns the preloaded listing of the collection `target`, None when there is none '''
+        if params:
+            return None
+        return self.preloaded.get(target.rstrip('/'))
+
+    def _record_served(self, source):
+        if self.metrics is not None:
+            self.metrics.record_served(source)
+
+    def _drop_memoized(self, target):
+        if self.get_memo is not None:
+            self.get_memo.invalidate(target)
+
+    def _drop_preloaded(self, target):
+        ''' A write makes the preloaded listing of its collection stale '''
+        for route in list(self.preloaded):
+            if target.rstrip('/') == route or target.startswith(route + '/'):
+                self.preloaded.pop(route)
+
+    def _cached_get(self, target, params, req_payload):
+        ''' Serves reference data collections from the on-disk cache '''
+        cached = self.cache.get(target, params)
+        if cached is not None:
+            self._record_served('cache')
+            return cached
+        fetched_at = time.time()
+        response = self._get(target, params, req_payload)
+        if response is not None:
+            self.cache.set(target, params, response, fetched_at)
+        return response
 
-            all_results.extend(results['results'])
-            if 'offset' in results.keys():
-                params['offset'] = results['offset']
-            else:
-                keep_searching = False
+    def run_method_paginated(self, method_name, target, params=None, req_payload=None, offset=None):
+        return list(self.iter_paginated(method_name, target, params, req_payload, offset))
 
-        return all_results
+    def iter_paginated(self, method_name, target, params=None, req_payload=None, offset=None):
+        ''' Yields the records of a paginated endpoint page by page
+
+        Only one page is held in memory at a time (two with
+        `pagination_prefetch`) and no further pages are requested once the
+        caller stops iterating, e.g. after it found the records it was
+        looking for.
+        '''
+        params = dict(params) if params else {}
+        params['offset'] = offset
+
+        for results in self._iter_pages(method_name, target, params, req_payload, page_size=self.page_size):
+            if not results:
+                return
+            for record in results['results']:
+                yield record
 
     def _get(self, target, params, req_payload):
-        resp = self.rc.get(target, params=params)
-        if resp.status_code == 400:
-            return None
-        elif resp.status_code == 200:
-            return resp.json()
-        else:
-            self._handle_exception('get', resp)
+        if self.get_memo is not None:
+            memoized = self.get_memo.get(target, params)
+            if memoized is not None:
+                self._record_served('memo')
+                return memoized
+        resp = self._request('get', target, params=params)
+        result = self._decode('get', resp)
+        self._memoize(target, params, resp)
+        return result
+
+    def _memoize(self, target, params, resp):
+        if self.get_memo is not None and resp is not None and resp.status_code == 200:
+            self.get_memo.set(target, params, getattr(resp, 'content', None) or resp.text)
 
     def _post(self, target, params, req_payload):
-        resp = self.rc.post(target, json_body=json.dumps(req_payload))
-        if resp.status_code in tetration_constants.TETRATION_API_SUCCESS_CODES:
-            try:
-                return resp.json()
-            except ValueError:
-                return None
-        else:
-            self._handle_exception('post', resp)
+        return self._decode('post', self._request('post', target, json_body=json.dumps(req_payload)))
 
     def _put(self, target, params, req_payload):
-        resp = self.rc.put(target, json_body=json.dumps(req_payload))
-        if resp.status_code in tetration_constants.TETRATION_API_SUCCESS_CODES:
-            try:
-                return resp.json()
-            except ValueError:
-                return None
-        else:
-            self._handle_exception('put', resp)
+        return self._decode('put', self._request('put', target, json_body=json.dumps(req_payload)))
 
     def _delete(self, target, params, req_payload):
-        resp = self.rc.delete(target, json_body=json.dumps(req_payload))
-        if resp.status_code in tetration_constants.TETRATION_API_SUCCESS_CODES:
-            try:
-                return resp.json()
-            except ValueError:
+        return self._decode('delete', self._request('delete', target, json_body=json.dumps(req_payload)))
+
+    def _decode(self, method_name, resp):
+        try:
+            return self._decode_response(method_name, resp)
+        except TetrationApiError as exc:
+            self._handle_exception(method_name, exc)
+
+    def _decode_response(self, method_name, resp, target=None):
+        ''' Returns the decoded body of `resp` or raises TetrationApiError
+        when the status code is not one the call succeeds with
+        '''
+        if method_name == 'get':
+            if resp.status_code == 400:
                 return None
-        elif resp.status_code in tetration_constants.TETRATION_API_FAILURE_CODES_THAT_RETURN_DATA:
-            try:
+            elif resp.status_code == 200:
                 return resp.json()
-            except ValueError:
-                return None
-        else:
-            self._handle_exception('delete', resp)
+            raise TetrationApiError(method_name, resp.status_code, resp.text, target)
+        success_codes = list(tetration_constants.TETRATION_API_SUCCESS_CODES)
+        if method_name == 'delete':
+            success_codes += tetration_constants.TETRATION_API_FAILURE_CODES_THAT_RETURN_DATA
+        if resp.status_code not in success_codes:
+            raise TetrationApiError(method_name, resp.status_code, resp.text, target)
+        try:
+            return resp.json()
+        except ValueError:
+            return None
+
+    def run_many(self, calls, max_concurrency=None, fail_on_error=True):
+        ''' Runs independent `run_method` calls concurrently and returns their
+        results in the order of `calls`
+
+        Args:
+            calls: List of (method_name, target[, params[, req_payload]]) tuples
+            max_concurrency: Int of the maximum number of requests in flight
+            fail_on_error: When False, a call that fails returns its
+            TetrationApiError in place of a result instead of failing the module
+        '''
+        return asyncio.run(self.run_many_async(calls, max_concurrency, fail_on_error))
+
+    async def run_many_async(self, calls, max_concurrency=None, fail_on_error=True):
+        ''' Coroutine behind `run_many` for callers already running an event loop '''
+        calls = [tuple(call) + (None,) * (4 - len(call)) for call in calls]
+        requests_to_send = []
+        # Results known without a request, by index of the call
+        preloaded = {}
+        # Identical GETs of the batch share the response of the first one
+        coalesced = {}
+        first_gets = {}
+        written = []
+        for index, (method_name, target, params, req_payload) in enumerate(calls):
+            method_name = method_name.lower()
+            if method_name == 'get':
+                listing = self._preloaded_get(target, params)
+                if listing is not None:
+                    self._record_served('preloaded')
+                    preloaded[index] = listing
+                    continue
+                key = ResponseMemo.key(target, params)
+                if key in first_gets and self.get_memo is not None:
+                    self.get_memo.count_hit()
+                    self._record_served('memo')
+                    coalesced[index] = first_gets[key]
+                    continue
+                memoized = self.get_memo.get(target, params) if self.get_memo is not None else None
+                if memoized is not None:
+                    self._record_served('memo')
+                    preloaded[index] = memoized
+                    continue
+                cached = self.cache.get(target, params) if self.cache is not None else None
+                if cached is not None:
+                    self._record_served('cache')
+                    preloaded[index] = cached
+                    continue
+                first_gets[key] = index
+                requests_to_send.append((method_name, target, dict(params=params)))
+            else:
+                self._drop_preloaded(target)
+                self._drop_memoized(target)
+                written.append(target.rstrip('/'))
+                requests_to_send.append((method_name, target, dict(json_body=json.dumps(req_payload))))
+
+        fetched_at = time.time()
+        async_client = AsyncRestClient(self.rc, max_concurrency)
+        try:
+            responses = await async_client.gather(requests_to_send)
+        finally:
+            async_client.close()
+        if preloaded or coalesced:
+            responses = iter(responses)
+            responses = [preloaded[i] if i in preloaded else None if i in coalesced else next(responses)
+                         for i in range(len(calls))]
+            for index, first_index in coalesced.items():
+                responses[index] = responses[first_index]
+
+        # Responses are decoded here rather than on the worker threads so that
+        # a failure is reported by a single fail_json
+        results = []
+        for index, ((method_name, target, params, req_payload), resp) in enumerate(zip(calls, responses)):
+            method_name = method_name.lower()
+            if index in preloaded:
+                results.append(resp)
+                continue
+            if method_name != 'get' and self.cache is not None:
+                self.cache.invalidate(target)
+            if isinstance(resp, DeadlineExceeded):
+                self._handle_deadline(method_name, resp)
+            # GETs sent alongside a write to their route may have been answered
+            # before or after it
+            keep = method_name == 'get' and index not in coalesced and not isinstance(resp, Exception) and \
+                not any(routes_overlap(target.rstrip('/'), route) for route in written)
+            if keep:
+                self._memoize(target, params, resp)
+            try:
+                if isinstance(resp, Exception):
+                    if fail_on_error:
+                        raise resp
+                    raise TetrationApiError(method_name, None, to_text(resp), target)
+                result = self._decode_response(method_name, resp, target)
+                if keep and self.cache is not None and result is not None:
+                    self.cache.set(target, params, result, fetched_at)
+                results.append(result)
+            except TetrationApiError as exc:
+                if fail_on_error:
+                    self._handle_exception(method_name, exc)
+                results.append(exc)
+        return results
 
     def is_subset(self, smaller_obj, bigger_obj):
         # Accepts 2 dictionaries and determines if the first dict is a subset of the second dict
@@ -191,6 +574,26 @@ class TetrationApiModule(TetrationApiBase):
         return True
 
 
+class TetrationApiError(Exception):
+    """
+    A Tetration OpenAPI call that did not succeed
+
+    Attributes:
+        operation: String of the lower case HTTP method of the call
+        status_code: Int of the HTTP status code, None when no response was
+        received
+        text: String of the response body or of the error
+        target: String of the route of the call
+    """
+
+    def __init__(self, operation, status_code, text, target=None):
+        super(TetrationApiError, self).__init__(text)
+        self.operation = operation
+        self.status_code = status_code
+        self.text = text
+        self.target = target
+
+
 class MultiPartOption(object):
     """
     Key/value pair in the MultiPart body
@@ -201,6 +604,125 @@ class MultiPartOption(object):
         self.val = val
 
 
+class HttpApiResponse(object):
+    """
+    The parts of a requests.Response that the tetration modules use, rebuilt
+    from the data returned by the httpapi connection plugin.
+    """
+
+    def __init__(self, status_code, reason='', headers=None, text='', url=''):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers or {}
+        self.text = text
+        self.url = url
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def content(self):
+        return self.text.encode('utf-8')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class HttpApiRestClient(object):
+    """
+    Drop in replacement for RestClient used when a play runs with
+    `connection: httpapi`. Requests are handed to the tetration httpapi plugin,
+    which signs them and sends them over its persistent keep-alive session.
+
+    The retry and rate limit options of the provider are sent along with
+    every request, the plugin retries and waits for the token bucket with
+    them and reports back the retries made and the seconds waited.
+
+    Attributes:
+        connection: ansible.module_utils.connection.Connection to the
+        persistent connection of the inventory host
+        timeouts: RequestTimeouts of the requests sent by the module
+        metrics: RequestMetrics recording every request, or None
+        tuning: Dictionary of the TUNING_OPTIONS set in the provider
+        retry_stats: Dictionary of the retries made by the plugin and the
+        seconds slept before them
+        rate_limit_wait: Float of seconds the plugin waited for the rate limiter
+
+    Constants:
+        TUNING_OPTIONS: provider options applied by the plugin's RestClient
+    """
+    TUNING_OPTIONS = ['max_retries', 'retry_backoff_base', 'retry_backoff_max', 'retry_deadline',
+                      'retry_method_budgets', 'rate_limit', 'rate_limit_burst', 'cache_dir']
+
+    def __init__(self, connection, timeouts=None, metrics=None, tuning=None):
+        self.connection = connection
+        self.timeouts = timeouts or RequestTimeouts()
+        self.metrics = metrics
+        self.tuning = dict((k, v) for k, v in (tuning or {}).items() if k in self.TUNING_OPTIONS and v is not None)
+        self.retry_stats = {'retries': 0, 'sleep_seconds': 0.0}
+        self.rate_limit_wait = 0.0
+
+    def get_identity(self):
+        """
+        Returns the server_endpoint and api_key the connection uses
+        """
+        return self.connection.get_identity()
+
+    def signed_http_request(self, http_method, uri_path, args=None):
+        """
+        Send a signed http request through the persistent connection.
+        Returns a HttpApiResponse.
+
+        Args:
+            http_method: String HTTP method like 'GET', 'PUT', 'POST', ...
+            uri_path: Additional string URI path for query
+            args: Additional dictionary of arguments
+                "params": Additional dictionary of parameters for GET and PUT
+                "json_body": String JSON body
+                "timeout": Float of timeout in seconds
+
+        Returns:
+            HttpApiResponse object for the request
+        """
+        args = {} if args is None else args
+        started_at = time.time()
+        kwargs = {'tuning': self.tuning} if self.tuning else {}
+        try:
+            reply = self.connection.send_request(
+                args.get('json_body', ''),
+                method=http_method,
+                path=uri_path,
+                params=args.get('params'),
+                timeout=self.timeouts.for_request(uri_path, args.get('timeout')),
+                **kwargs)
+        except Exception:
+            if self.metrics is not None:
+                self.metrics.record(http_method, uri_path, None, time.time() - started_at, 0)
+            raise
+        stats = reply.pop('stats', None) or {}
+        self.retry_stats['retries'] += stats.get('retries', 0)
+        self.retry_stats['sleep_seconds'] += stats.get('sleep_seconds', 0.0)
+        self.rate_limit_wait += stats.get('rate_limit_wait', 0.0)
+        response = HttpApiResponse(**reply)
+        if self.metrics is not None:
+            self.metrics.record(http_method, uri_path, response.status_code, time.time() - started_at,
+                                len(response.content), stats.get('retries', 0), stats.get('throttled', 0))
+        return response
+
+    def get(self, uri_path='', **kwargs):
+        return self.signed_http_request('GET', uri_path, kwargs)
+
+    def post(self, uri_path='', **kwargs):
+        return self.signed_http_request('POST', uri_path, kwargs)
+
+    def put(self, uri_path='', **kwargs):
+        return self.signed_http_request('PUT', uri_path, kwargs)
+
+    def delete(self, uri_path='', **kwargs):
+        return self.signed_http_request('DELETE', uri_path, kwargs)
+
+
 class RestClient(object):
     """
     A high-level client class for communication with Tetration API server.
@@ -221,10 +743,6 @@ class RestClient(object):
     __MULTIPART_BOUNDARY_ID = 'CiscoTetrationClient'
     __MULTIPART_FILE_ID = 'file'
     __DEFAULT_MAX_RETRIES = 3
-    __DEFAULT_TIMEOUT = 10
-    __RETRY_HTTP_CODES = [429, 502, 503, 504]
-    __RETRY_METHODS = ['GET', 'PUT', 'DELETE']
-    __SLEEP_BETWEEN_RETRIES_SEC = 2
 
     SUPPORTED_METHODS = ['GET', 'PUT', 'POST', 'DELETE', 'PATCH']
 
@@ -260,6 +778,24 @@ class RestClient(object):
                 api_key: String of hex API key provided by Tetration UI.
                 api_secret: String of hex API secret provided by Tetration UI.
                 max_retries: int for max retries for requests
+                retry_backoff_base: float of the smallest sleep between retries
+                retry_backoff_max: float of the largest computed sleep
+                retry_deadline: float of seconds after which no retries are made
+                retry_method_budgets: dict of HTTP method to number of attempts
+                retry_policy: RetryPolicy, replaces all of the retry_* options
+                rate_limit: float of requests per second shared by every
+                process using the same server_endpoint and api_key
+                rate_limit_burst: int of requests that may be sent at once
+                cache_dir: directory holding the shared rate limiter state
+                timeout: float of seconds to wait for a response
+                connect_timeout: float of seconds to wait for the connection,
+                defaults to timeout
+                route_timeouts: dict of route pattern to timeout, e.g.
+                {'/applications/*/details': 60}
+                task_deadline: float of seconds all requests sent through this
+                client may take together
+                timeouts: RequestTimeouts, replaces all of the timeout options
+                metrics: Boolean to record the RequestMetrics of every request
         """
         self.server_endpoint = server_endpoint
         self.uri_prefix = '/openapi/' + kwargs.get('api_version', 'v1')
@@ -272,6 +808,13 @@ class RestClient(object):
         self.verify = kwargs.get('verify', True)
         self.session = requests.Session()
         self.retries = kwargs.get('max_retries', self.__DEFAULT_MAX_RETRIES)
+        self.retry_policy = kwargs.get('retry_policy') or RetryPolicy.from_options(
+            dict(kwargs, max_retries=self.retries))
+        self.retry_stats = {'retries': 0, 'sleep_seconds': 0.0}
+        self.rate_limiter = TokenBucket.from_options(self.server_endpoint, self.api_key, kwargs)
+        self.rate_limit_wait = 0.0
+        self.timeouts = kwargs.get('timeouts') or RequestTimeouts.from_options(kwargs)
+        self.metrics = RequestMetrics.from_options(kwargs)
 
     def __add_auth_header(self, req):
         """
@@ -356,33 +899,99 @@ class RestClient(object):
         else:
             return self.uri_prefix + uri_path
 
-    def __send_request(self, req, retries, timeout):
+    def __send_request(self, req, retries, route, timeout=None, stream=False):
         """
-         Retries a request `retries` times. Returns a requests.Response.
+         Retries a request up to `retries` times following the retry policy.
+         Returns a requests.Response.
 
          Args:
              req: requests.Request object for the request
-             retries: Number of times to retry the request
-             timeout: Float of timeout in seconds
+             retries: Number of times to send the request
+             route: String URI path of the request without the API prefix
+             timeout: Float of read timeout in seconds, replaces the
+             configured timeout of the route
+             stream: Boolean to read the response body only when accessed
 
          Returns:
              requests.Response object for the request
          """
+        if self.metrics is None:
+            return self.__send_with_retries(req, retries, route, timeout, stream, {'retries': 0, 'throttled': 0})
+        counts = {'retries': 0, 'throttled': 0}
+        started_at = time.time()
+        try:
+            response = self.__send_with_retries(req, retries, route, timeout, stream, counts)
+        except Exception:
+            self.metrics.record(req.method, route, None, time.time() - started_at, 0, counts['retries'],
+                                counts['throttled'])
+            raise
+        if stream:
+            # The body is only read once the caller streams it
+            size = int(response.headers.get('Content-Length') or 0)
+        else:
+            size = len(response.content or b'')
+        self.metrics.record(req.method, route, response.status_code, time.time() - started_at, size,
+                            counts['retries'], counts['throttled'])
+        return response
+
+    def __send_with_retries(self, req, retries, route, timeout, stream, counts):
+        """
+        Sends the request of `__send_request`, counting the retries made and
+        the throttled (429) responses received in the `retries` and
+        `throttled` keys of the `counts` dict
+        """
         response = None
+        last_error = None
+        started_at = time.time()
+        sleep_time = None
         for retry_count in range(retries):
+            if self.rate_limiter is not None:
+                self.rate_limit_wait += self.rate_limiter.acquire()
             try:
                 response = self.session.send(req,
-                                             timeout=timeout,
-                                             verify=self.verify)
-            except requests.exceptions.RequestException:
+                                             timeout=self.timeouts.for_request(route, timeout),
+                                             verify=self.verify,
+                                             stream=stream)
+            except requests.exceptions.RequestException as exc:
+                if self.__deadline_passed(0):
+                    raise DeadlineExceeded('Task deadline of %s seconds exceeded while requesting %s: %s' % (
+                        self.timeouts.task_deadline, route, exc))
                 if retry_count == retries - 1:
                     raise
+                failed_response = None
+                last_error = exc
             else:
-                if response.status_code not in self.__RETRY_HTTP_CODES:
+                if response.status_code == 429:
+                    counts['throttled'] += 1
+                if not self.retry_policy.should_retry(response):
                     return response
-            time.sleep(self.__SLEEP_BETWEEN_RETRIES_SEC)
+                if retry_count == retries - 1:
+                    break
+                failed_response = response
+
+            sleep_time = self.retry_policy.next_sleep(sleep_time, failed_response)
+            remaining = self.retry_policy.remaining(started_at)
+            if (remaining is not None and sleep_time > remaining) or self.__deadline_passed(sleep_time):
+                # Waiting would overrun a deadline, report what we have
+                if failed_response is None:
+                    if self.__deadline_passed(sleep_time):
+                        raise DeadlineExceeded('Task deadline of %s seconds exceeded while requesting %s: %s' % (
+                            self.timeouts.task_deadline, route, last_error))
+                    raise last_error
+                break
+            self.retry_stats['retries'] += 1
+            self.retry_stats['sleep_seconds'] += sleep_time
+            counts['retries'] += 1
+            time.sleep(sleep_time)
         return response
 
+    def __deadline_passed(self, after):
+        """
+        Returns True when the task deadline has passed `after` seconds from now
+        """
+        remaining = self.timeouts.remaining()
+        return remaining is not None and after >= remaining
+
     def signed_http_request(self, http_method, uri_path, args=None):
         """
         Send a signed http request to the server. Returns a requests.Response.
@@ -409,7 +1018,6 @@ class RestClient(object):
         args = {} if args is None else args
         params = args.get('params')
         json_body = args.get('json_body', '')
-        timeout = args.get('timeout', self.__DEFAULT_TIMEOUT)
         unprep_req = requests.Request(
             http_method,
             urljoin(self.server_endpoint, uri_path),
@@ -419,10 +1027,104 @@ class RestClient(object):
         req.headers['Content-Type'] = 'application/json'
         self.__add_custom_headers(req)
         self.__add_auth_header(req)
-        retries = 1
-        if http_method in self.__RETRY_METHODS:
-            retries = max(self.retries, 1)
-        return self.__send_request(req, retries, timeout)
+        retries = self.retry_policy.attempts_for(http_method)
+        route = route_of(uri_path, self.uri_prefix)
+        return self.__send_request(req, retries, route, args.get('timeout'))
+
+    def upload(self, file_path, uri_path, multipart_args=None, timeout=None):
+        """
+        Uploads a file as multipart/form-data. Returns a requests.Response.
+
+        The body is assembled in a temporary file and streamed from there, so
+        large uploads such as the annotations of every IP of a cluster are
+        never held in memory. Uploads are sent once, without retries.
+
+        Args:
+            file_path: String path of the file to upload
+            uri_path: Additional string URI path for query
+            multipart_args: List of MultiPartOption sent as form fields
+            before the file, e.g. MultiPartOption('X-Tetration-Oper', 'add')
+            timeout: Float of read timeout in seconds
+
+        Returns:
+            requests.Response object for the request
+        """
+        if not self.api_key or not self.api_secret:
+            warnings.warn('API Key or Secret is missing. Returning None')
+            return None
+
+        uri_path = self.__prefix_path(uri_path)
+        with tempfile.TemporaryFile() as body:
+            checksum = self.__write_multipart_body(body, file_path, multipart_args or [])
+            unprep_req = requests.Request(
+                'POST',
+                urljoin(self.server_endpoint, uri_path),
+                data=body)
+            req = self.session.prepare_request(unprep_req)
+            req.headers['Content-Type'] = (
+                'multipart/form-data; boundary=%s' % self.__MULTIPART_BOUNDARY_ID)
+            req.headers['X-Tetration-Cksum'] = checksum
+            self.__add_custom_headers(req, checksum=False)
+            self.__add_auth_header(req)
+            route = route_of(uri_path, self.uri_prefix)
+            return self.__send_request(req, 1, route, timeout)
+
+    def download(self, file_path, uri_path, timeout=None):
+        """
+        Downloads the response body of a GET into a file without holding it
+        in memory. Returns the requests.Response, the file is only written
+        when the status code is 200.
+
+        Args:
+            file_path: String path of the file to write
+            uri_path: Additional string URI path for query
+            timeout: Float of read timeout in seconds
+
+        Returns:
+            requests.Response object for the request
+        """
+        if not self.api_key or not self.api_secret:
+            warnings.warn('API Key or Secret is missing. Returning None')
+            return None
+
+        uri_path = self.__prefix_path(uri_path)
+        unprep_req = requests.Request('GET', urljoin(self.server_endpoint, uri_path))
+        req = self.session.prepare_request(unprep_req)
+        self.__add_custom_headers(req)
+        self.__add_auth_header(req)
+        route = route_of(uri_path, self.uri_prefix)
+        retries = self.retry_policy.attempts_for('GET')
+        response = self.__send_request(req, retries, route, timeout, stream=True)
+        if response.status_code == 200:
+            with open(file_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    f.write(chunk)
+        return response
+
+    def __write_multipart_body(self, body, file_path, multipart_args):
+        """
+        Writes the multipart body of an upload to the binary file `body`.
+        Returns the hex sha256 checksum of the body.
+        """
+        boundary = ('--%s\r\n' % self.__MULTIPART_BOUNDARY_ID).encode('utf-8')
+        for option in multipart_args:
+            body.write(boundary)
+            body.write(('Content-Disposition: form-data; name="%s"\r\n\r\n%s\r\n' % (
+                option.key, option.val)).encode('utf-8'))
+        body.write(boundary)
+        body.write(('Content-Disposition: form-data; name="%s"; filename="%s"\r\n'
+                    'Content-Type: text/csv\r\n\r\n' % (
+                        self.__MULTIPART_FILE_ID, os.path.basename(file_path))).encode('utf-8'))
+        with open(file_path, 'rb') as f:
+            shutil.copyfileobj(f, body)
+        body.write(('\r\n--%s--\r\n' % self.__MULTIPART_BOUNDARY_ID).encode('utf-8'))
+
+        body.seek(0)
+        signer = hashlib.sha256()
+        for chunk in iter(lambda: body.read(65536), b''):
+            signer.update(chunk)
+        body.seek(0)
+        return signer.hexdigest()
 
     def get(self, uri_path='', **kwargs):
         """
@@ -492,3 +1194,73 @@ class RestClient(object):
         return self.signed_http_request(
             http_method='DELETE', uri_path=self.__prefix_path(uri_path),
             args=kwargs)
+
+
+class AsyncRestClient(object):
+    """
+    Sends the requests of a RestClient concurrently from asyncio.
+
+    requests is blocking, so every request runs on one of `max_concurrency`
+    worker threads while a semaphore bounds how many are in flight. The
+    wrapped client signs, retries, rate limits and times out each request
+    exactly like it does when used on its own. An instance is meant to be
+    used from a single event loop.
+
+    Attributes:
+        rest_client: RestClient or HttpApiRestClient sending the requests
+        max_concurrency: Int of the maximum number of requests in flight
+    """
+    DEFAULT_MAX_CONCURRENCY = 8
+
+    def __init__(self, rest_client, max_concurrency=None):
+        self.rest_client = rest_client
+        self.max_concurrency = max(int(max_concurrency or self.DEFAULT_MAX_CONCURRENCY), 1)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        self._semaphore = None
+        session = getattr(rest_client, 'session', None)
+        if session is not None and self.max_concurrency > requests.adapters.DEFAULT_POOLSIZE:
+            # Keep a pooled connection for each request in flight
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.max_concurrency)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+
+    async def request(self, http_method, uri_path='', **kwargs):
+        """
+        Sends one request through the wrapped client. Returns its response.
+
+        Args:
+            http_method: String HTTP method like 'GET', 'PUT', 'POST', ...
+            uri_path: Additional string URI path for query
+            kwargs: Keyword arguments of the RestClient method
+        """
+        if self._semaphore is None:
+            # Created here so it belongs to the running event loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        send = functools.partial(getattr(self.rest_client, http_method.lower()), uri_path, **kwargs)
+        async with self._semaphore:
+            return await asyncio.get_event_loop().run_in_executor(self._executor, send)
+
+    async def gather(self, requests_to_send):
+        """
+        Sends (http_method, uri_path, kwargs) requests concurrently.
+        Returns their responses in order, with the exception in place of
+        the response of a request that raised.
+        """
+        return await asyncio.gather(
+            *[self.request(method, uri_path, **kwargs) for method, uri_path, kwargs in requests_to_send],
+            return_exceptions=True)
+
+    async def get(self, uri_path='', **kwargs):
+        return await self.request('GET', uri_path, **kwargs)
+
+    async def post(self, uri_path='', **kwargs):
+        return await self.request('POST', uri_path, **kwargs)
+
+    async def put(self, uri_path='', **kwargs):
+        return await self.request('PUT', uri_path, **kwargs)
+
+    async def delete(self, uri_path='', **kwargs):
+        return await self.request('DELETE', uri_path, **kwargs)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,207 @@
+# This file contains the client side diff of user annotation (CMDB) uploads
+
+import csv
+import hashlib
+import json
+
+from ipaddress import ip_address, ip_network
+
+KEY_COLUMNS = ['ip', 'vrf']
+
+
+def normalize_ip(value):
+    ''' Returns the IP address or subnet `value` the way it is compared,
+    host subnets such as 10.0.0.1/32 are the address itself
+    '''
+    value = value.strip()
+    try:
+        if '/' not in value:
+            return str(ip_address(value))
+        network = ip_network(value, strict=False)
+    except ValueError:
+        return value
+    if network.prefixlen == network.max_prefixlen:
+        return str(network.network_address)
+    return str(network)
+
+
+class AnnotationDiff(object):
+    """
+    Works out which rows of an annotation upload change anything on the cluster.
+
+    The current annotations, as downloaded from the cluster, are indexed as a
+    short digest per IP/subnet (and VRF when the upload has a VRF column), so
+    only the keys and digests are held in memory. The desired rows are then
+    streamed and compared against that index one at a time, and only new and
+    changed rows are written out for upload.
+
+    Rows are compared like `TetrationApiModule.is_subset` compares a single
+    IP: a `merge` row is unchanged when the columns it uploads already hold
+    its values, an `add` row only when the IP has exactly its annotations.
+
+    Attributes:
+        operation: String of the upload operation, add, merge or delete
+        prune: Boolean to delete the annotations of keys missing from the
+        desired rows
+        counts: Dictionary of the number of new, changed, unchanged and
+        deleted rows
+    """
+
+    def __init__(self, operation='merge', prune=False):
+        self.operation = operation
+        self.prune = prune
+        self.counts = {'new': 0, 'changed': 0, 'unchanged': 0, 'deleted': 0}
+        self._current = {}
+        self._columns = None
+        self._use_vrf = False
+
+    def compare(self, current_file, desired_file, changes_file, deletes_file):
+        """
+        Compares the CSV file objects `current_file` and `desired_file`.
+
+        Rows to upload with `operation` are written to `changes_file`, the
+        keys whose annotations are to be deleted to `deletes_file`. Both get a
+        header row. Returns `counts`.
+        """
+        desired = csv.reader(desired_file)
+        header = next(desired, None)
+        if header is None:
+            return self.counts
+        key_indexes, columns = self._split_header(header)
+        self._use_vrf = 'vrf' in key_indexes
+        self._columns = columns
+        self._index(current_file)
+
+        changes = csv.writer(changes_file)
+        deletes = csv.writer(deletes_file)
+        key_header = ['IP', 'VRF'] if self._use_vrf else ['IP']
+        changes.writerow(header)
+        deletes.writerow(key_header)
+
+        for row in desired:
+            if not row:
+                continue
+            key = self._key(row, key_indexes)
+            current_digest = self._current.pop(key, None)
+            if self.operation == 'delete':
+                if current_digest is None:
+                    self.counts['unchanged'] += 1
+                else:
+                    self.counts['deleted'] += 1
+                    deletes.writerow(list(key))
+                continue
+            if current_digest is None:
+                self.counts['new'] += 1
+            elif current_digest != self._digest(self._values(row, header)):
+                self.counts['changed'] += 1
+            else:
+                self.counts['unchanged'] += 1
+                continue
+            changes.writerow(row)
+
+        if self.prune and self.operation != 'delete':
+            # Whatever is left in the index was not part of the desired rows
+            for key in self._current:
+                self.counts['deleted'] += 1
+                deletes.writerow(list(key))
+        self._current = {}
+        return self.counts
+
+    def _index(self, current_file):
+        reader = csv.reader(current_file)
+        header = next(reader, None)
+        if header is None:
+            return
+        key_indexes = self._split_header(header)[0]
+        for row in reader:
+            if row:
+                self._current[self._key(row, key_indexes)] = self._digest(self._values(row, header))
+
+    def _split_header(self, header):
+        ''' Returns the index of the key columns and the annotation columns '''
+        key_indexes = {}
+        columns = []
+        for index, column in enumerate(header):
+            if column.strip().lower() in KEY_COLUMNS:
+                key_indexes[column.strip().lower()] = index
+            else:
+                columns.append(column)
+        if 'ip' not in key_indexes:
+            raise ValueError('The first row of the CSV must name an IP column, got: %s' % ', '.join(header))
+        return key_indexes, columns
+
+    def _key(self, row, key_indexes):
+        ip = normalize_ip(row[key_indexes['ip']])
+        if not self._use_vrf:
+            return (ip,)
+        vrf_index = key_indexes.get('vrf')
+        vrf = row[vrf_index] if vrf_index is not None and vrf_index < len(row) else ''
+        return (ip, vrf)
+
+    def _values(self, row, header):
+        ''' Returns the annotations of `row` as a column -> value dictionary '''
+        values = {}
+        for index, column in enumerate(header):
+            if column.strip().lower() not in KEY_COLUMNS:
+                values[column] = row[index] if index < len(row) else ''
+        return values
+
+    def _digest(self, values):
+        if self.operation == 'merge':
+            # Only the uploaded columns are changed by a merge
+            compared = [values.get(column, '') for column in self._columns]
+        else:
+            compared = sorted((k, v) for k, v in values.items() if v != '')
+        return hashlib.sha256(json.dumps(compared).encode('utf-8')).digest()[:16]
+
+
+class AnnotationLookup(object):
+    """
+    Finds the annotations of an IP address in a CSV of annotations, as
+    downloaded from the cluster.
+
+    Rows are indexed by subnet, an address being a subnet of a single host.
+    A lookup tries the prefix lengths used by the rows from the longest to the
+    shortest, so the most specific subnet holding the address wins and the
+    cost does not depend on the number of rows. The VRF column is ignored.
+    """
+
+    def __init__(self, csv_file):
+        self._networks = {}
+        self._prefix_lengths = {4: [], 6: []}
+        reader = csv.reader(csv_file)
+        header = next(reader, None)
+        if header is None:
+            return
+        names = [column.strip().lower() for column in header]
+        if 'ip' not in names:
+            raise ValueError('The first row of the CSV must name an IP column, got: %s' % ', '.join(header))
+        ip_index = names.index('ip')
+        columns = [(i, c) for i, c in enumerate(header) if c.strip().lower() not in KEY_COLUMNS]
+        prefix_lengths = {4: set(), 6: set()}
+        for row in reader:
+            if not row:
+                continue
+            try:
+                network = ip_network(row[ip_index].strip(), strict=False)
+            except ValueError:
+                continue
+            values = dict((c, row[i]) for i, c in columns if i < len(row) and row[i] != '')
+            self._networks[(network.version, network.prefixlen, int(network.network_address))] = values
+            prefix_lengths[network.version].add(network.prefixlen)
+        for version, lengths in prefix_lengths.items():
+            self._prefix_lengths[version] = sorted(lengths, reverse=True)
+
+    def lookup(self, address):
+        ''' Returns the annotations of the IP address string `address`, None when it has none '''
+        try:
+            address = ip_address(address)
+        except ValueError:
+            return None
+        packed = int(address)
+        for prefix_length in self._prefix_lengths[address.version]:
+            host_bits = address.max_prefixlen - prefix_length
+            values = self._networks.get((address.version, prefix_length, packed >> host_bits << host_bits))
+            if values is not None:
+                return values
+        return None
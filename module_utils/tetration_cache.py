@@ -0,0 +1,271 @@
+# This file contains the on-disk cache shared by concurrent tetration module
+# runs and the in memory memo of the GETs of a single run
+
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from contextlib import contextmanager
+from ansible.module_utils.parsing.convert_bool import boolean
+from . import tetration_constants
+
+
+DEFAULT_CACHE_DIR = os.path.join('~', '.ansible', 'tetration_cache')
+
+# Seconds the listings of a run are kept when the provider sets no cache_ttl,
+# the caches of runs that stored nothing for as long are removed
+RUN_CACHE_TTL = 3600
+
+
+def resolve_state_dir(state_dir=None):
+    ''' Returns the expanded directory used for cache and coordination files,
+    creating it with owner only permissions if it does not exist yet
+    '''
+    state_dir = os.path.expanduser(state_dir or DEFAULT_CACHE_DIR)
+    if not os.path.isdir(state_dir):
+        os.makedirs(state_dir, mode=0o700, exist_ok=True)
+    return state_dir
+
+
+def credentials_digest(server_endpoint, api_key):
+    ''' Returns a digest identifying a cluster and API key without exposing the key '''
+    if isinstance(api_key, bytes):
+        api_key = api_key.decode('ascii')
+    namespace = '%s\n%s' % (server_endpoint or '', api_key or '')
+    return hashlib.sha256(namespace.encode('utf-8')).hexdigest()
+
+
+@contextmanager
+def locked_file(path, shared=False):
+    ''' Holds an advisory lock on `path` for the duration of the block
+
+    The lock is released when the block exits, including when the process
+    dies, so a crashed fork can never leave the cache wedged.
+    '''
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield fd
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+class ReferenceDataCache(object):
+    """
+    Caches GET responses for the reference data collections listed in
+    tetration_constants.TETRATION_API_CACHEABLE_ROUTES so that every fork of a
+    play can share a single download of e.g. the full scope list.
+
+    Entries are keyed by server endpoint, API key, collection route and query
+    parameters. Any write to a collection (or one of its sub routes) evicts
+    every cached entry of that collection.
+
+    Attributes:
+        cache_dir: String of the directory the cache files are stored in
+        ttl: Int of seconds a cached response stays valid
+    """
+
+    def __init__(self, cache_dir, ttl, server_endpoint, api_key):
+        self.cache_dir = resolve_state_dir(cache_dir)
+        self.ttl = ttl
+        self.namespace = credentials_digest(server_endpoint, api_key)
+
+    @classmethod
+    def from_provider(cls, provider):
+        ''' Returns a cache for the provider or None when caching is disabled '''
+        ttl = int(provider.get('cache_ttl') or 0)
+        if ttl <= 0:
+            return None
+        return cls(provider.get('cache_dir'), ttl, provider.get('server_endpoint'), provider.get('api_key'))
+
+    @classmethod
+    def for_run(cls, provider, run_id):
+        ''' Returns a cache private to the play or playbook run `run_id`, for
+        the listings the controller shares between the forks of a run when the
+        provider sets no `cache_ttl`
+
+        Each run has its own directory, the first fork of a new run removes
+        those of past runs.
+        '''
+        runs_dir = os.path.join(resolve_state_dir(provider.get('cache_dir')), 'runs')
+        run_dir = os.path.join(runs_dir, hashlib.sha256(str(run_id).encode('utf-8')).hexdigest()[:32])
+        if not os.path.isdir(run_dir):
+            prune_runs(runs_dir)
+        return cls(run_dir, RUN_CACHE_TTL, provider.get('server_endpoint'), provider.get('api_key'))
+
+    def _collection(self, target):
+        ''' Returns the cacheable collection `target` belongs to, if any '''
+        target = target.rstrip('/')
+        for route in tetration_constants.TETRATION_API_CACHEABLE_ROUTES:
+            if target == route or target.startswith(route + '/'):
+                return route
+        return None
+
+    def _prefix(self, collection):
+        digest = hashlib.sha256(('%s\n%s' % (self.namespace, collection)).encode('utf-8'))
+        return os.path.join(self.cache_dir, digest.hexdigest()[:32])
+
+    def _entry_path(self, collection, params):
+        params_key = json.dumps(params or {}, sort_keys=True, default=str)
+        digest = hashlib.sha256(params_key.encode('utf-8')).hexdigest()[:32]
+        return '%s-%s.json' % (self._prefix(collection), digest)
+
+    def is_cacheable(self, target):
+        ''' Only full collection listings are cached, not individual objects '''
+        return self._collection(target) == target.rstrip('/')
+
+    def get(self, target, params=None):
+        ''' Returns the cached response for `target` or None on a miss '''
+        if not self.is_cacheable(target):
+            return None
+        collection = self._collection(target)
+        entry_path = self._entry_path(collection, params)
+        with locked_file(self._prefix(collection) + '.lock', shared=True):
+            try:
+                with open(entry_path) as entry_file:
+                    entry = json.load(entry_file)
+            except (IOError, OSError, ValueError):
+                return None
+        if time.time() - entry.get('stored_at', 0) >= self.ttl:
+            return None
+        return entry.get('data')
+
+    def set(self, target, params, data, fetched_at):
+        ''' Stores `data` unless the collection was written to after `fetched_at`
+
+        `fetched_at` is the time the GET was started. Refusing older responses
+        keeps a slow reader from re-populating the cache with a list that a
+        concurrent writer has just made stale.
+        '''
+        if not self.is_cacheable(target):
+            return False
+        collection = self._collection(target)
+        prefix = self._prefix(collection)
+        with locked_file(prefix + '.lock'):
+            if fetched_at < self._invalidated_at(prefix):
+                return False
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as tmp_file:
+                    json.dump({'stored_at': time.time(), 'data': data}, tmp_file)
+                os.replace(tmp_path, self._entry_path(collection, params))
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+        return True
+
+    def fill_lock(self, target):
+        ''' Returns a lock to hold while downloading the collection `target` after
+        a miss, so concurrent processes wait for one download instead of each
+        making their own
+        '''
+        return locked_file(self._prefix(self._collection(target)) + '.fill')
+
+    def invalidate(self, target):
+        ''' Evicts every cached entry of the collection `target` writes to '''
+        collection = self._collection(target)
+        if collection is None:
+            return
+        prefix = self._prefix(collection)
+        with locked_file(prefix + '.lock'):
+            with open(prefix + '.stamp', 'w') as stamp_file:
+                stamp_file.write(repr(time.time()))
+            for entry_path in glob.glob(prefix + '-*.json'):
+                os.unlink(entry_path)
+
+    def _invalidated_at(self, prefix):
+        try:
+            with open(prefix + '.stamp') as stamp_file:
+                return float(stamp_file.read())
+        except (IOError, OSError, ValueError):
+            return 0.0
+
+
+def prune_runs(runs_dir, max_age=RUN_CACHE_TTL):
+    ''' Removes the run caches in `runs_dir` nothing was stored in for `max_age` seconds
+
+    Storing an entry replaces a file in the directory of the run, which
+    updates its modification time.
+    '''
+    expired_at = time.time() - max_age
+    for run_dir in glob.glob(os.path.join(runs_dir, '*')):
+        try:
+            if os.path.getmtime(run_dir) < expired_at:
+                shutil.rmtree(run_dir, ignore_errors=True)
+        except OSError:
+            # Removed by a fork of another run
+            pass
+
+
+def routes_overlap(first, second):
+    ''' Returns True when one of the routes is the other or one of its sub routes '''
+    return first == second or first.startswith(second + '/') or second.startswith(first + '/')
+
+
+class ResponseMemo(object):
+    """
+    Remembers the body of every successful GET of a module run, keyed by
+    route and query parameters, so a module that repeats a GET, e.g. of the
+    same role in two branches, gets the answer without another request.
+
+    Bodies are kept as sent by the cluster and decoded again on every hit, so
+    callers that change the objects they get never see each other's changes.
+    A write evicts every entry whose route is the written route, one of its
+    sub routes or one of its parents.
+
+    Attributes:
+        hits: Int of the GETs answered from the memo
+        misses: Int of the GETs the memo could not answer
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._bodies = {}
+
+    @classmethod
+    def from_options(cls, options):
+        ''' Returns a memo for the provider options, None when `memoize_gets` is disabled '''
+        if not boolean(options.get('memoize_gets', True)):
+            return None
+        return cls()
+
+    @staticmethod
+    def key(target, params=None):
+        return (target.rstrip('/'), json.dumps(params or {}, sort_keys=True, default=str))
+
+    def get(self, target, params=None):
+        ''' Returns the decoded body of the GET of `target`, None on a miss '''
+        body = self._bodies.get(self.key(target, params))
+        if body is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(body)
+
+    def set(self, target, params, body):
+        ''' Remembers the undecoded `body` of a successful GET '''
+        self._bodies[self.key(target, params)] = body
+
+    def count_hit(self):
+        ''' Counts a GET answered by an identical GET that was sent at the same time '''
+        self.hits += 1
+
+    def invalidate(self, target):
+        ''' Evicts the entries a write to `target` may have made stale '''
+        route = target.rstrip('/')
+        for key in [k for k in self._bodies if routes_overlap(k[0], route)]:
+            self._bodies.pop(key)
+
+    def clear(self):
+        self._bodies.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
@@ -12,6 +12,10 @@ TETRATION_API_APPLICATION_POLICIES = '/policies'
 TETRATION_API_AGENT_CONFIG_PROFILES = '/inventory_config/profiles'
 TETRATION_API_AGENT_CONFIG_INTENTS = '/inventory_config/intents'
 TETRATION_COLUMN_NAMES = '/assets/cmdb/attributenames'
+TETRATION_API_INVENTORY_TAG_UPLOAD = '/assets/cmdb/upload'
+TETRATION_API_INVENTORY_TAG_DOWNLOAD = '/assets/cmdb/download'
+# Values of the X-Tetration-Oper field of an annotation upload
+TETRATION_API_INVENTORY_TAG_UPLOAD_OPERATIONS = ['add', 'merge', 'delete']
 TETRATION_API_APP_SCOPE_CAPABILITIES = ['SCOPE_READ', 'SCOPE_WRITE', 'EXECUTE',
                                         'ENFORCE', 'SCOPE_OWNER', 'DEVELOPER']
 
@@ -21,6 +25,18 @@ TETRATION_API_SUCCESS_CODES = [200, 202]
 TETRATION_API_FAILURE_CODES_THAT_RETURN_DATA = [422]
 
 TETRATION_API_PAGINATION_SIZE = 100
+# Bounds of the page size when it is adapted to the cluster (`page_size_adaptive`)
+TETRATION_API_MIN_PAGINATION_SIZE = 10
+TETRATION_API_MAX_PAGINATION_SIZE = 5000
+
+# Reference data collections whose full listing may be cached on disk and
+# shared between module runs (see provider options `cache_ttl`/`cache_dir`)
+TETRATION_API_CACHEABLE_ROUTES = [
+    TETRATION_API_SCOPES,
+    TETRATION_API_INVENTORY_FILTER,
+    TETRATION_API_ROLE,
+    TETRATION_API_AGENT_CONFIG_PROFILES
+]
 
 TETRATION_PROVIDER_SPEC = {
     'server_endpoint': dict(type='str', required=True, aliases=['endpoint', 'host']),
@@ -28,8 +44,27 @@ TETRATION_PROVIDER_SPEC = {
     'api_secret': dict(type='str', required=True, no_log=True),
     'verify': dict(type='bool', default=False),
     'timeout': dict(type='int', default=10),
+    'connect_timeout': dict(type='float'),
+    'route_timeouts': dict(type='dict'),
+    'task_deadline': dict(type='float'),
     'max_retries': dict(type='int', default=3),
-    'api_version': dict(type='str', default='v1')
+    'retry_backoff_base': dict(type='float', default=1.0),
+    'retry_backoff_max': dict(type='float', default=30.0),
+    'retry_deadline': dict(type='float'),
+    'retry_method_budgets': dict(type='dict'),
+    'rate_limit': dict(type='float', default=0),
+    'rate_limit_burst': dict(type='int'),
+    'api_version': dict(type='str', default='v1'),
+    'cache_ttl': dict(type='int', default=0),
+    'cache_dir': dict(type='str'),
+    'pagination_prefetch': dict(type='bool', default=False),
+    'page_size': dict(type='int'),
+    'page_size_adaptive': dict(type='bool', default=False),
+    'metrics': dict(type='bool', default=False),
+    'profile': dict(type='bool', default=False),
+    'profile_memory': dict(type='bool', default=False),
+    'profile_dir': dict(type='str'),
+    'memoize_gets': dict(type='bool', default=True)
 }
 
 TETRATION_API_PROTOCOLS = [
@@ -0,0 +1,241 @@
+# This file contains in memory indexes over listings downloaded from tetration
+
+from bisect import bisect_left, bisect_right
+from ipaddress import ip_address
+
+
+def l4_param_key(proto, start_port=None, end_port=None):
+    ''' Returns the key an l4 param is matched by, ports only tell TCP and UDP params apart '''
+    if proto in (6, 17):
+        return (proto, start_port, end_port)
+    return (proto, None, None)
+
+
+def _port(port):
+    # Protocols without ports are indexed as a range of port -1
+    return -1 if port is None else port
+
+
+def merge_port_ranges(ranges):
+    ''' Groups the (start_port, end_port, value) tuples `ranges` of one protocol
+    into overlapping or adjacent runs, e.g. 80-90 and 91-100 make 80-100
+
+    Returns a list of (start_port, end_port, values) tuples in port order
+    '''
+    merged = []
+    for start, end, value in sorted(ranges, key=lambda r: (r[0], r[1])):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+            merged[-1][2].append(value)
+        else:
+            merged.append([start, end, [value]])
+    return [tuple(m) for m in merged]
+
+
+class PortRangeIndex(object):
+    """
+    Interval index of the port ranges of l4 params.
+
+    The ranges of each protocol are sorted by their start port together with
+    the running maximum of their end ports, so the ranges that contain or
+    overlap a range are found with a binary search instead of a scan of all
+    l4 params. Protocols without ports have a single range, None to None.
+    """
+
+    def __init__(self, ranges=()):
+        by_proto = {}
+        for proto, start, end, value in ranges:
+            by_proto.setdefault(proto, []).append((start, end, value))
+        self._ranges = {}
+        self._starts = {}
+        self._exact = {}
+        self._max_ends = {}
+        for proto, proto_ranges in by_proto.items():
+            proto_ranges.sort(key=lambda r: (_port(r[0]), _port(r[1])))
+            self._ranges[proto] = proto_ranges
+            self._starts[proto] = [_port(r[0]) for r in proto_ranges]
+            max_ends = []
+            for index, (start, end, value) in enumerate(proto_ranges):
+                if not max_ends or _port(end) > _port(proto_ranges[max_ends[-1]][1]):
+                    max_ends.append(index)
+                else:
+                    max_ends.append(max_ends[-1])
+                self._exact.setdefault((proto, start, end), value)
+            self._max_ends[proto] = max_ends
+
+    def exact(self, proto, start_port=None, end_port=None):
+        ''' Returns the value of the range that is exactly `start_port` to `end_port` '''
+        return self._exact.get((proto, start_port, end_port))
+
+    def covering(self, proto, start_port=None, end_port=None):
+        ''' Returns the value of a range that contains `start_port` to `end_port`, None if none does '''
+        starts = self._starts.get(proto)
+        if not starts:
+            return None
+        # Of the ranges starting at or before start_port, the one reaching the
+        # furthest is the only candidate
+        count = bisect_right(starts, _port(start_port))
+        if not count:
+            return None
+        start, end, value = self._ranges[proto][self._max_ends[proto][count - 1]]
+        return value if _port(end) >= _port(end_port) else None
+
+    def overlapping(self, proto, start_port=None, end_port=None):
+        ''' Returns the values of the ranges sharing at least one port with `start_port` to `end_port` '''
+        starts = self._starts.get(proto)
+        if not starts:
+            return []
+        found = []
+        index = bisect_right(starts, _port(end_port)) - 1
+        max_ends = self._max_ends[proto]
+        ranges = self._ranges[proto]
+        while index >= 0 and _port(ranges[max_ends[index]][1]) >= _port(start_port):
+            if _port(ranges[index][1]) >= _port(start_port):
+                found.append(ranges[index][2])
+            index -= 1
+        found.reverse()
+        return found
+
+    def __len__(self):
+        return sum(len(r) for r in self._ranges.values())
+
+
+class NameIndex(object):
+    """
+    Resolves the names and IDs of the scopes and inventory filters that can be
+    used as the consumer or provider of a policy. The `tetration_id` lookup
+    indexes the roles and agent config profiles like inventory filters.
+
+    Scope names take precedence over inventory filter names. Inventory filter
+    names are not unique on the cluster, so a name shared by several filters
+    is only an error when it is resolved.
+
+    Attributes:
+        duplicates: Set of the inventory filter names used by more than one filter
+    """
+
+    def __init__(self, scopes, inventory_filters):
+        self.duplicates = set()
+        self._ids = set()
+        self._scope_names = {}
+        self._filter_names = {}
+        for scope in scopes:
+            self._scope_names[scope['name']] = scope['id']
+            self._ids.add(scope['id'])
+        for inventory_filter in inventory_filters:
+            if inventory_filter['id'] is None:
+                raise ValueError('An ID returned had a value of `None`')
+            if inventory_filter['name'] in self._filter_names:
+                self.duplicates.add(inventory_filter['name'])
+            else:
+                self._filter_names[inventory_filter['name']] = inventory_filter['id']
+            self._ids.add(inventory_filter['id'])
+
+    def resolve(self, filter_id=None, name=None):
+        ''' Returns the ID of the scope or filter with `filter_id` or `name`, None if there is none '''
+        if filter_id:
+            return filter_id if filter_id in self._ids else None
+        if name in self._scope_names:
+            return self._scope_names[name]
+        if name in self.duplicates:
+            raise ValueError(
+                'The Tetration Server has multiple inventory filters with the same name.  '
+                'This is not supported with this module.  '
+                'Duplicate name: %s' % name)
+        return self._filter_names.get(name)
+
+
+class PolicyIndex(object):
+    """
+    Hash index of the policies of an application.
+
+    A policy is identified by its rank, priority, action, consumer and
+    provider, the same fields `tetration_application_policy` matches a policy
+    by, so a lookup costs the same for 10 or 10,000 policies.
+    """
+
+    def __init__(self, policies_by_rank):
+        self._policies = {}
+        for rank, policies in policies_by_rank.items():
+            for policy in policies or []:
+                self._policies.setdefault(self.key(policy, rank), []).append(policy)
+
+    @staticmethod
+    def key(policy, rank):
+        ''' Returns the key of the policy object `policy` of `rank` '''
+        return (rank, policy['priority'], policy['action'], policy['consumer_filter_id'], policy['provider_filter_id'])
+
+    def find(self, key):
+        ''' Returns the list of policies with `key` '''
+        return self._policies.get(key, [])
+
+    def items(self):
+        ''' Returns the (key, policies) pairs of the index '''
+        return self._policies.items()
+
+    def __len__(self):
+        return sum(len(policies) for policies in self._policies.values())
+
+
+class SensorIndex(object):
+    """
+    Index of a snapshot of the software agents by interface address and host name.
+
+    Every interface address is parsed once and kept as an integer in a sorted
+    array per IP version, so an address or a network is found with a binary
+    search over the packed addresses. Host names are kept in a hash for exact
+    lookups and in a sorted array where all names with a prefix are adjacent.
+
+    Attributes:
+        sensors: List of the indexed software agents
+    """
+
+    def __init__(self, sensors):
+        self.sensors = list(sensors)
+        addresses = {4: [], 6: []}
+        self._host_names = {}
+        for position, sensor in enumerate(self.sensors):
+            for interface in sensor.get('interfaces') or []:
+                try:
+                    address = ip_address(interface.get('ip'))
+                except ValueError:
+                    continue
+                addresses[address.version].append((int(address), position))
+            self._host_names.setdefault(sensor.get('host_name'), []).append(position)
+        self._addresses = {}
+        self._positions = {}
+        for version, packed in addresses.items():
+            packed.sort()
+            self._addresses[version] = [a for a, _ in packed]
+            self._positions[version] = [p for _, p in packed]
+        self._sorted_host_names = sorted(n for n in self._host_names if n is not None)
+
+    def by_address(self, address):
+        ''' Returns the software agents with an interface of the ipaddress object `address` '''
+        return self._address_range(address.version, int(address), int(address))
+
+    def in_network(self, network):
+        ''' Returns the software agents with an interface in the ipaddress network object `network` '''
+        return self._address_range(network.version, int(network.network_address), int(network.broadcast_address))
+
+    def by_host_name(self, host_name):
+        ''' Returns the software agents named exactly `host_name` '''
+        return [self.sensors[p] for p in self._host_names.get(host_name, [])]
+
+    def by_host_name_prefix(self, prefix):
+        ''' Returns the software agents whose name starts with `prefix` '''
+        names = self._sorted_host_names
+        positions = []
+        for index in range(bisect_left(names, prefix), len(names)):
+            if not names[index].startswith(prefix):
+                break
+            positions.extend(self._host_names[names[index]])
+        return [self.sensors[p] for p in sorted(positions)]
+
+    def _address_range(self, version, first, last):
+        addresses = self._addresses[version]
+        start = bisect_left(addresses, first)
+        end = bisect_right(addresses, last, start)
+        # A software agent with several matching interfaces is returned once
+        positions = sorted(set(self._positions[version][start:end]))
+        return [self.sensors[p] for p in positions]
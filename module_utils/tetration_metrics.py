@@ -0,0 +1,198 @@
+# This file contains the per task telemetry of the tetration API requests and
+# its aggregation over a play
+
+import math
+import re
+import threading
+import time
+
+from ansible.module_utils.parsing.convert_bool import boolean
+
+# Path segments that are object IDs, e.g. scope IDs and software agent UUIDs
+ID_SEGMENT = re.compile(r'^([0-9a-fA-F]{16,}|[0-9a-fA-F]{8}(-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}|\d+)$')
+
+
+def route_template(route):
+    ''' Returns `route` with the object IDs in its path replaced by `{id}`, so
+    the requests for different objects of a collection are counted together
+    '''
+    return '/'.join('{id}' if ID_SEGMENT.match(segment) else segment for segment in route.split('/'))
+
+
+class RequestMetrics(object):
+    """
+    Records the method, route, status, latency, response size, retries and
+    throttled (429) responses of every request a module sends, and how many
+    requests were saved by the reference data cache, the listings preloaded
+    by the action plugins and the memo of the GETs of the run.
+
+    The requests of `run_many` are recorded from its worker threads, so
+    recording holds a lock.
+
+    Attributes:
+        calls: List of the recorded requests, at most MAX_CALLS of them
+        dropped_calls: Int of the requests recorded beyond MAX_CALLS, which
+        only count towards the summary
+        served: Dict of the number of GETs answered without a request, by
+        `cache`, `preloaded` and `memo`
+
+    Constants:
+        MAX_CALLS: Int of the requests listed one by one, a full scan of the
+        software agents of a large cluster sends thousands
+    """
+    MAX_CALLS = 500
+
+    def __init__(self):
+        self.calls = []
+        self.dropped_calls = 0
+        self.served = {'cache': 0, 'preloaded': 0, 'memo': 0}
+        self._routes = {}
+        self._started_at = time.time()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_options(cls, options):
+        ''' Returns the metrics of the provider options, None unless `metrics` is enabled '''
+        if not boolean(options.get('metrics') or False):
+            return None
+        return cls()
+
+    def record(self, method, route, status_code, latency, response_bytes, retries=0, throttled=0):
+        ''' Records a request, `status_code` is None when no response was received and
+        `throttled` counts the 429 responses among its attempts
+        '''
+        call = {
+            'method': method,
+            'route': route_template(route),
+            'status': status_code,
+            'latency_seconds': round(latency, 4),
+            'response_bytes': response_bytes,
+            'retries': retries,
+            'throttled': throttled,
+        }
+        with self._lock:
+            if len(self.calls) < self.MAX_CALLS:
+                self.calls.append(call)
+            else:
+                self.dropped_calls += 1
+            route_totals = self._routes.setdefault((method, call['route']), {
+                'method': method,
+                'route': call['route'],
+                'requests': 0,
+                'errors': 0,
+                'retries': 0,
+                'throttled': 0,
+                'latency_seconds': 0.0,
+                'max_latency_seconds': 0.0,
+                'response_bytes': 0,
+            })
+            route_totals['requests'] += 1
+            route_totals['errors'] += int(status_code is None or status_code >= 400)
+            route_totals['retries'] += retries
+            route_totals['throttled'] += throttled
+            route_totals['latency_seconds'] += latency
+            route_totals['max_latency_seconds'] = max(route_totals['max_latency_seconds'], latency)
+            route_totals['response_bytes'] += response_bytes
+
+    def record_served(self, source):
+        ''' Records a GET answered from `source`, `cache`, `preloaded` or `memo`, without a request '''
+        with self._lock:
+            self.served[source] += 1
+
+    def as_result(self):
+        ''' Returns the `tet_metrics` module result, the slowest routes first '''
+        with self._lock:
+            routes = sorted((dict(r) for r in self._routes.values()), key=lambda r: -r['latency_seconds'])
+            calls = list(self.calls)
+            served = dict(self.served)
+        for route_totals in routes:
+            route_totals['latency_seconds'] = round(route_totals['latency_seconds'], 4)
+            route_totals['max_latency_seconds'] = round(route_totals['max_latency_seconds'], 4)
+        return {
+            'summary': {
+                'requests': sum(r['requests'] for r in routes),
+                'errors': sum(r['errors'] for r in routes),
+                'retries': sum(r['retries'] for r in routes),
+                'throttled': sum(r['throttled'] for r in routes),
+                'latency_seconds': round(sum(r['latency_seconds'] for r in routes), 4),
+                'response_bytes': sum(r['response_bytes'] for r in routes),
+                'served_from_cache': served['cache'],
+                'served_preloaded': served['preloaded'],
+                'served_from_memo': served['memo'],
+                'elapsed_seconds': round(time.time() - self._started_at, 4),
+            },
+            'routes': routes,
+            'calls': calls,
+            'dropped_calls': self.dropped_calls,
+        }
+
+
+def percentile(values, pct):
+    ''' Returns the nearest-rank `pct` percentile of the sorted list `values`, None when empty '''
+    if not values:
+        return None
+    rank = max(int(math.ceil(pct / 100.0 * len(values))), 1)
+    return values[rank - 1]
+
+
+class PlayMetrics(object):
+    """
+    Aggregates the `tet_metrics` results of the tasks of a play, for the
+    `tetration_metrics` callback plugin.
+
+    Request counts and totals come from the per route totals of each task,
+    the latency percentiles from the requests listed one by one, so a task
+    that sent more than RequestMetrics.MAX_CALLS requests contributes the
+    latencies of its first requests only.
+
+    Attributes:
+        tasks: List of the task results added, with their summary
+    """
+
+    def __init__(self):
+        self.tasks = []
+        self._routes = {}
+        self._latencies = {}
+
+    def add(self, task, host, action, metrics):
+        ''' Adds the `tet_metrics` of the run of `task` on `host` '''
+        self.tasks.append({'task': task, 'host': host, 'action': action, 'summary': metrics.get('summary', {})})
+        for route_totals in metrics.get('routes', []):
+            key = (route_totals['method'], route_totals['route'])
+            totals = self._routes.setdefault(key, dict(
+                (k, 0) for k in ('requests', 'errors', 'retries', 'throttled', 'latency_seconds', 'response_bytes')))
+            for name in totals:
+                totals[name] += route_totals.get(name, 0)
+        for call in metrics.get('calls', []):
+            self._latencies.setdefault((call['method'], call['route']), []).append(call['latency_seconds'])
+
+    def report(self, slowest_tasks=10):
+        ''' Returns the totals and latency percentiles of every route, the
+        slowest routes first, and the `slowest_tasks` tasks that spent the
+        longest waiting for the API
+        '''
+        routes = []
+        for (method, route), totals in self._routes.items():
+            latencies = sorted(self._latencies.get((method, route), []))
+            attempts = totals['requests'] + totals['retries']
+            routes.append(dict(
+                totals,
+                method=method,
+                route=route,
+                latency_seconds=round(totals['latency_seconds'], 4),
+                p50_seconds=percentile(latencies, 50),
+                p95_seconds=percentile(latencies, 95),
+                p99_seconds=percentile(latencies, 99),
+                throttle_rate=round(float(totals['throttled']) / attempts, 4) if attempts else 0.0,
+            ))
+        routes.sort(key=lambda r: -r['latency_seconds'])
+        tasks = sorted(self.tasks, key=lambda t: -t['summary'].get('latency_seconds', 0))
+        summary = dict((name, sum(r[name] for r in routes))
+                       for name in ('requests', 'errors', 'retries', 'throttled', 'response_bytes'))
+        summary['latency_seconds'] = round(sum(r['latency_seconds'] for r in routes), 4)
+        for name in ('served_from_cache', 'served_preloaded', 'served_from_memo', 'memo_hits', 'memo_misses'):
+            summary[name] = sum(t['summary'].get(name, 0) for t in self.tasks)
+        summary['rate_limit_wait_seconds'] = round(
+            sum(t['summary'].get('rate_limit_wait_seconds', 0) for t in self.tasks), 4)
+        summary['tasks'] = len(self.tasks)
+        return {'summary': summary, 'routes': routes, 'slowest_tasks': tasks[:slowest_tasks]}
@@ -0,0 +1,81 @@
+# This file contains the page size used for paginated tetration requests
+
+from ansible.module_utils.parsing.convert_bool import boolean
+
+from . import tetration_constants
+
+
+class PageSize(object):
+    """
+    Chooses the `limit` sent with each page of a paginated request.
+
+    A fixed size is used unless the adaptive mode is enabled. In that mode the
+    size doubles as long as the time spent per record keeps falling and halves
+    on timeouts or server errors. A size that failed or stopped paying off is
+    never grown to again during the module run.
+
+    Attributes:
+        adaptive: Boolean enabling the adaptive mode
+        minimum: Int of the smallest size the adaptive mode shrinks to
+        maximum: Int of the largest size the adaptive mode grows to
+        used: Boolean telling whether any paginated request was sent
+
+    Constants:
+        IMPROVEMENT: factor by which the time per record must fall for the
+        page size to keep growing
+    """
+    IMPROVEMENT = 0.9
+
+    def __init__(self, size=None, adaptive=False, minimum=None, maximum=None):
+        self._size = int(size) if size else None
+        self.adaptive = adaptive
+        self.minimum = int(minimum or tetration_constants.TETRATION_API_MIN_PAGINATION_SIZE)
+        self.maximum = max(int(maximum or tetration_constants.TETRATION_API_MAX_PAGINATION_SIZE), self._size or 0)
+        self.used = False
+        self._best = None
+        self._best_size = None
+
+    @classmethod
+    def from_options(cls, options):
+        ''' Builds the page size from the provider options '''
+        return cls(
+            size=options.get('page_size'),
+            adaptive=boolean(options.get('page_size_adaptive') or False))
+
+    @property
+    def size(self):
+        ''' The number of records to request with the next page '''
+        self.used = True
+        if self._size is None:
+            # Read when first needed so the module wide default can be changed
+            self._size = tetration_constants.TETRATION_API_PAGINATION_SIZE
+        return self._size
+
+    def record(self, records, elapsed):
+        ''' Learns from a page of `records` records that took `elapsed` seconds '''
+        size = self.size
+        if not self.adaptive or records <= 0 or records < size:
+            # Partial pages are the end of the listing and say nothing about
+            # how a larger page would perform
+            return
+        per_record = elapsed / records
+        if self._best is None or per_record < self._best * self.IMPROVEMENT:
+            self._best = per_record
+            self._best_size = size
+            self._size = min(size * 2, self.maximum)
+        else:
+            # Larger pages stopped paying off, settle on the best size seen
+            self.maximum = self._best_size
+            self._size = self._best_size
+
+    def shrink(self):
+        ''' Halves the size after a timeout or a server error
+        Returns False when the page cannot be retried with fewer records
+        '''
+        size = self.size
+        if not self.adaptive or size <= self.minimum:
+            return False
+        self._size = max(size // 2, self.minimum)
+        self.maximum = self._size
+        self._best = None
+        return True
@@ -0,0 +1,115 @@
+# This file contains the opt-in profiler of a tetration module run
+
+import cProfile
+import os
+import pstats
+import time
+import tracemalloc
+
+from ansible.module_utils.parsing.convert_bool import boolean
+
+
+class ModuleProfiler(object):
+    """
+    Profiles a module run with cProfile and optionally tracemalloc, from the
+    creation of the TetrationApiModule until the module exits or fails.
+
+    The functions taking the most cumulative time and the lines allocating
+    the most memory are returned with the module result. With a `directory`
+    the full cProfile stats (for `pstats` or snakeviz) and tracemalloc
+    snapshot are also written there, on the host running the module.
+
+    Only the thread that creates the profiler is profiled, the time the
+    worker threads of `run_many` spend on requests shows up as the main
+    thread waiting for them.
+
+    Attributes:
+        name: String the files written are named after, e.g. the module name
+        directory: String of the directory the profiles are written to, or None
+        memory: Boolean to trace memory allocations with tracemalloc
+
+    Constants:
+        TOP: Int of the functions and allocations returned with the result
+        FRAMES: Int of the stack frames tracemalloc keeps per allocation
+    """
+    TOP = 25
+    FRAMES = 5
+
+    def __init__(self, name='tetration', directory=None, memory=False):
+        self.name = name
+        self.directory = os.path.expanduser(directory) if directory else None
+        self.memory = memory
+        self._started_at = time.time()
+        self._result = None
+        self._trace_memory = memory and not tracemalloc.is_tracing()
+        if self._trace_memory:
+            tracemalloc.start(self.FRAMES)
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    @classmethod
+    def from_options(cls, options, name='tetration'):
+        ''' Returns a started profiler for the provider options, None unless
+        `profile` or `profile_memory` is enabled
+        '''
+        memory = boolean(options.get('profile_memory') or False)
+        if not boolean(options.get('profile') or False) and not memory:
+            return None
+        return cls(name, directory=options.get('profile_dir'), memory=memory)
+
+    def stop(self):
+        ''' Stops profiling and returns the `tet_profile` module result, only
+        the first call profiles
+        '''
+        if self._result is not None:
+            return self._result
+        self._profile.disable()
+        result = {'elapsed_seconds': round(time.time() - self._started_at, 4)}
+        prefix = None
+        if self.directory:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            prefix = os.path.join(self.directory, '%s-%s-%d' % (
+                self.name, time.strftime('%Y%m%dT%H%M%S'), os.getpid()))
+
+        if self.memory and tracemalloc.is_tracing():
+            # Taken before the CPU stats are assembled, the allocations of the
+            # profilers themselves are not of interest
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, cProfile.__file__),
+                tracemalloc.Filter(False, pstats.__file__),
+                tracemalloc.Filter(False, tracemalloc.__file__),
+            ])
+            current, peak = tracemalloc.get_traced_memory()
+            if self._trace_memory:
+                tracemalloc.stop()
+            result['memory'] = {
+                'current_bytes': current,
+                'peak_bytes': peak,
+                'allocations': [
+                    {'line': str(stat.traceback[0]), 'bytes': stat.size, 'blocks': stat.count}
+                    for stat in snapshot.statistics('lineno')[:self.TOP]
+                ],
+            }
+            if prefix:
+                result['memory_snapshot_path'] = prefix + '.tracemalloc'
+                snapshot.dump(result['memory_snapshot_path'])
+
+        stats = pstats.Stats(self._profile)
+        result['total_calls'] = stats.total_calls
+        result['functions'] = [
+            {
+                'function': '%s:%d(%s)' % function,
+                'calls': calls,
+                'own_seconds': round(own_time, 4),
+                'cumulative_seconds': round(cumulative_time, 4),
+            }
+            for function, (primitive_calls, calls, own_time, cumulative_time, callers) in sorted(
+                stats.stats.items(), key=lambda item: -item[1][3])[:self.TOP]
+        ]
+        if prefix:
+            result['cpu_profile_path'] = prefix + '.prof'
+            stats.dump_stats(result['cpu_profile_path'])
+
+        self._result = result
+        return result
@@ -0,0 +1,76 @@
+# This file contains the client side rate limiter shared by concurrent tetration module runs
+
+import json
+import os
+import time
+
+from .tetration_cache import credentials_digest
+from .tetration_cache import locked_file
+from .tetration_cache import resolve_state_dir
+
+
+class TokenBucket(object):
+    """
+    A token bucket shared by every process on this host that talks to the same
+    cluster with the same API key, so all forks of a play together stay below
+    the rate limit the cluster enforces for that key.
+
+    The bucket state lives in a small file guarded by flock. A request that
+    finds the bucket empty still takes its token, leaving the bucket in debt,
+    and then sleeps until that token would have been refilled. Callers are
+    therefore served in the order they arrived instead of racing each other.
+
+    Attributes:
+        rate: Float of tokens (requests) refilled per second
+        burst: Float of the maximum number of tokens the bucket holds
+        path: String of the file holding the bucket state
+    """
+
+    def __init__(self, state_dir, rate, burst, server_endpoint, api_key):
+        self.rate = float(rate)
+        self.burst = max(float(burst or self.rate), 1.0)
+        digest = credentials_digest(server_endpoint, api_key)[:32]
+        self.path = os.path.join(resolve_state_dir(state_dir), 'ratelimit-%s' % digest)
+
+    @classmethod
+    def from_options(cls, server_endpoint, api_key, options):
+        ''' Returns a bucket for the RestClient options or None when disabled '''
+        rate = float(options.get('rate_limit') or 0)
+        if rate <= 0:
+            return None
+        return cls(options.get('cache_dir'), rate, options.get('rate_limit_burst'), server_endpoint, api_key)
+
+    def acquire(self, tokens=1):
+        ''' Takes `tokens` from the bucket, sleeping until they are available.
+        Returns the number of seconds waited.
+        '''
+        with locked_file(self.path) as fd:
+            now = time.time()
+            state = self._read(fd)
+            if state is None:
+                available = self.burst
+            else:
+                elapsed = max(now - state['updated'], 0.0)
+                available = min(self.burst, state['tokens'] + elapsed * self.rate)
+            available -= tokens
+            self._write(fd, {'tokens': available, 'updated': now})
+
+        wait = -available / self.rate if available < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    @staticmethod
+    def _read(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        raw = os.read(fd, 4096)
+        try:
+            return json.loads(raw.decode('utf-8')) if raw else None
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _write(fd, state):
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, json.dumps(state).encode('utf-8'))
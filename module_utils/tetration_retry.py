@@ -0,0 +1,94 @@
+# This file contains the retry policy used by the tetration RestClient
+
+import random
+import time
+
+from email.utils import parsedate_to_datetime
+
+
+class RetryPolicy(object):
+    """
+    Decides how often a request is sent and how long to wait in between.
+
+    Sleeps follow the "decorrelated jitter" backoff so that forks throttled at
+    the same moment spread their retries out instead of retrying in lockstep.
+    A `Retry-After` header sent with the response takes precedence, capped at
+    `backoff_max` so a cluster or proxy cannot stall the module for longer.
+
+    Attributes:
+        max_retries: Int of attempts for methods without an explicit budget
+        backoff_base: Float of seconds of the smallest sleep between attempts
+        backoff_max: Float of seconds of the largest sleep, computed or
+        asked for with Retry-After
+        deadline: Float of seconds after the first attempt past which no more
+        attempts are made, 0 disables the deadline
+        method_budgets: Dictionary of HTTP method to number of attempts
+
+    Constants:
+        RETRY_HTTP_CODES: status codes that cause a request to be retried
+        RETRY_METHODS: methods retried when no budget is configured for them
+    """
+    RETRY_HTTP_CODES = [429, 502, 503, 504]
+    RETRY_METHODS = ['GET', 'PUT', 'DELETE']
+    DEFAULT_BACKOFF_BASE = 1.0
+    DEFAULT_BACKOFF_MAX = 30.0
+
+    def __init__(self, max_retries=3, backoff_base=None, backoff_max=None, deadline=None, method_budgets=None):
+        self.max_retries = max(int(max_retries), 1)
+        self.backoff_base = float(backoff_base or self.DEFAULT_BACKOFF_BASE)
+        self.backoff_max = max(float(backoff_max or self.DEFAULT_BACKOFF_MAX), self.backoff_base)
+        self.deadline = float(deadline or 0)
+        self.method_budgets = dict((k.upper(), int(v)) for k, v in (method_budgets or {}).items())
+
+    @classmethod
+    def from_options(cls, options):
+        ''' Builds the policy from RestClient keyword arguments / provider options '''
+        max_retries = options.get('max_retries')
+        return cls(
+            max_retries=3 if max_retries is None else max_retries,
+            backoff_base=options.get('retry_backoff_base'),
+            backoff_max=options.get('retry_backoff_max'),
+            deadline=options.get('retry_deadline'),
+            method_budgets=options.get('retry_method_budgets'))
+
+    def attempts_for(self, http_method):
+        ''' Returns how many times a request with `http_method` may be sent '''
+        if http_method in self.method_budgets:
+            return max(self.method_budgets[http_method], 1)
+        if http_method in self.RETRY_METHODS:
+            return self.max_retries
+        return 1
+
+    def should_retry(self, response):
+        return response.status_code in self.RETRY_HTTP_CODES
+
+    def next_sleep(self, previous_sleep=None, response=None):
+        ''' Returns the number of seconds to wait before the next attempt '''
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        previous_sleep = previous_sleep or self.backoff_base
+        return min(self.backoff_max, random.uniform(self.backoff_base, previous_sleep * 3))
+
+    def remaining(self, started_at):
+        ''' Returns the seconds left before the deadline, None without one '''
+        if not self.deadline:
+            return None
+        return self.deadline - (time.time() - started_at)
+
+    @staticmethod
+    def retry_after(response):
+        ''' Parses the Retry-After header, either delta seconds or an HTTP date '''
+        if response is None:
+            return None
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            return None
+        return max(retry_at.timestamp() - time.time(), 0.0)
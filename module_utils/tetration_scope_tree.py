@@ -0,0 +1,143 @@
+# This file contains the plan of the changes that reconcile a tree of scopes
+
+SCOPE_TREE_NODE_KEYS = ['short_name', 'description', 'query', 'policy_priority', 'children']
+
+# Node keys compared against the scope and the scope attribute they set
+SCOPE_TREE_ATTRIBUTES = [
+    ('description', 'description'),
+    ('query', 'short_query'),
+    ('policy_priority', 'policy_priority'),
+]
+
+
+class ScopeTreePlan(object):
+    """
+    Works out the scopes to create, update and delete so that the children of
+    a parent scope match a nested tree.
+
+    The plan is computed from a single listing of all scopes. Scopes are
+    matched by short name below their parent, the same way `tetration_scope`
+    finds a scope by `(short_name, parent_app_scope_id)`. Each step of the
+    plan has the depth of its scope below the parent, so creates and updates
+    can be applied one depth at a time, parents first, and deletes one depth
+    at a time, children first. Steps of the same depth never depend on each
+    other.
+
+    Attributes:
+        parent: Dictionary of the scope the tree is built below
+        prune: Boolean to delete child scopes missing from the tree
+        steps: List of the create, update and delete step dictionaries
+        ids: Dictionary of the full name of every scope of the tree to its
+        ID, None for scopes still to be created
+    """
+
+    def __init__(self, scopes, parent_id, tree, prune=False):
+        self.prune = prune
+        self.steps = []
+        self.ids = {}
+        self._scopes = dict((s['id'], s) for s in scopes)
+        if parent_id not in self._scopes:
+            raise ValueError('Parent scope %s does not exist' % parent_id)
+        self._children = {}
+        for scope in scopes:
+            self._children.setdefault(scope.get('parent_app_scope_id'), []).append(scope)
+        self.parent = self._scopes[parent_id]
+        self.ids[self.parent['name']] = parent_id
+        self._walk(tree or [], self.parent['name'], self.parent, 1)
+
+    @property
+    def changed(self):
+        return bool(self.steps)
+
+    def counts(self):
+        ''' Returns the number of scopes to create, update and delete '''
+        counts = {'create': 0, 'update': 0, 'delete': 0}
+        for step in self.steps:
+            counts[step['action']] += 1
+        return counts
+
+    def levels(self):
+        ''' Returns the create and update steps grouped by depth, parents first '''
+        return self._group([s for s in self.steps if s['action'] != 'delete'], reverse=False)
+
+    def delete_levels(self):
+        ''' Returns the delete steps grouped by depth, children first '''
+        return self._group([s for s in self.steps if s['action'] == 'delete'], reverse=True)
+
+    def changes_queries(self):
+        ''' Returns True when applying the plan leaves scope queries to commit '''
+        return any(s['action'] != 'update' or 'short_query' in s['payload'] for s in self.steps)
+
+    def _group(self, steps, reverse):
+        levels = {}
+        for step in steps:
+            levels.setdefault(step['depth'], []).append(step)
+        return [levels[depth] for depth in sorted(levels, reverse=reverse)]
+
+    def _walk(self, nodes, parent_name, parent_scope, depth):
+        existing = {}
+        if parent_scope is not None:
+            existing = dict((s['short_name'], s) for s in self._children.get(parent_scope['id'], []))
+
+        seen = set()
+        for node in nodes:
+            short_name = self._validate(node, parent_name)
+            if short_name in seen:
+                raise ValueError('Scope %s is listed more than once below %s' % (short_name, parent_name))
+            seen.add(short_name)
+            name = '%s:%s' % (parent_name, short_name)
+            current = existing.get(short_name)
+
+            if current is None:
+                if not node.get('query'):
+                    raise ValueError('Scope %s does not exist, a query is required to create it' % name)
+                payload = {'short_name': short_name}
+                for key, attribute in SCOPE_TREE_ATTRIBUTES:
+                    if node.get(key) is not None:
+                        payload[attribute] = node[key]
+                self._add_step('create', name, depth, None, parent_name, payload)
+                self.ids[name] = None
+            else:
+                payload = {}
+                for key, attribute in SCOPE_TREE_ATTRIBUTES:
+                    if node.get(key) is not None and node[key] != current.get(attribute):
+                        payload[attribute] = node[key]
+                if payload:
+                    self._add_step('update', name, depth, current['id'], parent_name, payload)
+                self.ids[name] = current['id']
+
+            self._walk(node.get('children') or [], name, current, depth + 1)
+
+        if self.prune:
+            for short_name, scope in existing.items():
+                if short_name not in seen:
+                    self._delete(scope, '%s:%s' % (parent_name, short_name), parent_name, depth)
+
+    def _delete(self, scope, name, parent_name, depth):
+        # Scopes that still have children cannot be deleted, so the whole
+        # branch goes, its deepest scopes first
+        for child in self._children.get(scope['id'], []):
+            self._delete(child, '%s:%s' % (name, child['short_name']), name, depth + 1)
+        self._add_step('delete', name, depth, scope['id'], parent_name, {})
+
+    def _add_step(self, action, name, depth, scope_id, parent_name, payload):
+        self.steps.append({
+            'action': action,
+            'name': name,
+            'depth': depth,
+            'id': scope_id,
+            'parent': parent_name,
+            'payload': payload
+        })
+
+    def _validate(self, node, parent_name):
+        ''' Returns the short name of the tree `node` after checking its keys '''
+        if not isinstance(node, dict) or not node.get('short_name'):
+            raise ValueError('Every scope of the tree needs a short_name, found %r below %s' % (node, parent_name))
+        unknown = sorted(set(node) - set(SCOPE_TREE_NODE_KEYS))
+        if unknown:
+            raise ValueError(
+                'Scope %s below %s has unsupported keys: %s' % (node['short_name'], parent_name, ', '.join(unknown)))
+        if not isinstance(node.get('children') or [], list):
+            raise ValueError('The children of scope %s below %s must be a list' % (node['short_name'], parent_name))
+        return node['short_name']
@@ -0,0 +1,83 @@
+# This file contains the request timeouts and the task deadline used by the tetration clients
+
+import time
+
+from fnmatch import fnmatch
+
+
+class DeadlineExceeded(Exception):
+    ''' Raised instead of sending a request once the task deadline passed '''
+
+
+class RequestTimeouts(object):
+    """
+    Works out the (connect, read) timeout of every request.
+
+    The read timeout of a route can be overridden with a shell style pattern,
+    e.g. `/applications/*/details`, for endpoints known to be slow. When a
+    task deadline is set, no timeout reaches past it and requests are no
+    longer sent once it passed, so pagination and retries stop with it.
+
+    Attributes:
+        connect: Float of seconds to wait for the connection to the cluster
+        read: Float of seconds to wait for the response of a request
+        route_timeouts: Dictionary of route pattern to read timeout
+        task_deadline: Float of seconds all requests of a task may take,
+        0 disables the deadline
+        started_at: Float of the time the deadline is counted from
+    """
+    DEFAULT_TIMEOUT = 10.0
+
+    def __init__(self, connect=None, read=None, route_timeouts=None, task_deadline=None, started_at=None):
+        self.read = float(read or self.DEFAULT_TIMEOUT)
+        self.connect = float(connect or self.read)
+        self.route_timeouts = dict((k, float(v)) for k, v in (route_timeouts or {}).items())
+        self.task_deadline = float(task_deadline or 0)
+        self.started_at = time.time() if started_at is None else started_at
+
+    @classmethod
+    def from_options(cls, options):
+        ''' Builds the timeouts from RestClient keyword arguments / provider options '''
+        return cls(
+            connect=options.get('connect_timeout'),
+            read=options.get('timeout'),
+            route_timeouts=options.get('route_timeouts'),
+            task_deadline=options.get('task_deadline'))
+
+    def remaining(self):
+        ''' Returns the seconds left before the task deadline, None without one '''
+        if not self.task_deadline:
+            return None
+        return self.task_deadline - (time.time() - self.started_at)
+
+    def read_timeout(self, route):
+        ''' Returns the read timeout of `route`, the longest matching pattern wins '''
+        route = route.split('?', 1)[0]
+        matches = [p for p in self.route_timeouts if fnmatch(route, p)]
+        if not matches:
+            return self.read
+        return self.route_timeouts[max(matches, key=len)]
+
+    def for_request(self, route, timeout=None):
+        ''' Returns the (connect, read) timeout tuple for a request to `route`
+
+        Args:
+            route: String URI path of the request without the API prefix
+            timeout: Float of read timeout requested by the caller, replaces
+            the configured read timeout of the route. A (connect, read) tuple
+            or list, as sent by HttpApiRestClient over the persistent
+            connection, replaces both timeouts
+        '''
+        connect = self.connect
+        if isinstance(timeout, (list, tuple)):
+            connect, read = float(timeout[0]), float(timeout[1])
+        else:
+            read = float(timeout) if timeout else self.read_timeout(route)
+        remaining = self.remaining()
+        if remaining is not None:
+            if remaining <= 0:
+                raise DeadlineExceeded(
+                    'Task deadline of %s seconds exceeded before requesting %s' % (self.task_deadline, route))
+            read = min(read, remaining)
+            connect = min(connect, remaining)
+        return (connect, read)
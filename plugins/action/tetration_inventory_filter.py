@@ -0,0 +1,10 @@
+# Passes the reference data tetration_inventory_filter lists to the module, see
+# tetration_preload.py
+
+import os
+import sys
+
+# The shared base sits next to the action plugins, which ansible loads by path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tetration_preload import PreloadActionModule as ActionModule  # noqa: F401, E402
@@ -0,0 +1,121 @@
+# This file contains the action plugin base shared by the tetration modules
+# that read reference data collections. It runs on the controller only, the
+# action plugins next to it import it by name
+
+import os
+import sys
+import time
+
+from ansible.module_utils._text import to_text
+from ansible.plugins.action import ActionBase
+from ansible.utils.display import Display
+
+try:
+    from ansible.module_utils.tetration import RestClient, resolve_provider
+    from ansible.module_utils.tetration_cache import ReferenceDataCache
+    from ansible.module_utils import tetration_constants
+except ImportError:
+    # Loaded straight from the repository rather than an installed collection,
+    # make the module_utils shared with the modules importable
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+    from module_utils.tetration import RestClient, resolve_provider
+    from module_utils.tetration_cache import ReferenceDataCache
+    from module_utils import tetration_constants
+
+display = Display()
+
+SCOPES = tetration_constants.TETRATION_API_SCOPES
+FILTERS = tetration_constants.TETRATION_API_INVENTORY_FILTER
+ROLES = tetration_constants.TETRATION_API_ROLE
+PROFILES = tetration_constants.TETRATION_API_AGENT_CONFIG_PROFILES
+
+# Collections each module lists in full on every run
+PRELOAD_ROUTES = {
+    'tetration_application': [SCOPES],
+    'tetration_application_policy': [SCOPES, FILTERS],
+    'tetration_application_policies': [SCOPES, FILTERS],
+    'tetration_inventory_filter': [SCOPES, FILTERS],
+    'tetration_role': [SCOPES, ROLES],
+    'tetration_scope': [SCOPES],
+    'tetration_scope_commit_query_changes': [SCOPES],
+    'tetration_scope_query': [SCOPES],
+    'tetration_scope_tree': [SCOPES],
+    'tetration_software_agent_config_intent': [SCOPES, FILTERS, PROFILES],
+    'tetration_software_agent_config_profile': [SCOPES, PROFILES],
+    'tetration_user': [SCOPES, ROLES],
+}
+
+
+class PreloadActionModule(ActionBase):
+    """
+    Runs a tetration module with the reference data collections it lists
+    fetched once on the controller and passed in as the hidden
+    `tetration_preloaded` argument.
+
+    The listings are kept in the on-disk reference data cache so the forks
+    running the task for other hosts, and later tasks, reuse them. With
+    `cache_ttl` in the provider that is the cache the modules use, else a
+    cache private to the play. A task that reports a change evicts the
+    listings, since the module may have written to them.
+    """
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(PreloadActionModule, self).run(tmp, task_vars)
+        del tmp
+
+        module_name = self._task.action
+        module_args = dict(self._task.args)
+        routes = PRELOAD_ROUTES.get(module_name.split('.')[-1], [])
+        provider, cache = self._provider_cache(module_args)
+        if provider is not None and routes:
+            try:
+                module_args['tetration_preloaded'] = dict((r, self._listing(provider, cache, r)) for r in routes)
+            except Exception as exc:
+                # The module fetches the data itself and reports any error
+                display.vvv('Unable to preload %s: %s' % (', '.join(routes), to_text(exc)))
+
+        result.update(self._execute_module(module_name=module_name, module_args=module_args, task_vars=task_vars))
+
+        if cache is not None and result.get('changed'):
+            for route in (SCOPES, FILTERS, ROLES, PROFILES):
+                cache.invalidate(route)
+        # The listings are not worth echoing back with the module arguments
+        result.get('invocation', {}).get('module_args', {}).pop('tetration_preloaded', None)
+        return result
+
+    def _provider_cache(self, module_args):
+        ''' Returns the resolved provider and the cache of the listings, or None
+        and None when the module talks to the cluster through the httpapi
+        connection or lacks credentials
+        '''
+        if self._play_context.connection.split('.')[-1] == 'httpapi':
+            return None, None
+        try:
+            provider = resolve_provider(dict(module_args.get('provider') or {}))
+        except ValueError:
+            return None, None
+        cache = ReferenceDataCache.from_provider(provider)
+        if cache is None:
+            play = self._task.get_play() if hasattr(self._task, 'get_play') else None
+            cache = ReferenceDataCache.for_run(provider, play._uuid if play is not None else os.getppid())
+        return provider, cache
+
+    def _listing(self, provider, cache, route):
+        ''' Returns the listing of `route`, downloading it only when no fork
+        of the play has yet
+        '''
+        listing = cache.get(route)
+        if listing is not None:
+            return listing
+        with cache.fill_lock(route):
+            # Another fork may have downloaded it while this one waited
+            listing = cache.get(route)
+            if listing is not None:
+                return listing
+            fetched_at = time.time()
+            resp = RestClient(**provider).get(route)
+            if resp is None or resp.status_code != 200:
+                raise ValueError('GET %s returned %s' % (route, 'no response' if resp is None else resp.status_code))
+            listing = resp.json()
+            cache.set(route, None, listing, fetched_at)
+        return listing
@@ -0,0 +1,10 @@
+# Evicts the reference data preloaded for the other tetration modules when a
+# tetration_rest call changed something, see tetration_preload.py
+
+import os
+import sys
+
+# The shared base sits next to the action plugins, which ansible loads by path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tetration_preload import PreloadActionModule as ActionModule  # noqa: F401, E402
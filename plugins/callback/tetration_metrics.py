@@ -0,0 +1,154 @@
+DOCUMENTATION = """
+---
+name: tetration_metrics
+type: aggregate
+short_description: Aggregates the Tetration API metrics of the tasks of a play
+description:
+  - Collects the C(tet_metrics) the tetration modules return with the C(metrics)
+    provider option enabled
+  - At the end of each play reports the requests, errors, throttled (429) responses,
+    throttle rate and p50, p95 and p99 latency of every route, the slowest routes
+    first, and the tasks that waited longest for the API
+  - Optionally appends a JSON line per task and per play to C(output_path), for
+    dashboards
+version_added: '2.9'
+requirements:
+  - Enable the plugin with C(callbacks_enabled) in C(ansible.cfg), or with
+    C(callback_whitelist) before ansible-core 2.11
+  - The modules only return metrics with C(metrics) in the provider or with the
+    C(TETRATION_METRICS=true) environment variable
+options:
+  output_path:
+    description:
+      - File the JSON lines are appended to, nothing is written when not set
+    type: path
+    env:
+      - name: TETRATION_METRICS_OUTPUT
+    ini:
+      - section: callback_tetration_metrics
+        key: output_path
+  slowest_tasks:
+    description: Number of the slowest tasks reported
+    type: int
+    default: 10
+    env:
+      - name: TETRATION_METRICS_SLOWEST_TASKS
+    ini:
+      - section: callback_tetration_metrics
+        key: slowest_tasks
+notes:
+  - Point C(callback_plugins) in C(ansible.cfg) at C(./plugins/callback) when running
+    from a checkout
+  - Latency percentiles are computed from the requests each task lists one by one,
+    the first 500 of a task
+"""
+
+import json
+import os
+import sys
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+try:
+    from ansible.module_utils.tetration_metrics import PlayMetrics
+except ImportError:
+    # Loaded straight from the repository rather than an installed collection,
+    # make the module_utils shared with the modules importable
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+    from module_utils.tetration_metrics import PlayMetrics
+
+
+class CallbackModule(CallbackBase):
+    ''' Reports the Tetration API metrics of every play '''
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'tetration_metrics'
+    CALLBACK_NEEDS_ENABLED = True
+    # The name of the same flag before ansible-core 2.11
+    CALLBACK_NEEDS_WHITELIST = True
+
+    def __init__(self, display=None):
+        super(CallbackModule, self).__init__(display=display)
+        self._play_name = None
+        self._play_metrics = PlayMetrics()
+
+    def v2_playbook_on_play_start(self, play):
+        self._report()
+        self._play_name = play.get_name()
+        self._play_metrics = PlayMetrics()
+
+    def v2_playbook_on_stats(self, stats):
+        self._report()
+
+    # Loops report the metrics of each item, the final result of the task
+    # only holds the item results
+    def v2_runner_on_ok(self, result):
+        self._collect(result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._collect(result)
+
+    def v2_runner_item_on_ok(self, result):
+        self._collect(result)
+
+    def v2_runner_item_on_failed(self, result):
+        self._collect(result)
+
+    def _collect(self, result):
+        metrics = result._result.get('tet_metrics')
+        if not isinstance(metrics, dict):
+            return
+        task, host, action = result._task.get_name(), result._host.get_name(), result._task.action
+        self._play_metrics.add(task, host, action, metrics)
+        self._write_line({'event': 'task', 'play': self._play_name, 'task': task, 'host': host, 'action': action,
+                          'summary': metrics.get('summary'), 'routes': metrics.get('routes')})
+
+    def _report(self):
+        if not self._play_metrics.tasks:
+            return
+        report = self._play_metrics.report(self.get_option('slowest_tasks'))
+        self._play_metrics = PlayMetrics()
+
+        summary = report['summary']
+        self._display.banner('TETRATION API METRICS [%s]' % self._play_name)
+        self._display.display('%d tasks sent %d requests in %.2fs: %d errors, %d retries, %d throttled, '
+                              '%d GETs served from the cache, %d preloaded and %d memoized' % (
+                                  summary['tasks'], summary['requests'], summary['latency_seconds'],
+                                  summary['errors'], summary['retries'], summary['throttled'],
+                                  summary['served_from_cache'], summary['served_preloaded'],
+                                  summary['served_from_memo']))
+        if summary['memo_hits'] or summary['memo_misses']:
+            self._display.display('%d of %d GETs looked up in the memo of their task were answered by it' % (
+                summary['memo_hits'], summary['memo_hits'] + summary['memo_misses']))
+        if summary['rate_limit_wait_seconds']:
+            self._display.display('%.2fs waited for the rate limit' % summary['rate_limit_wait_seconds'])
+        self._display.display('%-7s %-50s %8s %8s %8s %8s %9s %7s' % (
+            'METHOD', 'ROUTE', 'REQUESTS', 'P50', 'P95', 'P99', 'THROTTLED', 'ERRORS'))
+        for route in report['routes']:
+            self._display.display('%-7s %-50s %8d %8s %8s %8s %8.1f%% %7d' % (
+                route['method'], route['route'], route['requests'], self._seconds(route['p50_seconds']),
+                self._seconds(route['p95_seconds']), self._seconds(route['p99_seconds']),
+                route['throttle_rate'] * 100, route['errors']))
+        self._display.display('Slowest tasks:')
+        for task in report['slowest_tasks']:
+            self._display.display('  %8.2fs %4d requests  %s on %s' % (
+                task['summary'].get('latency_seconds', 0), task['summary'].get('requests', 0),
+                task['task'], task['host']))
+        self._write_line(dict(report, event='play', play=self._play_name))
+
+    @staticmethod
+    def _seconds(value):
+        return '-' if value is None else '%.3fs' % value
+
+    def _write_line(self, record):
+        output_path = self.get_option('output_path')
+        if not output_path:
+            return
+        record['timestamp'] = time.time()
+        directory = os.path.dirname(output_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(output_path, 'a') as output:
+            output.write(json.dumps(record, sort_keys=True) + '\n')
@@ -39,6 +39,31 @@ options:
           - Value can also be specified using C(TETRATION_TIMEOUT) environment
             variable.
         default: 10
+      connect_timeout:
+        description:
+          - Number of seconds to wait for the connection to the cluster to be
+            established, a dead cluster is detected this quickly
+          - Defaults to C(timeout)
+          - Value can also be specified using C(TETRATION_CONNECT_TIMEOUT) environment
+            variable.
+        type: float
+      route_timeouts:
+        description:
+          - 'Overrides C(timeout) for slow routes, e.g.
+            C({"/applications/*/details": 60, "/applications/*/commit_dirty": 120})'
+          - Routes are shell style patterns matched against the route without the
+            C(/openapi/v1) prefix, the longest matching pattern wins
+        type: dict
+      task_deadline:
+        description:
+          - Number of seconds all requests of a task may take together, including
+            retries and every page of a paginated listing
+          - The task fails once the deadline passed instead of sending further
+            requests, and no request waits past the deadline
+          - Unset or 0 disables the deadline
+          - Value can also be specified using C(TETRATION_TASK_DEADLINE) environment
+            variable.
+        type: float
       max_retries:
         description:
           - Configures the number of attempted retries before the connection
@@ -47,6 +72,58 @@ options:
             variable.
         type: int
         default: 3
+      retry_backoff_base:
+        description:
+          - Smallest number of seconds to wait before retrying a throttled (429) or
+            unavailable (502, 503, 504) request
+          - Waits grow with decorrelated jitter up to C(retry_backoff_max), a
+            C(Retry-After) header sent by the cluster takes precedence
+          - Value can also be specified using C(TETRATION_RETRY_BACKOFF_BASE) environment
+            variable.
+        type: float
+        default: 1
+      retry_backoff_max:
+        description:
+          - Largest number of seconds to wait between two attempts of a request
+          - Also caps the wait a C(Retry-After) header asks for
+          - Value can also be specified using C(TETRATION_RETRY_BACKOFF_MAX) environment
+            variable.
+        type: float
+        default: 30
+      retry_deadline:
+        description:
+          - Number of seconds after the first attempt of a request past which it is
+            not retried anymore
+          - Unset or 0 only limits the number of attempts
+          - Value can also be specified using C(TETRATION_RETRY_DEADLINE) environment
+            variable.
+        type: float
+      retry_method_budgets:
+        description:
+          - 'Number of attempts per HTTP method, e.g. C({GET: 5, POST: 1})'
+          - Methods not listed use C(max_retries) for GET, PUT and DELETE and a
+            single attempt otherwise
+        type: dict
+      rate_limit:
+        description:
+          - Maximum number of requests per second sent to the cluster by all tasks
+            and forks on this host that use the same C(server_endpoint) and C(api_key)
+          - Keep this below the rate limit the cluster enforces for the API key to
+            avoid throttled (429) responses
+          - Set to 0 to disable the rate limiter
+          - The seconds a module waited for the rate limiter are returned in
+            C(tet_rate_limit_wait)
+          - Value can also be specified using C(TETRATION_RATE_LIMIT) environment
+            variable.
+        type: float
+        default: 0
+      rate_limit_burst:
+        description:
+          - Number of requests that may be sent at once before the rate limit applies
+          - Defaults to C(rate_limit)
+          - Value can also be specified using C(TETRATION_RATE_LIMIT_BURST) environment
+            variable.
+        type: int
       api_version:
         description:
           - Specifies the version of Tetration OpenAPI to use
@@ -54,8 +131,114 @@ options:
             variable.
         type: str
         default: v1
+      cache_ttl:
+        description:
+          - Number of seconds the full listings of scopes, inventory filters, roles
+            and agent config profiles are cached on disk and shared between tasks
+          - Writes through these modules evict the cached listing they change
+          - Set to 0 to disable the cache
+          - Value can also be specified using C(TETRATION_CACHE_TTL) environment
+            variable.
+        type: int
+        default: 0
+      cache_dir:
+        description:
+          - Directory on the host running the module where cached listings and the
+            shared rate limiter state are stored
+          - Defaults to C(~/.ansible/tetration_cache)
+          - Value can also be specified using C(TETRATION_CACHE_DIR) environment
+            variable.
+        type: str
+      pagination_prefetch:
+        description:
+          - Requests the next page of a paginated listing, such as the software
+            agents, on a background thread while the current page is processed
+          - Speeds up full scans of large listings at the cost of at most one
+            unneeded request when a search stops early
+          - Value can also be specified using C(TETRATION_PAGINATION_PREFETCH) environment
+            variable.
+        type: bool
+        default: 'no'
+      page_size:
+        description:
+          - Number of records requested with each page of a paginated listing
+          - Larger pages need fewer round trips to list e.g. every software agent
+          - Defaults to 100
+          - Value can also be specified using C(TETRATION_PAGE_SIZE) environment
+            variable.
+        type: int
+      page_size_adaptive:
+        description:
+          - Starting at C(page_size), doubles the page size while the time spent per
+            record keeps falling and halves it when a page times out or fails with a
+            server error
+          - The page size used last is returned as C(tet_page_size)
+          - Value can also be specified using C(TETRATION_PAGE_SIZE_ADAPTIVE) environment
+            variable.
+        type: bool
+        default: 'no'
+      metrics:
+        description:
+          - Returns C(tet_metrics) with the method, route, status, latency, response size
+            and retries of every request the task sent, totals per route with the
+            slowest first, and a summary including the GETs answered by the cache or
+            the preloaded listings
+          - Object IDs in the routes are replaced by C({id})
+          - Value can also be specified using C(TETRATION_METRICS) environment
+            variable.
+        type: bool
+        default: 'no'
+      profile:
+        description:
+          - Profiles the module run with cProfile and returns the functions that took
+            the most cumulative time as C(tet_profile)
+          - Value can also be specified using C(TETRATION_PROFILE) environment
+            variable.
+        type: bool
+        default: 'no'
+      profile_memory:
+        description:
+          - Also traces the memory allocations of the module run with tracemalloc and
+            returns the peak and the lines that allocated the most in C(tet_profile)
+          - Value can also be specified using C(TETRATION_PROFILE_MEMORY) environment
+            variable.
+        type: bool
+        default: 'no'
+      profile_dir:
+        description:
+          - Directory on the host running the module the full cProfile stats and
+            tracemalloc snapshot are written to, their paths are returned in
+            C(tet_profile)
+          - Value can also be specified using C(TETRATION_PROFILE_DIR) environment
+            variable.
+        type: str
+      memoize_gets:
+        description:
+          - Sends a GET the module repeats with the same route and parameters only once
+            per module run, and a single request for identical GETs sent at once
+          - A write evicts the remembered GETs of its route, its sub routes and its
+            parent routes
+          - Value can also be specified using C(TETRATION_MEMOIZE_GETS) environment
+            variable.
+        type: bool
+        default: 'yes'
 notes:
   - "This module must be run locally, which can be achieved by specifying C(connection: local)."
   - Please read the :ref:`tetration_guide` for more detailed information on how to use Tetration with Ansible.
 
+"""
+
+    # Modules whose action plugin passes in the reference data listings
+    PRELOADED = """
+options:
+  tetration_preloaded:
+    description:
+      - Listings of the reference data collections the module reads, by route, e.g.
+        C(/app_scopes), downloaded once per play by the action plugin of the module
+      - Set by the action plugin, not meant to be passed by a task
+      - GETs of a listed collection are answered from it until the module writes to
+        the collection
+      - "Nothing is passed under C(connection: httpapi) or when the action plugins
+        are not on the C(action_plugins) path"
+    type: dict
 """
@@ -0,0 +1,181 @@
+DOCUMENTATION = """
+---
+name: tetration
+short_description: HttpApi Plugin for Cisco Secure Workload (Tetration)
+description:
+  - Keeps one signed, keep-alive session to the Tetration cluster for each
+    inventory host so consecutive tasks reuse the same TCP and TLS connection
+  - "The tetration modules send their requests through this plugin when the
+    play runs with C(connection: httpapi)"
+version_added: '2.9'
+options:
+  api_key:
+    type: str
+    description:
+      - API Key used for tetration authentication
+    env:
+      - name: TETRATION_API_KEY
+    vars:
+      - name: ansible_tetration_api_key
+  api_secret:
+    type: str
+    description:
+      - Specifies the API secret used for tetration authentication
+    env:
+      - name: TETRATION_API_SECRET
+    vars:
+      - name: ansible_tetration_api_secret
+  api_version:
+    type: str
+    description:
+      - Specifies the version of Tetration OpenAPI to use
+    default: v1
+    env:
+      - name: TETRATION_API_VERSION
+    vars:
+      - name: ansible_tetration_api_version
+  max_retries:
+    type: int
+    description:
+      - Configures the number of attempted retries before the connection
+        is declared unusable
+    default: 3
+    env:
+      - name: TETRATION_MAX_RETRIES
+    vars:
+      - name: ansible_tetration_max_retries
+notes:
+  - The cluster address comes from C(ansible_host), certificate verification
+    from C(ansible_httpapi_validate_certs) and the scheme from
+    C(ansible_httpapi_use_ssl)
+  - Set C(ansible_network_os=tetration) to select this plugin
+  - The retry and rate limit options of the module C(provider) are applied to the
+    requests of that module and replace C(max_retries)
+"""
+
+import json
+import os
+import sys
+
+from ansible.errors import AnsibleConnectionFailure
+from ansible.plugins.httpapi import HttpApiBase
+
+try:
+    from ansible.module_utils.tetration import RestClient
+except ImportError:
+    # Loaded straight from the repository rather than an installed collection,
+    # make the module_utils shared with the modules importable
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+    from module_utils.tetration import RestClient
+
+
+class HttpApi(HttpApiBase):
+    ''' Signs and sends tetration module requests over a persistent session '''
+
+    def __init__(self, connection):
+        super(HttpApi, self).__init__(connection)
+        self._client = None
+        # RestClients applying the retry and rate limit options modules send,
+        # by options, all sharing the session of `client`
+        self._tuned_clients = {}
+
+    @property
+    def server_endpoint(self):
+        host = self.connection.get_option('host')
+        if '://' in host:
+            return host
+        protocol = 'https' if self.connection.get_option('use_ssl') else 'http'
+        port = self.connection.get_option('port')
+        return '%s://%s:%s' % (protocol, host, port) if port else '%s://%s' % (protocol, host)
+
+    @property
+    def client(self):
+        ''' The RestClient, and with it the requests.Session, lives as long
+        as the persistent connection process of the inventory host
+        '''
+        if self._client is None:
+            if not self.get_option('api_key') or not self.get_option('api_secret'):
+                raise AnsibleConnectionFailure(
+                    'api_key and api_secret must be set to use the tetration httpapi plugin')
+            self._client = RestClient(
+                self.server_endpoint,
+                api_key=self.get_option('api_key'),
+                api_secret=self.get_option('api_secret'),
+                api_version=self.get_option('api_version'),
+                max_retries=self.get_option('max_retries'),
+                verify=self.connection.get_option('validate_certs'))
+        return self._client
+
+    def tuned_client(self, tuning):
+        ''' Returns a RestClient with the retry and rate limit provider options
+        `tuning` of a module, on the same keep-alive session as `client`
+        '''
+        if not tuning:
+            return self.client
+        key = json.dumps(tuning, sort_keys=True)
+        if key not in self._tuned_clients:
+            client = self.client
+            options = dict(
+                api_key=client.api_key.decode('ascii'),
+                api_secret=client.api_secret.decode('ascii'),
+                api_version=client.uri_prefix.rsplit('/', 1)[-1],
+                max_retries=client.retries,
+                verify=client.verify,
+                metrics=True)
+            options.update(tuning)
+            tuned_client = RestClient(client.server_endpoint, **options)
+            tuned_client.session = client.session
+            self._tuned_clients[key] = tuned_client
+        return self._tuned_clients[key]
+
+    def get_identity(self):
+        ''' Returns the non secret details identifying the cluster and key '''
+        return {
+            'server_endpoint': self.server_endpoint,
+            'api_key': self.get_option('api_key'),
+        }
+
+    def send_request(self, data, method='GET', path='', params=None, timeout=None, tuning=None):
+        ''' Sends one signed request and returns the parts of the response the
+        modules need in a form that can be returned over the connection socket
+
+        `tuning` holds the retry and rate limit provider options of the module,
+        the retries, the throttled responses and the seconds waited for them
+        are returned in `stats`
+        '''
+        args = {'params': params, 'json_body': data or ''}
+        if timeout:
+            # The (connect, read) tuple arrives as a list over the socket
+            args['timeout'] = tuple(timeout) if isinstance(timeout, list) else timeout
+        client = self.tuned_client(tuning)
+        retry_stats = dict(client.retry_stats)
+        rate_limit_wait = client.rate_limit_wait
+        throttled = self._throttled(client)
+        response = getattr(client, method.lower())(path, **args)
+        if response is None:
+            raise AnsibleConnectionFailure('Unable to send %s request to %s' % (method, path))
+        return {
+            'status_code': response.status_code,
+            'reason': response.reason,
+            'headers': dict(response.headers),
+            'text': response.text,
+            'url': response.url,
+            'stats': {
+                'retries': client.retry_stats['retries'] - retry_stats['retries'],
+                'sleep_seconds': client.retry_stats['sleep_seconds'] - retry_stats['sleep_seconds'],
+                'rate_limit_wait': client.rate_limit_wait - rate_limit_wait,
+                'throttled': self._throttled(client) - throttled,
+            },
+        }
+
+    @staticmethod
+    def _throttled(client):
+        ''' Returns the throttled (429) responses `client` received so far '''
+        if client.metrics is None:
+            return 0
+        return client.metrics.as_result()['summary']['throttled']
+
+    def handle_httperror(self, exc):
+        # Errors are returned to the module, which reports them like it does
+        # for requests made without the persistent connection
+        return exc
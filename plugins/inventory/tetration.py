@@ -0,0 +1,326 @@
+DOCUMENTATION = """
+---
+name: tetration
+short_description: Software agents of Cisco Secure Workload (Tetration) as inventory source
+description:
+  - Adds a host for every software agent registered with the Tetration cluster
+  - Hosts are grouped by the scopes, platform and agent type of their software agent, and
+    optionally by the annotations of their IP address
+  - Uses a YAML configuration file that ends with C(tetration.yml) or C(tetration.yaml)
+  - "With C(cache) enabled the hosts are kept in the inventory cache for C(cache_timeout)
+    seconds, and only requested from the cluster again once the cache expired or
+    C(meta: refresh_inventory) runs"
+version_added: '2.9'
+extends_documentation_fragment:
+  - constructed
+  - inventory_cache
+options:
+  plugin:
+    description: Token that ensures this is a source file for the C(tetration) plugin
+    required: true
+    choices: ['tetration']
+  server_endpoint:
+    description:
+      - Specifies the DNS host name or address for connecting to the remote
+        tetration cluster
+    type: str
+    required: true
+    env:
+      - name: TETRATION_SERVER_ENDPOINT
+  api_key:
+    description: API Key used for tetration authentication
+    type: str
+    required: true
+    env:
+      - name: TETRATION_API_KEY
+  api_secret:
+    description: Specifies the API secret used for tetration authentication
+    type: str
+    required: true
+    env:
+      - name: TETRATION_API_SECRET
+  api_version:
+    description: Specifies the version of Tetration OpenAPI to use
+    type: str
+    default: v1
+    env:
+      - name: TETRATION_API_VERSION
+  verify:
+    description: Boolean value to enable or disable verifying SSL certificates
+    type: bool
+    default: false
+    env:
+      - name: TETRATION_VERIFY
+  timeout:
+    description: The amount of time to wait before receiving a response
+    type: float
+    default: 10
+    env:
+      - name: TETRATION_TIMEOUT
+  page_size:
+    description:
+      - Number of software agents requested with each page
+      - Larger pages need fewer round trips on clusters with many software agents
+    type: int
+    default: 1000
+  hostnames:
+    description:
+      - Software agent attribute used as inventory host name
+      - C(ip) is the address also used as C(ansible_host)
+    type: str
+    choices: ['host_name', 'ip', 'uuid']
+    default: host_name
+  group_by:
+    description:
+      - Attributes of the software agents hosts are grouped by
+      - Groups are named C(scope_), C(platform_) and C(agent_type_) followed by the value,
+        with characters that are not valid in a group name replaced by C(_)
+    type: list
+    elements: str
+    choices: ['scope', 'platform', 'agent_type']
+    default: ['scope', 'platform', 'agent_type']
+  annotations_root_scope:
+    description:
+      - Name of the root scope whose annotations are downloaded and set as the
+        C(tetration_annotations) variable of the hosts
+      - The annotations of the most specific subnet holding C(ansible_host) are used
+    type: str
+  annotation_groups:
+    description:
+      - Annotation columns hosts are grouped by, in groups named
+        C(annotation_) followed by the column and the value
+      - Requires C(annotations_root_scope)
+    type: list
+    elements: str
+    default: []
+notes:
+  - The software agents API can only list all software agents, so every refresh
+    requests all of them, in pages of C(page_size)
+  - Point C(inventory_plugins) in C(ansible.cfg) at C(./plugins/inventory) when running
+    from a checkout
+"""
+
+EXAMPLES = """
+# tetration.yml
+plugin: tetration
+server_endpoint: https://acme.tetrationcloud.com
+annotations_root_scope: Default
+annotation_groups:
+  - Environment
+cache: true
+cache_plugin: jsonfile
+cache_connection: ~/.ansible/tetration_inventory
+cache_timeout: 900
+keyed_groups:
+  - key: tetration_sw_version
+    prefix: agent_version
+"""
+
+import csv
+import io
+import os
+import re
+import sys
+import tempfile
+
+from ipaddress import ip_address
+
+from ansible.errors import AnsibleError
+from ansible.module_utils._text import to_text
+from ansible.plugins.inventory import BaseInventoryPlugin, Cacheable, Constructable
+
+try:
+    from ansible.module_utils.tetration import RestClient
+    from ansible.module_utils.tetration_annotations import AnnotationLookup
+    from ansible.module_utils import tetration_constants
+except ImportError:
+    # Loaded straight from the repository rather than an installed collection,
+    # make the module_utils shared with the modules importable
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+    from module_utils.tetration import RestClient
+    from module_utils.tetration_annotations import AnnotationLookup
+    from module_utils import tetration_constants
+
+INVALID_GROUP_CHARS = re.compile(r'[^A-Za-z0-9_]')
+
+
+def group_name(prefix, value):
+    return INVALID_GROUP_CHARS.sub('_', '%s_%s' % (prefix, value))
+
+
+def primary_address(interfaces):
+    ''' Returns the address Ansible connects to, the first IPv4 address that is
+    not a loopback or link local address, else the first such IPv6 address
+    '''
+    candidates = {4: [], 6: []}
+    for interface in interfaces:
+        try:
+            address = ip_address(interface.get('ip'))
+        except ValueError:
+            continue
+        if not address.is_loopback and not address.is_link_local:
+            candidates[address.version].append(str(address))
+    addresses = candidates[4] or candidates[6]
+    return addresses[0] if addresses else None
+
+
+class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
+    ''' Builds the inventory from the software agents of a tetration cluster '''
+
+    NAME = 'tetration'
+
+    def verify_file(self, path):
+        if super(InventoryModule, self).verify_file(path):
+            return path.endswith(('tetration.yml', 'tetration.yaml'))
+        return False
+
+    def parse(self, inventory, loader, path, cache=True):
+        super(InventoryModule, self).parse(inventory, loader, path, cache=cache)
+        self._read_config_data(path)
+
+        cache_key = self.get_cache_key(path)
+        use_cache = self.get_option('cache') and cache
+        update_cache = self.get_option('cache') and not cache
+        hosts = None
+        if use_cache:
+            try:
+                hosts = self._cache[cache_key]
+            except KeyError:
+                update_cache = True
+        if hosts is None:
+            hosts = self._fetch_hosts()
+        if update_cache:
+            self._cache[cache_key] = hosts
+
+        self._populate(hosts)
+
+    def _client(self):
+        return RestClient(
+            self.get_option('server_endpoint'),
+            api_key=self.get_option('api_key'),
+            api_secret=self.get_option('api_secret'),
+            api_version=self.get_option('api_version'),
+            verify=self.get_option('verify'),
+            timeout=self.get_option('timeout'))
+
+    def _get_json(self, client, target, params=None):
+        resp = client.get(target, params=params)
+        if resp is None or resp.status_code != 200:
+            raise AnsibleError('Unable to get %s from the Tetration cluster: %s' % (
+                target, 'no response' if resp is None else '%s %s' % (resp.status_code, resp.text)))
+        return resp.json()
+
+    def _iter_sensors(self, client):
+        params = {'limit': self.get_option('page_size')}
+        while True:
+            page = self._get_json(client, tetration_constants.TETRATION_API_SENSORS, params)
+            for sensor in page.get('results', []):
+                if 'deleted_at' not in sensor:
+                    yield sensor
+            if 'offset' not in page:
+                return
+            params = dict(params, offset=page['offset'])
+
+    def _annotations(self, client):
+        target = '%s/%s' % (tetration_constants.TETRATION_API_INVENTORY_TAG_DOWNLOAD,
+                            self.get_option('annotations_root_scope'))
+        fd, csv_path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        try:
+            resp = client.download(csv_path, target)
+            if resp is None or resp.status_code != 200:
+                raise AnsibleError('Unable to download the annotations of %s: %s' % (
+                    self.get_option('annotations_root_scope'),
+                    'no response' if resp is None else '%s %s' % (resp.status_code, resp.text)))
+            with io.open(csv_path, newline='') as csv_file:
+                try:
+                    return AnnotationLookup(csv_file)
+                except (ValueError, csv.Error) as exc:
+                    raise AnsibleError('Invalid annotations of %s: %s' % (
+                        self.get_option('annotations_root_scope'), to_text(exc)))
+        finally:
+            os.remove(csv_path)
+
+    def _fetch_hosts(self):
+        ''' Returns the hosts as a list of name, variables and groups
+        dictionaries, the form they are cached in
+        '''
+        client = self._client()
+        group_by = self.get_option('group_by')
+        scope_names = {}
+        if 'scope' in group_by:
+            scope_names = dict((s['id'], s['name']) for s in self._get_json(
+                client, tetration_constants.TETRATION_API_SCOPES))
+        annotations = None
+        if self.get_option('annotations_root_scope'):
+            annotations = self._annotations(client)
+
+        hosts = {}
+        for sensor in self._iter_sensors(client):
+            interfaces = sensor.get('interfaces') or []
+            address = primary_address(interfaces)
+            scope_ids = []
+            for interface in interfaces:
+                scope_ids.extend(i for i in interface.get('tags_scope_id') or [] if i not in scope_ids)
+            host_vars = {
+                'ansible_host': address,
+                'tetration_uuid': sensor.get('uuid'),
+                'tetration_host_name': sensor.get('host_name'),
+                'tetration_platform': sensor.get('platform'),
+                'tetration_agent_type': sensor.get('agent_type'),
+                'tetration_sw_version': sensor.get('current_sw_version'),
+                'tetration_last_check_in': sensor.get('last_config_fetch_at'),
+                'tetration_addresses': [i.get('ip') for i in interfaces if i.get('ip')],
+                'tetration_scopes': [scope_names[i] for i in scope_ids if i in scope_names],
+            }
+            if annotations is not None:
+                host_vars['tetration_annotations'] = (annotations.lookup(address) if address else None) or {}
+
+            name = {'host_name': sensor.get('host_name'), 'ip': address, 'uuid': sensor.get('uuid')}[
+                self.get_option('hostnames')]
+            if not name:
+                continue
+            previous = hosts.get(name)
+            if previous and (previous['vars']['tetration_last_check_in'] or 0) > (sensor.get('last_config_fetch_at') or 0):
+                # Reinstalled hosts keep the agent that checked in last
+                continue
+            hosts[name] = {'name': name, 'vars': host_vars, 'groups': self._groups(host_vars)}
+        return list(hosts.values())
+
+    def _groups(self, host_vars):
+        groups = []
+        group_by = self.get_option('group_by')
+        if 'scope' in group_by:
+            groups.extend(group_name('scope', scope) for scope in host_vars['tetration_scopes'])
+        if 'platform' in group_by and host_vars['tetration_platform']:
+            groups.append(group_name('platform', host_vars['tetration_platform']))
+        if 'agent_type' in group_by and host_vars['tetration_agent_type']:
+            groups.append(group_name('agent_type', host_vars['tetration_agent_type']))
+        for column in self.get_option('annotation_groups'):
+            value = host_vars.get('tetration_annotations', {}).get(column)
+            if value:
+                groups.append(group_name('annotation_%s' % column, value))
+        return groups
+
+    def _populate(self, hosts):
+        strict = self.get_option('strict')
+        compose = self.get_option('compose')
+        composed_groups = self.get_option('groups')
+        keyed_groups = self.get_option('keyed_groups')
+        known_groups = set()
+        for host in hosts:
+            name = self.inventory.add_host(host['name'])
+            for key, value in host['vars'].items():
+                self.inventory.set_variable(name, key, value)
+            for group in host['groups']:
+                if group not in known_groups:
+                    self.inventory.add_group(group)
+                    known_groups.add(group)
+                self.inventory.add_child(group, name)
+            # Templating is the slow part of a large inventory, skip it unless used
+            if compose:
+                self._set_composite_vars(compose, host['vars'], name, strict=strict)
+            if composed_groups:
+                self._add_host_to_composed_groups(composed_groups, host['vars'], name, strict=strict)
+            if keyed_groups:
+                self._add_host_to_keyed_groups(keyed_groups, host['vars'], name, strict=strict)
@@ -0,0 +1,217 @@
+DOCUMENTATION = """
+---
+name: tetration_id
+short_description: Resolves the names of Tetration objects to their IDs
+description:
+  - Returns the ID of each named scope, inventory filter, role or agent config profile
+  - Runs on the controller, so no module round trip is needed to turn a name into an ID
+  - Each collection is listed once per playbook run and indexed by name. Lookups run in
+    the forks of each host and task, so the listings are shared through an on-disk cache
+    private to the run, or with C(cache_ttl) set the on-disk cache the modules use
+  - A name that is not found in a memoized or cached listing is looked up once more
+    in a fresh listing, so objects created earlier in the play are found
+version_added: '2.9'
+options:
+  _terms:
+    description:
+      - The kind of object, one of C(scope), C(filter), C(role) or C(profile), followed
+        by the names to resolve
+      - Scopes are named by their full name, e.g. C(Default:Apps)
+    required: true
+  provider:
+    description:
+      - The C(provider) dictionary the modules use, its keys override the options below
+    type: dict
+  server_endpoint:
+    description:
+      - Specifies the DNS host name or address for connecting to the remote
+        tetration cluster
+    type: str
+    env:
+      - name: TETRATION_SERVER_ENDPOINT
+  api_key:
+    description: API Key used for tetration authentication
+    type: str
+    env:
+      - name: TETRATION_API_KEY
+  api_secret:
+    description: Specifies the API secret used for tetration authentication
+    type: str
+    env:
+      - name: TETRATION_API_SECRET
+  api_version:
+    description: Specifies the version of Tetration OpenAPI to use
+    type: str
+    default: v1
+    env:
+      - name: TETRATION_API_VERSION
+  verify:
+    description: Boolean value to enable or disable verifying SSL certificates
+    type: bool
+    default: false
+    env:
+      - name: TETRATION_VERIFY
+  timeout:
+    description: The amount of time to wait before receiving a response
+    type: float
+    default: 10
+    env:
+      - name: TETRATION_TIMEOUT
+  cache_ttl:
+    description:
+      - Seconds the listings are kept in the on-disk cache shared with the modules
+      - With a value of 0 they are kept in a cache private to the playbook run, for at
+        most an hour
+    type: int
+    default: 0
+    env:
+      - name: TETRATION_CACHE_TTL
+  cache_dir:
+    description: Directory of the on-disk cache, defaults to C(~/.ansible/tetration_cache)
+    type: str
+    env:
+      - name: TETRATION_CACHE_DIR
+  default:
+    description:
+      - Value returned for a name that does not exist
+      - Without it a name that does not exist is an error
+    type: raw
+notes:
+  - Point C(lookup_plugins) in C(ansible.cfg) at C(./plugins/lookup) when running
+    from a checkout
+  - Names shared by several inventory filters or roles cannot be resolved and are an error
+"""
+
+EXAMPLES = """
+- name: Create a policy between two scopes
+  tetration_application_policy:
+    app_id: "{{ app_id }}"
+    consumer_filter_id: "{{ lookup('tetration_id', 'scope', 'Default:Web', provider=provider_info) }}"
+    provider_filter_id: "{{ lookup('tetration_id', 'filter', 'Databases', provider=provider_info) }}"
+    ...
+
+- name: Resolve many names with one listing
+  debug:
+    msg: "{{ query('tetration_id', 'scope', 'Default:Web', 'Default:Db', 'Default:Old', default=omit) }}"
+"""
+
+RETURN = """
+_list:
+  description: The ID of each name, in the order of the names
+  type: list
+  elements: str
+"""
+
+import os
+import sys
+import time
+
+from ansible.errors import AnsibleError
+from ansible.plugins.lookup import LookupBase
+
+try:
+    from ansible.module_utils.tetration import RestClient
+    from ansible.module_utils.tetration_cache import ReferenceDataCache, credentials_digest
+    from ansible.module_utils.tetration_index import NameIndex
+    from ansible.module_utils import tetration_constants
+except ImportError:
+    # Loaded straight from the repository rather than an installed collection,
+    # make the module_utils shared with the modules importable
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+    from module_utils.tetration import RestClient
+    from module_utils.tetration_cache import ReferenceDataCache, credentials_digest
+    from module_utils.tetration_index import NameIndex
+    from module_utils import tetration_constants
+
+KINDS = {
+    'scope': tetration_constants.TETRATION_API_SCOPES,
+    'filter': tetration_constants.TETRATION_API_INVENTORY_FILTER,
+    'role': tetration_constants.TETRATION_API_ROLE,
+    'profile': tetration_constants.TETRATION_API_AGENT_CONFIG_PROFILES,
+}
+
+CONNECTION_OPTIONS = ['server_endpoint', 'api_key', 'api_secret', 'api_version', 'verify', 'timeout',
+                      'cache_ttl', 'cache_dir']
+
+# Name indexes of the listings used by this process, keyed by the credentials
+# digest and the route of the collection. Every fork has its own, the listings
+# are shared between the forks through the on-disk cache
+_MEMO = {}
+
+
+def name_index(route, listing):
+    ''' Returns the NameIndex of the listing of `route`, only scope names are unique '''
+    if route == KINDS['scope']:
+        return NameIndex(listing or [], [])
+    return NameIndex([], listing or [])
+
+
+class LookupModule(LookupBase):
+
+    def run(self, terms, variables=None, **kwargs):
+        self.set_options(var_options=variables, direct=kwargs)
+        if not terms or terms[0] not in KINDS:
+            raise AnsibleError('The first term must be one of %s, got: %s' % (
+                ', '.join(sorted(KINDS)), terms[0] if terms else 'nothing'))
+        kind, names = terms[0], terms[1:]
+
+        options = dict((o, self.get_option(o)) for o in CONNECTION_OPTIONS)
+        options.update((k, v) for k, v in (self.get_option('provider') or {}).items() if k in options and v is not None)
+        for required in ('server_endpoint', 'api_key', 'api_secret'):
+            if not options[required]:
+                raise AnsibleError('The %s option or provider key is required' % required)
+
+        route = KINDS[kind]
+        memo_key = (credentials_digest(options['server_endpoint'], options['api_key']), route)
+        index = _MEMO.get(memo_key)
+        fresh = False
+        if index is None:
+            index, fresh = self._fetch(options, route)
+
+        ids = []
+        for name in names:
+            if name not in index.duplicates and index.resolve(name=name) is None and not fresh:
+                # Listed before the object was created, list it once more
+                index, fresh = self._fetch(options, route, refresh=True)
+            if name in index.duplicates:
+                raise AnsibleError('More than one %s is named %s' % (kind, name))
+            object_id = index.resolve(name=name)
+            if object_id is not None:
+                ids.append(object_id)
+            elif self.get_option('default') is not None:
+                ids.append(self.get_option('default'))
+            else:
+                raise AnsibleError('There is no %s named %s' % (kind, name))
+        _MEMO[memo_key] = index
+        return ids
+
+    def _fetch(self, options, route, refresh=False):
+        ''' Returns the name index of the listing of `route`, from the on-disk cache
+        unless `refresh` is set, and whether the listing came from the cluster
+        '''
+        # The forks of a run share the parent playbook process
+        cache = ReferenceDataCache.from_provider(options) or ReferenceDataCache.for_run(options, os.getppid())
+        listing = None if refresh else cache.get(route)
+        if listing is not None:
+            return name_index(route, listing), False
+
+        with cache.fill_lock(route):
+            # Another fork may have listed it while this one waited
+            listing = None if refresh else cache.get(route)
+            if listing is not None:
+                return name_index(route, listing), False
+            fetched_at = time.time()
+            client = RestClient(
+                options['server_endpoint'],
+                api_key=options['api_key'],
+                api_secret=options['api_secret'],
+                api_version=options['api_version'],
+                verify=options['verify'],
+                timeout=options['timeout'])
+            resp = client.get(route)
+            if resp is None or resp.status_code != 200:
+                raise AnsibleError('Unable to get %s from the Tetration cluster: %s' % (
+                    route, 'no response' if resp is None else '%s %s' % (resp.status_code, resp.text)))
+            listing = resp.json()
+            cache.set(route, None, listing, fetched_at)
+        return name_index(route, listing), True
@@ -0,0 +1,88 @@
+"""
+Runs the `main()` of a module of `library/` in this process and writes the
+result with its wall time and peak RSS as JSON, for `test_benchmarks.py`.
+
+Every module runs in a process of its own so the peak RSS of one does not
+hide the next one's:
+
+    python tests/benchmarks/run_module.py tetration_user args.json metrics.json
+
+`args.json` holds the module arguments, the same dictionary a task passes.
+"""
+
+import contextlib
+import glob
+import importlib
+import io
+import json
+import os
+import resource
+import runpy
+import sys
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+def install_module_utils():
+    ''' Makes the module_utils of the repository importable the way the
+    modules import them, as `ansible.module_utils.<name>`
+    '''
+    sys.path.insert(0, REPO_ROOT)
+    for path in sorted(glob.glob(os.path.join(REPO_ROOT, 'module_utils', 'tetration*.py'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        sys.modules['ansible.module_utils.%s' % name] = importlib.import_module('module_utils.%s' % name)
+
+
+def run(module_name, module_args):
+    ''' Returns the result the module exits with, its wall time in seconds
+    and the peak RSS of the process in KiB
+    '''
+    from ansible.module_utils import basic
+    from ansible.module_utils._text import to_bytes
+
+    basic._ANSIBLE_ARGS = to_bytes(json.dumps({'ANSIBLE_MODULE_ARGS': module_args}))
+    stdout = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(stdout):
+        try:
+            runpy.run_path(os.path.join(REPO_ROOT, 'library', '%s.py' % module_name), run_name='__main__')
+        except SystemExit:
+            pass
+    wall_seconds = time.perf_counter() - started
+    try:
+        result = json.loads(stdout.getvalue())
+    except ValueError:
+        result = {'failed': True, 'msg': 'Module printed no JSON: %s' % stdout.getvalue()[:1000]}
+    return result, wall_seconds, peak_rss_kb()
+
+
+def peak_rss_kb():
+    ''' Returns the peak RSS of the process in KiB '''
+    # On Linux ru_maxrss survives the exec of the process and so includes the
+    # RSS the forking pytest process had, the high water mark of the memory
+    # of the process itself does not
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    # ru_maxrss is in KiB on Linux but in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss // 1024 if sys.platform == 'darwin' else peak_rss
+
+
+def main():
+    module_name, args_path, metrics_path = sys.argv[1:4]
+    with open(args_path) as args_file:
+        module_args = json.load(args_file)
+    install_module_utils()
+    result, wall_seconds, peak_rss = run(module_name, module_args)
+    with open(metrics_path, 'w') as metrics_file:
+        json.dump({'result': result, 'wall_seconds': wall_seconds, 'peak_rss_kb': peak_rss}, metrics_file)
+
+
+if __name__ == '__main__':
+    main()
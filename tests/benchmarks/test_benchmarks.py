@@ -0,0 +1,234 @@
+"""
+End to end benchmarks of the modules against the offline simulator.
+
+Each case runs the `main()` of a module in a fresh process against clusters
+of 1k, 10k and 100k objects and measures the wall time, the requests made,
+the bytes transferred and the peak RSS. The numbers are compared with the
+baselines in `baselines.json`, a run fails when one exceeds its baseline by
+more than its threshold.
+
+The benchmarks take minutes and only run when asked for:
+
+    TETRATION_BENCHMARKS=1 python -m pytest -q tests/benchmarks
+
+`TETRATION_BENCHMARKS=update` records the measured numbers as the new
+baselines, and `TETRATION_BENCHMARK_WALL_FACTOR` loosens the wall time
+threshold on machines slower than the one the baselines were recorded on.
+"""
+
+import collections
+import ipaddress
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from module_utils import tetration_constants
+from tests.tetration_simulator import TetrationSimulator
+
+BENCHMARKS = os.getenv('TETRATION_BENCHMARKS')
+UPDATE_BASELINES = BENCHMARKS == 'update'
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+RUNNER_PATH = os.path.join(os.path.dirname(__file__), 'run_module.py')
+
+SIZES = [1000, 10000, 100000]
+
+# Largest accepted ratio of each measure to its baseline. Wall times also get
+# some absolute slack, the shortest runs are dominated by the Python startup
+THRESHOLDS = {
+    'wall_seconds': float(os.getenv('TETRATION_BENCHMARK_WALL_FACTOR', '1.5')),
+    'requests': 1.0,
+    'bytes_transferred': 1.1,
+    'peak_rss_kb': 1.25,
+}
+WALL_SLACK_SECONDS = 0.25
+
+pytestmark = pytest.mark.skipif(not BENCHMARKS, reason='Set TETRATION_BENCHMARKS to run the benchmarks')
+
+
+def simulator_post(sim, route, payload):
+    ''' Creates objects in a started simulator outside of the measured requests '''
+    return sim.route('POST', route, {}, {'Content-Type': 'application/json'}, json.dumps(payload).encode('utf-8')).body
+
+
+def policy_between(sim, consumer, provider, **policy):
+    filter_ids = list(sim.inventory_filters)
+    return dict(policy, consumer_filter_id=filter_ids[consumer], provider_filter_id=filter_ids[provider])
+
+
+def application_policies_args(sim, size):
+    ''' An application with one policy per 100 objects, of which the module
+    keeps all but one, changes the priority of one and adds one
+    '''
+    count = size // 100
+    app = simulator_post(sim, tetration_constants.TETRATION_API_APPLICATIONS, dict(
+        name='Benchmark', app_scope_id=sim.root_scope['id'],
+        absolute_policies=[policy_between(sim, i, i + 1, policy_action='ALLOW', priority=100, rank='ABSOLUTE',
+                                          l4_params=[dict(proto=6, start_port=443, end_port=443)])
+                           for i in range(count)]))
+    policies = [dict(consumer_filter_name='Filter %d' % i, provider_filter_name='Filter %d' % (i + 1),
+                     policy_action='ALLOW', priority=200 if i == 1 else 100, rank='ABSOLUTE',
+                     l4_params=[dict(proto_name='TCP', start_port=443, end_port=443)])
+                for i in range(1, count + 1)]
+    return dict(app_id=app['id'], version=app['version'], policies=policies, purge=True)
+
+
+def policy_ports_args(sim, size):
+    ''' A policy with one TCP port per 10 objects, the module adds one port per
+    100 objects of which half are already covered
+    '''
+    existing, added = size // 10, size // 100
+    app = simulator_post(sim, tetration_constants.TETRATION_API_APPLICATIONS, dict(
+        name='Benchmark', app_scope_id=sim.root_scope['id'],
+        absolute_policies=[policy_between(sim, 0, 1, policy_action='ALLOW', priority=100, rank='ABSOLUTE',
+                                          l4_params=[dict(proto=6, start_port=port, end_port=port)
+                                                     for port in range(1, existing + 1)])]))
+    policy = list(sim.policies.values())[-1]
+    assert policy['application_id'] == app['id']
+    ports = range(existing - added // 2 + 1, existing + added // 2 + 1)
+    return dict(policy_id=policy['id'], skip_covered=True,
+                l4_params=[dict(proto_name='TCP', start_port=port, end_port=port) for port in ports])
+
+
+def inventory_tag_bulk_args(sim, size):
+    ''' The root scope has one annotated IP per object, the module syncs the
+    same rows with one in a hundred changed
+    '''
+    sim.annotations['Default'] = collections.OrderedDict(
+        (str(ipaddress.ip_address(0x0a000000 + i)), {'location': 'dc-%d' % (i % 4)}) for i in range(size))
+    tags = [dict(ip=str(ipaddress.ip_address(0x0a000000 + i)), location='dc-%d' % ((i + (i % 100 == 0)) % 4))
+            for i in range(size)]
+    return dict(root_scope_name='Default', operation='add', tags=tags, only_changes=True)
+
+
+# Each case names the module, the dataset the simulator is started with for a
+# size and the module arguments, built from the started simulator
+CASES = {
+    'tetration_user_query': (
+        'tetration_user',
+        lambda size: dict(users=size),
+        lambda sim, size: dict(email='user%d@example.com' % (size - 1), state='query'),
+    ),
+    'tetration_role_query': (
+        'tetration_role',
+        lambda size: dict(roles=size),
+        lambda sim, size: dict(name='Role %d' % (size - 1), app_scope_id=sim.root_scope['id'],
+                               state='query'),
+    ),
+    'tetration_inventory_filter_query': (
+        'tetration_inventory_filter',
+        lambda size: dict(inventory_filters=size),
+        lambda sim, size: dict(name='Filter %d' % (size - 1), app_scope_id=sim.root_scope['id'],
+                               state='query'),
+    ),
+    'tetration_scope_create': (
+        'tetration_scope',
+        lambda size: dict(scopes=size),
+        lambda sim, size: dict(short_name='Benchmark', parent_app_scope_id=sim.root_scope['id'],
+                               query_single=dict(type='subnet', field='ip', value='192.168.0.0/16'),
+                               state='present'),
+    ),
+    'tetration_scope_query': (
+        'tetration_scope_query',
+        lambda size: dict(scopes=size),
+        lambda sim, size: dict(fully_qualified_name=list(sim.scopes.values())[-1]['name']),
+    ),
+    'tetration_scope_tree_create': (
+        'tetration_scope_tree',
+        lambda size: dict(scopes=size),
+        lambda sim, size: dict(parent_app_scope_name='Default', tree=[dict(
+            short_name='Benchmark', query=dict(type='subnet', field='ip', value='192.168.0.0/16'),
+            children=[dict(short_name='Tier %d' % i, query=dict(type='eq', field='user_Tier', value=str(i)))
+                      for i in range(10)])]),
+    ),
+    'tetration_application_policies_sync': (
+        'tetration_application_policies',
+        lambda size: dict(scopes=size, inventory_filters=size // 100 + 2),
+        application_policies_args,
+    ),
+    'tetration_application_policy_ports_bulk_add': (
+        'tetration_application_policy_ports_bulk',
+        lambda size: dict(inventory_filters=2),
+        policy_ports_args,
+    ),
+    'tetration_inventory_tag_bulk_sync': (
+        'tetration_inventory_tag_bulk',
+        lambda size: dict(),
+        inventory_tag_bulk_args,
+    ),
+    'tetration_software_agent_query': (
+        'tetration_software_agent_query',
+        lambda size: dict(sensors=size),
+        lambda sim, size: dict(host_names=['host-%06d' % i for i in range(0, size, size // 10)]),
+    ),
+}
+
+
+def load_baselines():
+    try:
+        with open(BASELINES_PATH) as baselines_file:
+            return json.load(baselines_file)
+    except (IOError, ValueError):
+        return {}
+
+
+@pytest.fixture(scope='module')
+def baselines():
+    baselines = load_baselines()
+    yield baselines
+    if UPDATE_BASELINES:
+        with open(BASELINES_PATH, 'w') as baselines_file:
+            json.dump(baselines, baselines_file, indent=2, sort_keys=True)
+            baselines_file.write('\n')
+
+
+def run_module(module_name, simulator, module_args, tmp_path):
+    module_args = dict(module_args, provider=dict(
+        server_endpoint=simulator.endpoint,
+        api_key=simulator.api_key,
+        api_secret=simulator.api_secret))
+    args_path = tmp_path / 'args.json'
+    metrics_path = tmp_path / 'metrics.json'
+    args_path.write_text(json.dumps(module_args))
+    repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    subprocess.run([sys.executable, RUNNER_PATH, module_name, str(args_path), str(metrics_path)],
+                   cwd=repo_root, check=True, timeout=600)
+    return json.loads(metrics_path.read_text())
+
+
+@pytest.mark.parametrize('size', SIZES)
+@pytest.mark.parametrize('case', sorted(CASES))
+def test_benchmark(case, size, baselines, tmp_path):
+    module_name, dataset, module_args = CASES[case]
+    with TetrationSimulator(**dataset(size)) as simulator:
+        args = module_args(simulator, size)
+        simulator.reset_stats()
+        metrics = run_module(module_name, simulator, args, tmp_path)
+        measured = {
+            'wall_seconds': round(metrics['wall_seconds'], 3),
+            'requests': sum(simulator.requests.values()),
+            'bytes_transferred': simulator.bytes_sent + simulator.bytes_received,
+            'peak_rss_kb': metrics['peak_rss_kb'],
+        }
+
+    result = metrics['result']
+    assert not result.get('failed'), result.get('msg')
+    print(f'{case} {size}: {measured}')
+
+    key = f'{case}[{size}]'
+    if UPDATE_BASELINES:
+        baselines[key] = measured
+        return
+    if key not in baselines:
+        pytest.skip(f'No baseline for {key}, record one with TETRATION_BENCHMARKS=update')
+
+    regressions = []
+    for measure, factor in THRESHOLDS.items():
+        limit = baselines[key][measure] * factor
+        if measure == 'wall_seconds':
+            limit += WALL_SLACK_SECONDS
+        if measured[measure] > limit:
+            regressions.append(f'{measure} {measured[measure]} > {limit:.3f} (baseline {baselines[key][measure]})')
+    assert not regressions, f'{key} regressed: ' + ', '.join(regressions)
@@ -0,0 +1,19 @@
+import pytest
+
+from tests.tetration_simulator import TetrationSimulator
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers', 'simulator(**options): options of the TetrationSimulator the tetration_simulator fixture starts')
+
+
+@pytest.fixture()
+def tetration_simulator(request):
+    # Starts an offline Tetration OpenAPI for the test, configured with the
+    # keyword arguments of a `simulator` marker, e.g.
+    # @pytest.mark.simulator(sensors=100000, latency=0.01)
+    marker = request.node.get_closest_marker('simulator')
+    options = dict(marker.kwargs) if marker else {}
+    with TetrationSimulator(**options) as simulator:
+        yield simulator
@@ -8,10 +8,13 @@ export ANSIBLE_DOC_FRAGMENT_PLUGINS=./plugins/doc_fragments
 
 declare -a arr=("tetration_application"
                 "tetration_application_policy"
+                "tetration_application_policies"
                 "tetration_application_policy_ports"
+                "tetration_application_policy_ports_bulk"
                 "tetration_application_policy_catchall"
                 "tetration_inventory_tag_search"
                 "tetration_inventory_tag_headers"
+                "tetration_inventory_tag_bulk"
                 "tetration_application_enforcement"
                 "tetration_application_query"
                 "tetration_inventory_filter"
@@ -20,6 +23,7 @@ declare -a arr=("tetration_application"
                 "tetration_scope_commit_query_changes"
                 "tetration_scope_query"
                 "tetration_scope"
+                "tetration_scope_tree"
                 "tetration_software_agent_query"
                 "tetration_software_agent"
                 "tetration_software_agent_config_profile"
@@ -1,8 +1,30 @@
 import pytest
+import asyncio
+import hashlib
+import io
+import ipaddress
 import json
+import pstats
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+from unittest.mock import patch
 
 from module_utils import tetration
+from module_utils import tetration_annotations
+from module_utils import tetration_cache
 from module_utils import tetration_constants
+from module_utils import tetration_index
+from module_utils import tetration_metrics
+from module_utils import tetration_paging
+from module_utils import tetration_profile
+from module_utils import tetration_ratelimit
+from module_utils import tetration_retry
+from module_utils import tetration_scope_tree
+from module_utils import tetration_timeout
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils import basic
 from ansible.module_utils._text import to_bytes
@@ -12,7 +34,7 @@ import os
 
 
 @pytest.fixture()
-def api_info():
+def api_info(request):
     # This allows you to put all the environmental variables into a `.env`
     # file in the repo and will take the contents of the file and push them
     # into the OS environmental variables.
@@ -23,7 +45,9 @@ def api_info():
     endpoint = os.getenv("TETRATION_SERVER_ENDPOINT")
 
     if not all([api_key, api_secret, endpoint]):
-        assert False
+        # Without a cluster the tests run against the offline simulator
+        simulator = request.getfixturevalue('tetration_simulator')
+        api_key, api_secret, endpoint = simulator.api_key, simulator.api_secret, simulator.endpoint
 
     to_yield = {
         'api_key': api_key,
@@ -148,6 +172,73 @@ def test_user_id(rest_client, root_scope):
     assert resp.status_code == 200
 
 
+@pytest.fixture()
+def offline_tet_client(monkeypatch):
+    # Builds a TetrationApiModule without a cluster, tests swap `rc` for a
+    # FakeRestClient and pass any extra provider options they need
+    for key in tetration_constants.TETRATION_PROVIDER_SPEC:
+        monkeypatch.delenv(('TETRATION_%s' % key).upper(), raising=False)
+
+    def build(**provider_options):
+        provider = {
+            'server_endpoint': 'https://fake.com',
+            'api_key': 'deadbeef',
+            'api_secret': 'beef',
+        }
+        provider.update(provider_options)
+        module_args = dict(
+            provider=dict(
+                type='dict', options=tetration_constants.TETRATION_PROVIDER_SPEC)
+        )
+        set_module_args({'provider': provider})
+        module = AnsibleModule(
+            argument_spec=module_args, supports_check_mode=True)
+        return tetration.TetrationApiModule(module)
+
+    yield build
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.text = json.dumps(body)
+
+    def json(self):
+        if self.body is None:
+            raise ValueError('No JSON object could be decoded')
+        return self.body
+
+
+class FakeRestClient:
+    # Records every call and answers from a route -> body (or callable) dict
+    def __init__(self, routes=None):
+        self.routes = routes or {}
+        self.calls = []
+
+    def _respond(self, method, uri_path, kwargs):
+        self.calls.append((method, uri_path, dict(kwargs.get('params') or {})))
+        body = self.routes.get((method, uri_path), self.routes.get(uri_path, {}))
+        if callable(body):
+            body = body(kwargs)
+        if isinstance(body, FakeResponse):
+            return body
+        return FakeResponse(body=body)
+
+    def get(self, uri_path='', **kwargs):
+        return self._respond('GET', uri_path, kwargs)
+
+    def post(self, uri_path='', **kwargs):
+        return self._respond('POST', uri_path, kwargs)
+
+    def put(self, uri_path='', **kwargs):
+        return self._respond('PUT', uri_path, kwargs)
+
+    def delete(self, uri_path='', **kwargs):
+        return self._respond('DELETE', uri_path, kwargs)
+
+
 def set_module_args(args):
     if '_ansible_remote_tmp' not in args:
         args['_ansible_remote_tmp'] = '/tmp'
@@ -775,3 +866,1379 @@ class TestTetrationApiModule:
             tet_client.is_subset(test_obj1, test_obj2)
 
         assert str(e.value) == "Both objects must be dictionaries."
+
+
+class TestReferenceDataCache:
+    def make_cache(self, tmp_path, ttl=60, api_key='deadbeef'):
+        return tetration_cache.ReferenceDataCache(
+            str(tmp_path), ttl, 'https://fake.com', api_key)
+
+    def test_cache_is_disabled_by_default(self):
+        provider = {'server_endpoint': 'https://fake.com', 'api_key': 'deadbeef', 'cache_ttl': 0}
+
+        assert tetration_cache.ReferenceDataCache.from_provider(provider) is None
+
+    def test_cache_round_trip(self, tmp_path):
+        cache = self.make_cache(tmp_path)
+        scopes = [{'id': '1', 'name': 'Default'}]
+
+        assert cache.get(tetration_constants.TETRATION_API_SCOPES) is None
+        assert cache.set(tetration_constants.TETRATION_API_SCOPES, None, scopes, time.time())
+        assert cache.get(tetration_constants.TETRATION_API_SCOPES) == scopes
+
+    def test_cache_ignores_single_objects_and_other_routes(self, tmp_path):
+        cache = self.make_cache(tmp_path)
+
+        assert not cache.set(f"{tetration_constants.TETRATION_API_SCOPES}/abc", None, {}, time.time())
+        assert not cache.set(tetration_constants.TETRATION_API_SENSORS, None, [], time.time())
+
+    def test_cache_keys_on_params_and_api_key(self, tmp_path):
+        cache = self.make_cache(tmp_path)
+        other_key_cache = self.make_cache(tmp_path, api_key='cafe')
+        cache.set(tetration_constants.TETRATION_API_ROLE, None, ['all'], time.time())
+
+        assert cache.get(tetration_constants.TETRATION_API_ROLE, {'app_scope_id': '1'}) is None
+        assert other_key_cache.get(tetration_constants.TETRATION_API_ROLE) is None
+
+    def test_cache_entry_expires(self, tmp_path):
+        cache = self.make_cache(tmp_path, ttl=1)
+        cache.set(tetration_constants.TETRATION_API_ROLE, None, ['all'], time.time())
+        stored_at = time.time()
+
+        with patch.object(tetration_cache.time, 'time', return_value=stored_at + 2):
+            assert cache.get(tetration_constants.TETRATION_API_ROLE) is None
+
+    def test_write_to_sub_route_evicts_collection(self, tmp_path):
+        cache = self.make_cache(tmp_path)
+        cache.set(tetration_constants.TETRATION_API_SCOPES, None, ['all'], time.time())
+        cache.invalidate(f"{tetration_constants.TETRATION_API_SCOPES}/commit_dirty")
+
+        assert cache.get(tetration_constants.TETRATION_API_SCOPES) is None
+
+    def test_route_of_strips_api_prefix_and_query(self):
+        assert tetration.route_of('/openapi/v1/app_scopes/abc?x=1', '/openapi/v1') == '/app_scopes/abc'
+        assert tetration.route_of('app_scopes', '/openapi/v1') == '/app_scopes'
+
+    def test_tetration_rest_write_evicts_collection(self, tetration_simulator, tmp_path):
+        provider = dict(server_endpoint=tetration_simulator.endpoint, api_key=tetration_simulator.api_key,
+                        api_secret=tetration_simulator.api_secret, cache_ttl=60, cache_dir=str(tmp_path / 'cache'))
+        cache = tetration_cache.ReferenceDataCache.from_provider(provider)
+        cache.set(tetration_constants.TETRATION_API_INVENTORY_FILTER, None, ['stale'], time.time())
+        args_path, result_path = tmp_path / 'args.json', tmp_path / 'result.json'
+        args_path.write_text(json.dumps(dict(
+            route='filters/inventories?validate=true', method='post', provider=provider,
+            payload=dict(name='New', app_scope_id=tetration_simulator.root_scope['id']))))
+        runner = os.path.join(os.path.dirname(__file__), 'benchmarks', 'run_module.py')
+
+        subprocess.run([sys.executable, runner, 'tetration_rest', str(args_path), str(result_path)], check=True)
+
+        assert json.loads(result_path.read_text())['result']['changed']
+        assert cache.get(tetration_constants.TETRATION_API_INVENTORY_FILTER) is None
+
+    def test_new_run_removes_caches_of_past_runs(self, tmp_path):
+        provider = {'server_endpoint': 'https://fake.com', 'api_key': 'deadbeef', 'cache_dir': str(tmp_path)}
+        past = tetration_cache.ReferenceDataCache.for_run(provider, 'past-play')
+        past.set(tetration_constants.TETRATION_API_SCOPES, None, ['past'], time.time())
+        running = tetration_cache.ReferenceDataCache.for_run(provider, 'running-play')
+        running.set(tetration_constants.TETRATION_API_SCOPES, None, ['running'], time.time())
+        expired_at = time.time() - tetration_cache.RUN_CACHE_TTL - 1
+        os.utime(past.cache_dir, (expired_at, expired_at))
+
+        tetration_cache.ReferenceDataCache.for_run(provider, 'new-play')
+
+        assert not os.path.exists(past.cache_dir)
+        assert running.get(tetration_constants.TETRATION_API_SCOPES) == ['running']
+
+    def test_action_plugins_share_the_controller_preload_base(self):
+        from ansible.plugins.loader import action_loader
+        action_loader.add_directory(os.path.join(os.path.dirname(__file__), '..', 'plugins', 'action'))
+
+        for name in ('tetration_scope', 'tetration_rest'):
+            assert action_loader.get(name, class_only=True).__name__ == 'PreloadActionModule'
+
+    def test_response_fetched_before_eviction_is_not_stored(self, tmp_path):
+        cache = self.make_cache(tmp_path)
+        fetched_at = time.time() - 5
+        cache.invalidate(tetration_constants.TETRATION_API_SCOPES)
+
+        assert not cache.set(tetration_constants.TETRATION_API_SCOPES, None, ['stale'], fetched_at)
+
+    def test_run_method_uses_cache_across_modules(self, offline_tet_client, tmp_path):
+        scopes = [{'id': '1', 'name': 'Default'}]
+        first = offline_tet_client(cache_ttl=60, cache_dir=str(tmp_path))
+        first.rc = FakeRestClient({tetration_constants.TETRATION_API_SCOPES: scopes})
+        second = offline_tet_client(cache_ttl=60, cache_dir=str(tmp_path))
+        second.rc = FakeRestClient()
+
+        assert first.run_method('GET', tetration_constants.TETRATION_API_SCOPES) == scopes
+        assert second.run_method('GET', tetration_constants.TETRATION_API_SCOPES) == scopes
+        assert second.rc.calls == []
+
+    def test_run_many_uses_cache_across_modules(self, offline_tet_client, tmp_path):
+        scopes = [{'id': '1', 'name': 'Default'}]
+        filters = [{'id': '2', 'name': 'Web'}]
+        first = offline_tet_client(cache_ttl=60, cache_dir=str(tmp_path))
+        first.rc = FakeRestClient({tetration_constants.TETRATION_API_SCOPES: scopes,
+                                   tetration_constants.TETRATION_API_INVENTORY_FILTER: filters})
+        second = offline_tet_client(metrics=True, cache_ttl=60, cache_dir=str(tmp_path))
+        second.rc = FakeRestClient()
+        calls = [('GET', tetration_constants.TETRATION_API_SCOPES),
+                 ('GET', tetration_constants.TETRATION_API_INVENTORY_FILTER)]
+
+        assert first.run_many(calls) == [scopes, filters]
+        assert second.run_many(calls) == [scopes, filters]
+        assert second.rc.calls == []
+        assert second.metrics.as_result()['summary']['served_from_cache'] == 2
+
+    def test_run_method_write_evicts_cache(self, offline_tet_client, tmp_path):
+        tet_module = offline_tet_client(cache_ttl=60, cache_dir=str(tmp_path))
+        tet_module.rc = FakeRestClient({tetration_constants.TETRATION_API_SCOPES: [{'id': '1'}]})
+
+        tet_module.run_method('GET', tetration_constants.TETRATION_API_SCOPES)
+        tet_module.run_method('POST', tetration_constants.TETRATION_API_SCOPES, req_payload={})
+        tet_module.run_method('GET', tetration_constants.TETRATION_API_SCOPES)
+
+        get_calls = [c for c in tet_module.rc.calls if c[0] == 'GET']
+        assert len(get_calls) == 2
+
+    def test_run_method_serves_preloaded_listing_until_written(self, offline_tet_client):
+        tet_module = offline_tet_client()
+        tet_module.rc = FakeRestClient({tetration_constants.TETRATION_API_SCOPES: [{'id': 'fresh'}]})
+        tet_module.preloaded = {tetration_constants.TETRATION_API_SCOPES: [{'id': 'preloaded'}]}
+
+        assert tet_module.run_method('GET', tetration_constants.TETRATION_API_SCOPES) == [{'id': 'preloaded'}]
+        assert tet_module.run_method('GET', tetration_constants.TETRATION_API_SCOPES, params={'x': 1}) == [{'id': 'fresh'}]
+        tet_module.run_method('PUT', f"{tetration_constants.TETRATION_API_SCOPES}/1", req_payload={})
+        assert tet_module.run_method('GET', tetration_constants.TETRATION_API_SCOPES) == [{'id': 'fresh'}]
+
+    def test_run_many_serves_preloaded_listings(self, offline_tet_client):
+        tet_module = offline_tet_client()
+        tet_module.rc = FakeRestClient({'/applications/1': {'id': '1'}})
+        tet_module.preloaded = {tetration_constants.TETRATION_API_SCOPES: [{'id': 'preloaded'}]}
+
+        results = tet_module.run_many([('GET', '/applications/1'), ('GET', tetration_constants.TETRATION_API_SCOPES)])
+
+        assert results == [{'id': '1'}, [{'id': 'preloaded'}]]
+        assert [c[1] for c in tet_module.rc.calls] == ['/applications/1']
+
+    def test_resolve_provider_applies_defaults_and_drops_unknown_keys(self, offline_tet_client):
+        provider = tetration.resolve_provider({'server_endpoint': 'https://fake.com', 'api_key': 'k',
+                                               'api_secret': 's', 'unknown': 1})
+
+        assert 'unknown' not in provider
+        assert provider['api_version'] == 'v1'
+        with pytest.raises(ValueError):
+            tetration.resolve_provider({'server_endpoint': 'https://fake.com'})
+
+
+class FakeConnection:
+    # Stands in for the JSON-RPC Connection to the httpapi plugin
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self.body = body
+        self.requests = []
+
+    def get_identity(self):
+        return {'server_endpoint': 'https://fake.com', 'api_key': 'deadbeef'}
+
+    def send_request(self, data, method='GET', path='', params=None, timeout=None, tuning=None):
+        self.requests.append((method, path, params, data))
+        return {
+            'status_code': self.status_code,
+            'reason': 'OK',
+            'headers': {},
+            'text': json.dumps(self.body),
+            'url': path
+        }
+
+
+class SocketConnection:
+    # Hands requests to an httpapi plugin with the arguments JSON encoded like
+    # over the connection socket, the (connect, read) timeout tuple becomes a list
+    def __init__(self, plugin):
+        self.plugin = plugin
+
+    def send_request(self, data, **kwargs):
+        return self.plugin.send_request(data, **json.loads(json.dumps(kwargs)))
+
+
+class TestHttpApiRestClient:
+    def test_request_is_sent_through_connection(self):
+        connection = FakeConnection(body=[{'id': '1'}])
+        rest_client = tetration.HttpApiRestClient(connection)
+
+        resp = rest_client.get(tetration_constants.TETRATION_API_SCOPES, params={'a': 1})
+
+        assert resp.status_code == 200
+        assert resp.ok
+        assert resp.json() == [{'id': '1'}]
+        assert connection.requests == [('GET', tetration_constants.TETRATION_API_SCOPES, {'a': 1}, '')]
+
+    def test_module_uses_connection_without_provider(self, monkeypatch):
+        for key in tetration_constants.TETRATION_PROVIDER_SPEC:
+            monkeypatch.delenv(('TETRATION_%s' % key).upper(), raising=False)
+        module_args = dict(
+            provider=dict(type='dict', options=tetration_constants.TETRATION_PROVIDER_SPEC)
+        )
+        set_module_args({'_ansible_socket': '/tmp/fake-tetration-socket'})
+        module = AnsibleModule(argument_spec=module_args)
+
+        tet_module = tetration.TetrationApiModule(module)
+        assert isinstance(tet_module.rc, tetration.HttpApiRestClient)
+
+        tet_module.rc.connection = FakeConnection(body={'id': 'abc'})
+        resp = tet_module.run_method('PUT', f"{tetration_constants.TETRATION_API_USER}/abc", req_payload={'a': 1})
+
+        assert resp == {'id': 'abc'}
+        assert tet_module.rc.connection.requests[0][3] == json.dumps({'a': 1})
+
+    @pytest.fixture()
+    def httpapi_plugin(self, tetration_simulator):
+        from plugins.httpapi.tetration import HttpApi
+        plugin = HttpApi(None)
+        plugin._client = tetration.RestClient(tetration_simulator.endpoint, api_key=tetration_simulator.api_key,
+                                              api_secret=tetration_simulator.api_secret)
+        return plugin
+
+    def test_httpapi_plugin_sends_timeouts_through_rest_client(self, httpapi_plugin):
+        sent = []
+        send = httpapi_plugin._client.session.send
+        httpapi_plugin._client.session.send = lambda req, **kw: sent.append(kw['timeout']) or send(req, **kw)
+        rest_client = tetration.HttpApiRestClient(
+            SocketConnection(httpapi_plugin), timeouts=tetration_timeout.RequestTimeouts(connect=2, read=20))
+
+        resp = rest_client.get(tetration_constants.TETRATION_API_ROLE)
+
+        assert resp.status_code == 200
+        assert isinstance(resp.json(), list)
+        assert sent == [(2.0, 20.0)]
+
+    def test_httpapi_plugin_applies_retry_and_rate_limit_options(self, httpapi_plugin, tetration_simulator,
+                                                                 tmp_path):
+        tetration_simulator.inject(429, count=2, headers={'Retry-After': '0'})
+        rest_client = tetration.HttpApiRestClient(
+            SocketConnection(httpapi_plugin), metrics=tetration_metrics.RequestMetrics(),
+            tuning=dict(max_retries=3, rate_limit=20, rate_limit_burst=1, cache_dir=str(tmp_path)))
+
+        assert rest_client.get(tetration_constants.TETRATION_API_ROLE).status_code == 200
+        assert rest_client.retry_stats['retries'] == 2
+        assert rest_client.rate_limit_wait > 0
+        assert rest_client.metrics.calls[0]['throttled'] == 2
+
+        tetration_simulator.inject(429, count=2, headers={'Retry-After': '0'})
+        rest_client.tuning['max_retries'] = 1
+
+        assert rest_client.get(tetration_constants.TETRATION_API_ROLE).status_code == 429
+
+
+class TestRetryPolicy:
+    def test_retry_after_seconds_takes_precedence(self):
+        policy = tetration_retry.RetryPolicy()
+        response = FakeResponse(status_code=429, headers={'Retry-After': '7'})
+
+        assert policy.next_sleep(None, response) == 7.0
+
+    def test_retry_after_is_capped_at_backoff_max(self):
+        policy = tetration_retry.RetryPolicy(backoff_max=20)
+        far_off = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(time.time() + 86400))
+
+        assert policy.next_sleep(None, FakeResponse(status_code=429, headers={'Retry-After': '3600'})) == 20.0
+        assert policy.next_sleep(None, FakeResponse(status_code=503, headers={'Retry-After': far_off})) == 20.0
+
+    def test_retry_after_http_date(self):
+        response = FakeResponse(status_code=503, headers={'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+
+        assert tetration_retry.RetryPolicy.retry_after(response) == 0.0
+
+    def test_backoff_is_jittered_and_capped(self):
+        policy = tetration_retry.RetryPolicy(backoff_base=1, backoff_max=5)
+        sleep_time = None
+        for _ in range(20):
+            sleep_time = policy.next_sleep(sleep_time)
+            assert 1 <= sleep_time <= 5
+
+    def test_method_budgets(self):
+        policy = tetration_retry.RetryPolicy(max_retries=4, method_budgets={'get': 6, 'POST': 2})
+
+        assert policy.attempts_for('GET') == 6
+        assert policy.attempts_for('POST') == 2
+        assert policy.attempts_for('PUT') == 4
+        assert policy.attempts_for('PATCH') == 1
+
+    def test_zero_max_retries_still_sends_once(self):
+        rest_client = tetration.RestClient('https://fake.com', api_key='key', api_secret='secret', max_retries=0)
+
+        assert rest_client.retry_policy.attempts_for('GET') == 1
+
+
+class TestRestClientRetries:
+    def make_client(self, responses, **kwargs):
+        rest_client = tetration.RestClient('https://fake.com', api_key='key', api_secret='secret', **kwargs)
+        rest_client.session.send = lambda *args, **kw: responses.pop(0)
+        return rest_client
+
+    def test_throttled_get_is_retried(self):
+        responses = [FakeResponse(429, headers={'Retry-After': '3'}), FakeResponse(200, body=[])]
+        rest_client = self.make_client(responses)
+
+        with patch.object(tetration.time, 'sleep') as sleep:
+            resp = rest_client.get(tetration_constants.TETRATION_API_USER)
+
+        assert resp.status_code == 200
+        sleep.assert_called_once_with(3.0)
+        assert rest_client.retry_stats == {'retries': 1, 'sleep_seconds': 3.0}
+
+    def test_no_sleep_after_last_attempt(self):
+        responses = [FakeResponse(503), FakeResponse(503)]
+        rest_client = self.make_client(responses, max_retries=2)
+
+        with patch.object(tetration.time, 'sleep') as sleep:
+            resp = rest_client.get(tetration_constants.TETRATION_API_USER)
+
+        assert resp.status_code == 503
+        assert sleep.call_count == 1
+
+    def test_post_is_not_retried_by_default(self):
+        responses = [FakeResponse(503), FakeResponse(200)]
+        rest_client = self.make_client(responses)
+
+        with patch.object(tetration.time, 'sleep') as sleep:
+            resp = rest_client.post(tetration_constants.TETRATION_API_USER, json_body='{}')
+
+        assert resp.status_code == 503
+        sleep.assert_not_called()
+
+    def test_deadline_stops_retries(self):
+        responses = [FakeResponse(429, headers={'Retry-After': '60'}), FakeResponse(200)]
+        rest_client = self.make_client(responses, retry_deadline=10)
+
+        with patch.object(tetration.time, 'sleep') as sleep:
+            resp = rest_client.get(tetration_constants.TETRATION_API_USER)
+
+        assert resp.status_code == 429
+        sleep.assert_not_called()
+
+    def test_retry_stats_are_added_to_module_result(self, offline_tet_client, capsys):
+        tet_module = offline_tet_client()
+        tet_module.rc.retry_stats['retries'] = 2
+
+        with pytest.raises(SystemExit):
+            tet_module.module.exit_json(changed=False)
+
+        result = json.loads(capsys.readouterr().out)
+        assert result['tet_retries'] == {'retries': 2, 'sleep_seconds': 0.0}
+
+
+class TestTokenBucket:
+    def make_bucket(self, tmp_path, rate=2, burst=2, api_key='deadbeef'):
+        return tetration_ratelimit.TokenBucket(str(tmp_path), rate, burst, 'https://fake.com', api_key)
+
+    def test_rate_limiter_is_disabled_by_default(self):
+        rest_client = tetration.RestClient('https://fake.com', api_key='key', api_secret='secret')
+
+        assert rest_client.rate_limiter is None
+
+    def test_burst_is_served_without_waiting(self, tmp_path):
+        bucket = self.make_bucket(tmp_path)
+
+        with patch.object(tetration_ratelimit.time, 'sleep') as sleep:
+            assert bucket.acquire() == 0
+            assert bucket.acquire() == 0
+        sleep.assert_not_called()
+
+    def test_buckets_in_other_processes_share_state(self, tmp_path):
+        first = self.make_bucket(tmp_path)
+        second = self.make_bucket(tmp_path)
+        now = time.time()
+
+        with patch.object(tetration_ratelimit.time, 'time', return_value=now), \
+                patch.object(tetration_ratelimit.time, 'sleep') as sleep:
+            first.acquire()
+            first.acquire()
+            assert second.acquire() == pytest.approx(0.5)
+            assert second.acquire() == pytest.approx(1.0)
+        assert sleep.call_count == 2
+
+    def test_bucket_refills_over_time(self, tmp_path):
+        bucket = self.make_bucket(tmp_path)
+        now = time.time()
+
+        with patch.object(tetration_ratelimit.time, 'time', return_value=now):
+            bucket.acquire()
+            bucket.acquire()
+        with patch.object(tetration_ratelimit.time, 'time', return_value=now + 1), \
+                patch.object(tetration_ratelimit.time, 'sleep') as sleep:
+            assert bucket.acquire() == 0
+        sleep.assert_not_called()
+
+    def test_buckets_are_keyed_by_api_key(self, tmp_path):
+        bucket = self.make_bucket(tmp_path, burst=1)
+        other_bucket = self.make_bucket(tmp_path, burst=1, api_key='cafe')
+
+        with patch.object(tetration_ratelimit.time, 'sleep'):
+            bucket.acquire()
+            assert other_bucket.acquire() == 0
+
+    def test_rest_client_waits_for_token(self, tmp_path):
+        rest_client = tetration.RestClient(
+            'https://fake.com', api_key='key', api_secret='secret', rate_limit=1, cache_dir=str(tmp_path))
+        rest_client.session.send = lambda *args, **kw: FakeResponse(200, body=[])
+
+        with patch.object(tetration_ratelimit.time, 'sleep'):
+            rest_client.get(tetration_constants.TETRATION_API_USER)
+            rest_client.get(tetration_constants.TETRATION_API_USER)
+
+        assert rest_client.rate_limit_wait > 0
+
+    def test_rate_limit_wait_is_added_to_module_result(self, offline_tet_client, capsys, tmp_path):
+        tet_module = offline_tet_client(rate_limit=1, cache_dir=str(tmp_path), metrics=True)
+        tet_module.rc.rate_limit_wait = 1.5
+
+        with pytest.raises(SystemExit):
+            tet_module.module.exit_json(changed=False)
+
+        result = json.loads(capsys.readouterr().out)
+        assert result['tet_rate_limit_wait'] == 1.5
+        assert result['tet_metrics']['summary']['rate_limit_wait_seconds'] == 1.5
+
+
+def paged_sensors(total, page_size):
+    # Route handler answering like /sensors, continuing at the returned offset
+    sensors = [{'uuid': str(i), 'host_name': 'host-%d' % i} for i in range(total)]
+
+    def handler(kwargs):
+        offset = int(kwargs['params'].get('offset') or 0)
+        page = {'results': sensors[offset:offset + page_size]}
+        if offset + page_size < total:
+            page['offset'] = offset + page_size
+        return page
+    return handler
+
+
+class TestPagination:
+    def test_run_method_paginated_collects_all_pages(self, offline_tet_client):
+        tet_module = offline_tet_client()
+        tet_module.rc = FakeRestClient({tetration_constants.TETRATION_API_SENSORS: paged_sensors(25, 10)})
+
+        sensors = tet_module.run_method_paginated('GET', tetration_constants.TETRATION_API_SENSORS)
+
+        assert [s['uuid'] for s in sensors] == [str(i) for i in range(25)]
+        assert len(tet_module.rc.calls) == 3
+
+    def test_iter_paginated_stops_fetching_on_early_exit(self, offline_tet_client):
+        tet_module = offline_tet_client()
+        tet_module.rc = FakeRestClient({tetration_constants.TETRATION_API_SENSORS: paged_sensors(25, 10)})
+
+        for sensor in tet_module.iter_paginated('GET', tetration_constants.TETRATION_API_SENSORS):
+            if sensor['uuid'] == '12':
+                break
+
+        assert len(tet_module.rc.calls) == 2
+
+    def test_iter_paginated_does_not_modify_params(self, offline_tet_client):
+        tet_module = offline_tet_client()
+        tet_module.rc = FakeRestClient({tetration_constants.TETRATION_API_SENSORS: paged_sensors(5, 10)})
+        params = {'include_deleted': True}
+
+        list(tet_module.iter_paginated('GET', tetration_constants.TETRATION_API_SENSORS, params=params))
+
+        assert params == {'include_deleted': True}
+
+    def test_get_object_stops_at_first_match(self, offline_tet_client):
+        tet_module = offline_tet_client()
+        tet_module.rc = FakeRestClient({tetration_constants.TETRATION_API_SENSORS: paged_sensors(25, 10)})
+
+        sensor = tet_module.get_object(
+            dict(host_name='host-3'), target=tetration_constants.TETRATION_API_SENSORS,
+            params={'limit': 10}, sub_element='results')
+
+        assert sensor['uuid'] == '3'
+        assert len(tet_module.rc.calls) == 1
+
+    def test_get_object_allow_multiple_follows_offset(self, offline_tet_client):
+        tet_module = offline_tet_client()
+        tet_module.rc = FakeRestClient({tetration_constants.TETRATION_API_SENSORS: paged_sensors(25, 10)})
+
+        sensors = tet_module.get_object(
+            dict(), target=tetration_constants.TETRATION_API_SENSORS,
+            params={'limit': 10}, sub_element='results', allow_multiple=True)
+
+        assert len(sensors) == 25
+
+    def test_prefetch_collects_all_pages(self, offline_tet_client):
+        tet_module = offline_tet_client(pagination_prefetch=True)
+        tet_module.rc = FakeRestClient({tetration_constants.TETRATION_API_SENSORS: paged_sensors(25, 10)})
+
+        sensors = tet_module.run_method_paginated('GET', tetration_constants.TETRATION_API_SENSORS)
+
+        assert [s['uuid'] for s in sensors] == [str(i) for i in range(25)]
+        assert [c[2]['offset'] for c in tet_module.rc.calls] == [None, 10, 20]
+
+    def test_prefetch_requests_next_page_while_current_is_processed(self, offline_tet_client):
+        tet_module = offline_tet_client(pagination_prefetch=True)
+        second_page_requested = threading.Event()
+        sensors = paged_sensors(25, 10)
+
+        def handler(kwargs):
+            if kwargs['params'].get('offset'):
+                second_page_requested.set()
+            return sensors(kwargs)
+        tet_module.rc = FakeRestClient({tetration_constants.TETRATION_API_SENSORS: handler})
+
+        records = tet_module.iter_paginated('GET', tetration_constants.TETRATION_API_SENSORS)
+        next(records)
+
+        assert second_page_requested.wait(5)
+        records.close()
+
+    def test_prefetch_in_flight_is_finished_when_the_caller_stops(self, offline_tet_client):
+        tet_module = offline_tet_client(pagination_prefetch=True)
+        second_page_requested = threading.Event()
+        second_page_answered = threading.Event()
+        sensors = paged_sensors(25, 10)
+
+        def handler(kwargs):
+            if kwargs['params'].get('offset'):
+                second_page_requested.set()
+                time.sleep(0.2)
+                second_page_answered.set()
+            return sensors(kwargs)
+        tet_module.rc = FakeRestClient({tetration_constants.TETRATION_API_SENSORS: handler})
+
+        records = tet_module.iter_paginated('GET', tetration_constants.TETRATION_API_SENSORS)
+        next(records)
+        assert second_page_requested.wait(5)
+        records.close()
+
+        assert second_page_answered.is_set()
+
+    def test_prefetch_reports_errors_of_prefetched_page(self, offline_tet_client):
+        tet_module = offline_tet_client(pagination_prefetch=True)
+        sensors = paged_sensors(25, 10)
+
+        def handler(kwargs):
+            if kwargs['params'].get('offset'):
+                return FakeResponse(status_code=500, body='boom')
+            return sensors(kwargs)
+        tet_module.rc = FakeRestClient({tetration_constants.TETRATION_API_SENSORS: handler})
+
+        with pytest.raises(SystemExit):
+            tet_module.run_method_paginated('GET', tetration_constants.TETRATION_API_SENSORS)
+
+
+def sized_sensors(total, fail_above=None):
+    # Route handler honouring `limit`, failing with a 503 for larger pages
+    sensors = [{'uuid': str(i)} for i in range(total)]
+
+    def handler(kwargs):
+        offset = int(kwargs['params'].get('offset') or 0)
+        limit = int(kwargs['params']['limit'])
+        if fail_above is not None and limit > fail_above:
+            return FakeResponse(status_code=503, body='overloaded')
+        page = {'results': sensors[offset:offset + limit]}
+        if offset + limit < total:
+            page['offset'] = offset + limit
+        return page
+    return handler
+
+
+class TestPageSize:
+    def test_defaults_to_module_constant(self):
+        assert tetration_paging.PageSize().size == tetration_constants.TETRATION_API_PAGINATION_SIZE
+
+    def test_fixed_size_never_changes(self):
+        page_size = tetration_paging.PageSize(size=50)
+        page_size.record(50, 1.0)
+
+        assert page_size.size == 50
+        assert not page_size.shrink()
+
+    def test_adaptive_grows_while_time_per_record_falls(self):
+        page_size = tetration_paging.PageSize(size=100, adaptive=True)
+
+        page_size.record(100, 1.0)
+        assert page_size.size == 200
+        page_size.record(200, 1.0)
+        assert page_size.size == 400
+        # Twice the records in twice the time, larger pages stopped paying off
+        page_size.record(400, 2.0)
+        assert page_size.size == 200
+        page_size.record(200, 0.1)
+        assert page_size.size == 200
+
+    def test_adaptive_ignores_partial_pages(self):
+        page_size = tetration_paging.PageSize(size=100, adaptive=True)
+        page_size.record(30, 0.1)
+
+        assert page_size.size == 100
+
+    def test_adaptive_shrinks_down_to_minimum(self):
+        page_size = tetration_paging.PageSize(size=40, adaptive=True, minimum=10)
+
+        assert page_size.shrink()
+        assert page_size.size == 20
+        assert page_size.shrink()
+        assert not page_size.shrink()
+        assert page_size.size == 10
+
+    def test_page_size_option_is_sent_and_returned(self, offline_tet_client, capsys):
+        tet_module = offline_tet_client(page_size=10)
+        tet_module.rc = FakeRestClient({tetration_constants.TETRATION_API_SENSORS: sized_sensors(25)})
+
+        sensors = tet_module.run_method_paginated('GET', tetration_constants.TETRATION_API_SENSORS)
+        with pytest.raises(SystemExit):
+            tet_module.module.exit_json(changed=False)
+
+        assert len(sensors) == 25
+        assert [c[2]['limit'] for c in tet_module.rc.calls] == [10, 10, 10]
+        assert json.loads(capsys.readouterr().out)['tet_page_size'] == 10
+
+    def test_adaptive_retries_failed_page_with_fewer_records(self, offline_tet_client):
+        tet_module = offline_tet_client(page_size=40, page_size_adaptive=True)
+        tet_module.rc = FakeRestClient({tetration_constants.TETRATION_API_SENSORS: sized_sensors(100, fail_above=20)})
+
+        sensors = tet_module.run_method_paginated('GET', tetration_constants.TETRATION_API_SENSORS)
+
+        assert [s['uuid'] for s in sensors] == [str(i) for i in range(100)]
+        assert [c[2]['limit'] for c in tet_module.rc.calls][:2] == [40, 20]
+        assert max(c[2]['limit'] for c in tet_module.rc.calls[1:]) <= 20
+
+
+class TestRequestTimeouts:
+    def test_connect_timeout_defaults_to_read_timeout(self):
+        timeouts = tetration_timeout.RequestTimeouts.from_options({'timeout': 20})
+
+        assert timeouts.for_request(tetration_constants.TETRATION_API_USER) == (20.0, 20.0)
+
+    def test_route_timeouts_match_patterns(self):
+        timeouts = tetration_timeout.RequestTimeouts(connect=3, read=10, route_timeouts={
+            '/applications/*': 30, '/applications/*/details': 60})
+
+        assert timeouts.for_request('/applications/abc/details?x=1') == (3.0, 60.0)
+        assert timeouts.for_request('/applications/abc') == (3.0, 30.0)
+        assert timeouts.for_request('/users') == (3.0, 10.0)
+        assert timeouts.for_request('/users', timeout=5) == (3.0, 5.0)
+        assert timeouts.for_request('/users', timeout=[1, 5]) == (1.0, 5.0)
+
+    def test_timeouts_do_not_reach_past_task_deadline(self):
+        timeouts = tetration_timeout.RequestTimeouts(
+            connect=3, read=10, task_deadline=30, started_at=time.time() - 25)
+
+        connect, read = timeouts.for_request('/users')
+
+        assert connect == 3.0
+        assert 4 < read <= 5
+
+    def test_no_request_after_task_deadline(self):
+        timeouts = tetration_timeout.RequestTimeouts(task_deadline=30, started_at=time.time() - 31)
+
+        with pytest.raises(tetration_timeout.DeadlineExceeded):
+            timeouts.for_request('/users')
+
+    def test_rest_client_sends_provider_timeouts(self):
+        sent = []
+        rest_client = tetration.RestClient(
+            'https://fake.com', api_key='key', api_secret='secret', timeout=20, connect_timeout=2,
+            route_timeouts={'/applications/*/details': 90})
+        rest_client.session.send = lambda req, **kw: sent.append(kw['timeout']) or FakeResponse()
+
+        rest_client.get(tetration_constants.TETRATION_API_USER)
+        rest_client.get('/openapi/v1/applications/abc/details')
+
+        assert sent == [(2.0, 20.0), (2.0, 90.0)]
+
+    def test_retries_stop_at_task_deadline(self):
+        rest_client = tetration.RestClient('https://fake.com', api_key='key', api_secret='secret', task_deadline=10)
+        rest_client.session.send = lambda *args, **kw: FakeResponse(503)
+
+        with patch.object(tetration.time, 'sleep') as sleep, \
+                patch.object(tetration_retry.random, 'uniform', return_value=20.0):
+            resp = rest_client.get(tetration_constants.TETRATION_API_USER)
+
+        assert resp.status_code == 503
+        sleep.assert_not_called()
+
+    def test_module_fails_once_task_deadline_passed(self, offline_tet_client, capsys):
+        tet_module = offline_tet_client(task_deadline=30)
+        tet_module.rc.timeouts.started_at = time.time() - 31
+
+        with pytest.raises(SystemExit):
+            tet_module.run_method('GET', tetration_constants.TETRATION_API_USER)
+
+        result = json.loads(capsys.readouterr().out)
+        assert result['failed']
+        assert 'deadline' in result['msg']
+
+
+class TestRunMany:
+    def test_results_keep_the_order_of_calls(self, offline_tet_client):
+        tet_module = offline_tet_client()
+
+        def handler(kwargs):
+            # Later calls answer first
+            number = int(kwargs['params']['n'])
+            time.sleep((5 - number) * 0.01)
+            return {'n': number}
+        tet_module.rc = FakeRestClient({tetration_constants.TETRATION_API_APPLICATIONS: handler})
+
+        results = tet_module.run_many(
+            [('GET', tetration_constants.TETRATION_API_APPLICATIONS, {'n': n}) for n in range(5)])
+
+        assert results == [{'n': n} for n in range(5)]
+
+    def test_requests_in_flight_are_bounded(self, offline_tet_client):
+        # Identical GETs would be collapsed into one request by the memo
+        tet_module = offline_tet_client(memoize_gets=False)
+        lock = threading.Lock()
+        in_flight = {'now': 0, 'max': 0}
+
+        def handler(kwargs):
+            with lock:
+                in_flight['now'] += 1
+                in_flight['max'] = max(in_flight['max'], in_flight['now'])
+            time.sleep(0.02)
+            with lock:
+                in_flight['now'] -= 1
+            return {}
+        tet_module.rc = FakeRestClient({tetration_constants.TETRATION_API_APPLICATIONS: handler})
+
+        tet_module.run_many([('GET', tetration_constants.TETRATION_API_APPLICATIONS)] * 12, max_concurrency=3)
+
+        assert len(tet_module.rc.calls) == 12
+        assert 1 < in_flight['max'] <= 3
+
+    def test_failures_are_returned_in_place(self, offline_tet_client):
+        tet_module = offline_tet_client()
+        tet_module.rc = FakeRestClient({
+            '/applications/a': {'id': 'a'},
+            '/applications/b': FakeResponse(status_code=500, body='boom'),
+        })
+
+        results = tet_module.run_many(
+            [('GET', '/applications/a'), ('GET', '/applications/b')], fail_on_error=False)
+
+        assert results[0] == {'id': 'a'}
+        assert isinstance(results[1], tetration.TetrationApiError)
+        assert results[1].status_code == 500
+        assert results[1].target == '/applications/b'
+
+    def test_failure_fails_the_module_by_default(self, offline_tet_client, capsys):
+        tet_module = offline_tet_client()
+        tet_module.rc = FakeRestClient({'/applications/b': FakeResponse(status_code=500, body='boom')})
+
+        with pytest.raises(SystemExit):
+            tet_module.run_many([('GET', '/applications/b')])
+
+        result = json.loads(capsys.readouterr().out)
+        assert result['code'] == 500
+        assert result['operation'] == 'get'
+
+    def test_writes_are_signed_by_the_rest_client(self):
+        sent = []
+        rest_client = tetration.RestClient('https://fake.com', api_key='key', api_secret='secret')
+        rest_client.session.send = lambda req, **kw: sent.append(req) or FakeResponse()
+        async_client = tetration.AsyncRestClient(rest_client, max_concurrency=2)
+
+        try:
+            responses = asyncio.run(async_client.gather([
+                ('POST', tetration_constants.TETRATION_API_USER, {'json_body': '{}'}),
+                ('GET', tetration_constants.TETRATION_API_USER, {}),
+            ]))
+        finally:
+            async_client.close()
+
+        assert [r.status_code for r in responses] == [200, 200]
+        assert all(req.headers['Authorization'] for req in sent)
+        assert sorted((req.method, 'X-Tetration-Cksum' in req.headers) for req in sent) == [
+            ('GET', False), ('POST', True)]
+
+
+class TestUpload:
+    def test_upload_streams_signed_multipart_body(self, tmp_path):
+        csv_file = tmp_path / 'annotations.csv'
+        csv_file.write_text('IP,owner\n10.0.0.1,me\n')
+        sent = {}
+
+        def send(req, **kwargs):
+            sent['headers'] = req.headers
+            sent['body'] = req.body.read()
+            return FakeResponse(body={})
+        rest_client = tetration.RestClient('https://fake.com', api_key='key', api_secret='secret')
+        rest_client.session.send = send
+
+        resp = rest_client.upload(
+            str(csv_file), tetration_constants.TETRATION_API_INVENTORY_TAG_UPLOAD + '/Default',
+            [tetration.MultiPartOption('X-Tetration-Oper', 'merge')])
+
+        assert resp.status_code == 200
+        assert sent['headers']['Content-Type'] == 'multipart/form-data; boundary=CiscoTetrationClient'
+        assert sent['headers']['X-Tetration-Cksum'] == hashlib.sha256(sent['body']).hexdigest()
+        assert sent['headers']['Authorization']
+        assert int(sent['headers']['Content-Length']) == len(sent['body'])
+        assert b'name="X-Tetration-Oper"\r\n\r\nmerge\r\n' in sent['body']
+        assert b'filename="annotations.csv"' in sent['body']
+        assert b'IP,owner\n10.0.0.1,me\n' in sent['body']
+        assert sent['body'].endswith(b'--CiscoTetrationClient--\r\n')
+
+    def test_upload_is_not_supported_over_httpapi(self, offline_tet_client):
+        tet_module = offline_tet_client()
+        tet_module.rc = tetration.HttpApiRestClient(FakeConnection())
+
+        with pytest.raises(SystemExit):
+            tet_module.upload('/assets/cmdb/upload/Default', __file__)
+
+    def test_download_streams_body_to_file(self, tmp_path):
+        class StreamedResponse(FakeResponse):
+            def iter_content(self, chunk_size=1):
+                yield b'IP,owner\r\n'
+                yield b'10.0.0.1,me\r\n'
+        sent = {}
+
+        def send(req, **kwargs):
+            sent['stream'] = kwargs['stream']
+            sent['headers'] = req.headers
+            return StreamedResponse()
+        rest_client = tetration.RestClient('https://fake.com', api_key='key', api_secret='secret')
+        rest_client.session.send = send
+        target = tmp_path / 'current.csv'
+
+        resp = rest_client.download(str(target), tetration_constants.TETRATION_API_INVENTORY_TAG_DOWNLOAD + '/Default')
+
+        assert resp.status_code == 200
+        assert sent['stream'] is True
+        assert sent['headers']['Authorization']
+        assert target.read_bytes() == b'IP,owner\r\n10.0.0.1,me\r\n'
+
+
+CURRENT_ANNOTATIONS = (
+    'IP,VRF,owner,location\r\n'
+    '10.0.0.1,Default,me,dc1\r\n'
+    '10.0.0.2,Default,you,dc1\r\n'
+    '10.0.1.0/24,Default,net,\r\n'
+    '10.0.0.3,Default,old,dc2\r\n'
+)
+
+
+class TestAnnotationDiff:
+    def compare(self, desired, operation='merge', prune=False):
+        changes = io.StringIO()
+        deletes = io.StringIO()
+        diff = tetration_annotations.AnnotationDiff(operation=operation, prune=prune)
+        counts = diff.compare(io.StringIO(CURRENT_ANNOTATIONS), io.StringIO(desired), changes, deletes)
+        return counts, changes.getvalue().splitlines(), deletes.getvalue().splitlines()
+
+    def test_merge_uploads_only_new_and_changed_rows(self):
+        counts, changes, deletes = self.compare(
+            'IP,owner\n10.0.0.1,me\n10.0.0.2,them\n10.0.1.0/24,net\n10.0.0.9,new\n')
+
+        assert counts == {'new': 1, 'changed': 1, 'unchanged': 2, 'deleted': 0}
+        assert changes == ['IP,owner', '10.0.0.2,them', '10.0.0.9,new']
+        assert deletes == ['IP']
+
+    def test_add_compares_all_annotations(self):
+        counts, changes, _ = self.compare('IP,owner,location\n10.0.0.1,me,dc1\n10.0.1.0/24,net,\n10.0.0.2,you,\n')
+
+        assert counts == {'new': 0, 'changed': 1, 'unchanged': 2, 'deleted': 0}
+        assert changes == ['IP,owner,location', '10.0.0.2,you,']
+
+    def test_host_subnets_match_addresses(self):
+        counts, _, _ = self.compare('IP,owner\n10.0.0.1/32,me\n')
+
+        assert counts['unchanged'] == 1
+
+    def test_prune_deletes_missing_keys(self):
+        counts, _, deletes = self.compare('IP,owner\n10.0.0.1,me\n', prune=True)
+
+        assert counts == {'new': 0, 'changed': 0, 'unchanged': 1, 'deleted': 3}
+        assert sorted(deletes[1:]) == ['10.0.0.2', '10.0.0.3', '10.0.1.0/24']
+
+    def test_delete_skips_keys_without_annotations(self):
+        counts, changes, deletes = self.compare('IP\n10.0.0.3\n10.0.0.9\n', operation='delete')
+
+        assert counts == {'new': 0, 'changed': 0, 'unchanged': 1, 'deleted': 1}
+        assert changes == ['IP']
+        assert deletes == ['IP', '10.0.0.3']
+
+    def test_vrf_is_part_of_the_key_when_uploaded(self):
+        counts, _, _ = self.compare('IP,VRF,owner\n10.0.0.1,Default,me\n10.0.0.1,Other,me\n')
+
+        assert counts == {'new': 1, 'changed': 0, 'unchanged': 1, 'deleted': 0}
+
+    def test_upload_without_ip_column_is_rejected(self):
+        with pytest.raises(ValueError):
+            self.compare('owner\nme\n')
+
+
+class TestAnnotationLookup:
+    def test_most_specific_subnet_wins(self):
+        lookup = tetration_annotations.AnnotationLookup(io.StringIO(
+            'IP,VRF,owner,location\n10.0.0.0/8,Default,corp,\n10.1.0.0/16,Default,dc1,east\n'
+            '10.1.2.3,Default,me,\nfe80::/64,Default,link,\n'))
+
+        assert lookup.lookup('10.1.2.3') == {'owner': 'me'}
+        assert lookup.lookup('10.1.9.9') == {'owner': 'dc1', 'location': 'east'}
+        assert lookup.lookup('10.200.0.1') == {'owner': 'corp'}
+        assert lookup.lookup('fe80::5') == {'owner': 'link'}
+        assert lookup.lookup('192.168.0.1') is None
+        assert lookup.lookup('not an ip') is None
+
+    def test_lookup_without_ip_column_is_rejected(self):
+        with pytest.raises(ValueError):
+            tetration_annotations.AnnotationLookup(io.StringIO('owner\nme\n'))
+
+
+SCOPES = [
+    {'id': 'root', 'name': 'Default', 'short_name': 'Default', 'parent_app_scope_id': None},
+    {'id': 'web', 'name': 'Default:Web', 'short_name': 'Web', 'parent_app_scope_id': 'root',
+     'description': 'web', 'short_query': {'field': 'ip', 'type': 'subnet', 'value': '10.0.0.0/24'}},
+    {'id': 'old', 'name': 'Default:Old', 'short_name': 'Old', 'parent_app_scope_id': 'root'},
+    {'id': 'old-db', 'name': 'Default:Old:Db', 'short_name': 'Db', 'parent_app_scope_id': 'old'},
+]
+
+
+class TestScopeTreePlan:
+    def plan(self, tree, prune=False):
+        return tetration_scope_tree.ScopeTreePlan(SCOPES, 'root', tree, prune=prune)
+
+    def test_existing_scopes_are_only_updated_when_different(self):
+        plan = self.plan([
+            {'short_name': 'Web', 'description': 'web', 'query': SCOPES[1]['short_query'], 'policy_priority': 2}
+        ])
+
+        assert plan.counts() == {'create': 0, 'update': 1, 'delete': 0}
+        assert plan.steps[0]['payload'] == {'policy_priority': 2}
+        assert plan.changes_queries() is False
+
+    def test_unchanged_tree_has_no_steps(self):
+        plan = self.plan([{'short_name': 'Web', 'description': 'web'}, {'short_name': 'Old'}])
+
+        assert plan.changed is False
+        assert plan.ids == {'Default': 'root', 'Default:Web': 'web', 'Default:Old': 'old'}
+
+    def test_creates_are_grouped_parents_first(self):
+        query = {'field': 'ip', 'type': 'eq', 'value': '10.0.0.1'}
+        plan = self.plan([
+            {'short_name': 'Web', 'children': [{'short_name': 'Front', 'query': query}]},
+            {'short_name': 'App', 'query': query, 'children': [
+                {'short_name': 'Api', 'query': query, 'children': [{'short_name': 'V1', 'query': query}]}
+            ]},
+        ])
+
+        levels = [sorted(step['name'] for step in level) for level in plan.levels()]
+        assert levels == [['Default:App'], ['Default:App:Api', 'Default:Web:Front'], ['Default:App:Api:V1']]
+        assert plan.steps[0]['parent'] == 'Default:Web'
+        assert plan.ids['Default:App:Api'] is None
+        assert plan.changes_queries() is True
+
+    def test_prune_deletes_branches_children_first(self):
+        plan = self.plan([{'short_name': 'Web'}], prune=True)
+
+        levels = [[step['id'] for step in level] for level in plan.delete_levels()]
+        assert levels == [['old-db'], ['old']]
+
+    def test_create_without_query_is_rejected(self):
+        with pytest.raises(ValueError, match='query is required'):
+            self.plan([{'short_name': 'New'}])
+
+    def test_invalid_nodes_are_rejected(self):
+        with pytest.raises(ValueError, match='unsupported keys: name'):
+            self.plan([{'short_name': 'Web', 'name': 'Web'}])
+        with pytest.raises(ValueError, match='more than once'):
+            self.plan([{'short_name': 'Web'}, {'short_name': 'Web'}])
+        with pytest.raises(ValueError, match='does not exist'):
+            tetration_scope_tree.ScopeTreePlan(SCOPES, 'missing', [])
+
+
+class TestIndexes:
+    def test_name_index_prefers_scopes_and_rejects_duplicate_filters(self):
+        names = tetration_index.NameIndex(
+            [{'id': 's1', 'name': 'Default:Web'}],
+            [{'id': 'f1', 'name': 'Default:Web'}, {'id': 'f2', 'name': 'db'}, {'id': 'f3', 'name': 'db'}])
+
+        assert names.resolve(name='Default:Web') == 's1'
+        assert names.resolve(filter_id='f3') == 'f3'
+        assert names.resolve(filter_id='missing') is None
+        assert names.resolve(name='missing') is None
+        with pytest.raises(ValueError, match='Duplicate name: db'):
+            names.resolve(name='db')
+
+    def test_policy_index_finds_policies_by_rank_and_fields(self):
+        policy = {'id': 'p1', 'priority': 100, 'action': 'ALLOW', 'consumer_filter_id': 'a', 'provider_filter_id': 'b'}
+        policies = tetration_index.PolicyIndex({'ABSOLUTE': [policy], 'DEFAULT': None})
+
+        assert policies.find(('ABSOLUTE', 100, 'ALLOW', 'a', 'b')) == [policy]
+        assert policies.find(('DEFAULT', 100, 'ALLOW', 'a', 'b')) == []
+        assert len(policies) == 1
+
+    def test_port_range_index_finds_exact_covering_and_overlapping_ranges(self):
+        ranges = tetration_index.PortRangeIndex([
+            (6, 400, 500, 'wide'), (6, 22, 22, 'ssh'), (6, 450, 460, 'inner'), (6, 600, 700, 'high'),
+            (17, 53, 53, 'dns'), (1, None, None, 'icmp')
+        ])
+
+        assert ranges.exact(6, 22, 22) == 'ssh'
+        assert ranges.exact(6, 22, 23) is None
+        assert ranges.exact(1) == 'icmp'
+        assert ranges.covering(6, 455, 458) == 'wide'
+        assert ranges.covering(6, 490, 510) is None
+        assert ranges.covering(17, 22, 22) is None
+        assert ranges.covering(1) == 'icmp'
+        assert ranges.overlapping(6, 455, 650) == ['wide', 'inner', 'high']
+        assert ranges.overlapping(6, 23, 399) == []
+        assert ranges.overlapping(58, 1, 2) == []
+        assert len(ranges) == 6
+
+    def test_merge_port_ranges_joins_overlapping_and_adjacent_ranges(self):
+        merged = tetration_index.merge_port_ranges([(91, 100, 'b'), (80, 90, 'a'), (95, 99, 'c'), (102, 102, 'd')])
+
+        assert merged == [(80, 100, ['a', 'b', 'c']), (102, 102, ['d'])]
+
+    def test_l4_param_key_only_uses_ports_of_tcp_and_udp(self):
+        assert tetration_index.l4_param_key(6, 80, 80) != tetration_index.l4_param_key(6, 443, 443)
+        assert tetration_index.l4_param_key(1, 80, 80) == tetration_index.l4_param_key(1)
+        assert tetration_index.l4_param_key(None) == (None, None, None)
+
+    def test_sensor_index_finds_sensors_by_address_network_and_name(self):
+        sensors = [
+            {'uuid': 'a', 'host_name': 'web-1', 'interfaces': [{'ip': '10.0.0.1'}, {'ip': '10.0.0.2'}, {'ip': 'fe80::1'}]},
+            {'uuid': 'b', 'host_name': 'web-2', 'interfaces': [{'ip': '10.0.1.1'}, {'ip': 'not an ip'}]},
+            {'uuid': 'c', 'host_name': 'db-1', 'interfaces': []},
+        ]
+        index = tetration_index.SensorIndex(iter(sensors))
+
+        def uuids(found):
+            return [s['uuid'] for s in found]
+
+        assert uuids(index.by_address(ipaddress.ip_address('10.0.0.2'))) == ['a']
+        assert uuids(index.by_address(ipaddress.ip_address('fe80::1'))) == ['a']
+        assert uuids(index.by_address(ipaddress.ip_address('10.0.0.3'))) == []
+        assert uuids(index.in_network(ipaddress.ip_network('10.0.0.0/16'))) == ['a', 'b']
+        assert uuids(index.in_network(ipaddress.ip_network('10.0.0.0/24'))) == ['a']
+        assert uuids(index.in_network(ipaddress.ip_network('::/0'))) == ['a']
+        assert uuids(index.by_host_name('db-1')) == ['c']
+        assert uuids(index.by_host_name_prefix('web-')) == ['a', 'b']
+        assert uuids(index.by_host_name_prefix('x')) == []
+
+
+class TestSimulator:
+    def client(self, simulator, **kwargs):
+        options = dict(api_key=simulator.api_key, api_secret=simulator.api_secret)
+        options.update(kwargs)
+        return tetration.RestClient(simulator.endpoint, **options)
+
+    def test_rejects_requests_signed_with_another_secret(self, tetration_simulator):
+        resp = self.client(tetration_simulator, api_secret='other').get(tetration_constants.TETRATION_API_USER)
+
+        assert resp.status_code == 403
+
+    @pytest.mark.simulator(sensors=2500)
+    def test_sensors_are_paginated_with_offset(self, tetration_simulator, offline_tet_client):
+        tet_module = offline_tet_client(server_endpoint=tetration_simulator.endpoint,
+                                        api_key=tetration_simulator.api_key,
+                                        api_secret=tetration_simulator.api_secret,
+                                        page_size=1000)
+
+        uuids = [s['uuid'] for s in tet_module.iter_paginated('GET', tetration_constants.TETRATION_API_SENSORS)]
+
+        assert len(set(uuids)) == 2500
+        assert tetration_simulator.requests[('GET', '/openapi/v1/sensors')] == 3
+
+    def test_injected_throttling_is_retried(self, tetration_simulator):
+        tetration_simulator.inject(429, count=2, headers={'Retry-After': '0'})
+        rest_client = self.client(tetration_simulator)
+
+        resp = rest_client.get(tetration_constants.TETRATION_API_ROLE)
+
+        assert resp.status_code == 200
+        assert rest_client.retry_stats['retries'] == 2
+
+    @pytest.mark.simulator(rate_limit=1)
+    def test_rate_limit_answers_429_with_retry_after(self, tetration_simulator):
+        rest_client = self.client(tetration_simulator, max_retries=0)
+
+        assert rest_client.get(tetration_constants.TETRATION_API_ROLE).status_code == 200
+        resp = rest_client.get(tetration_constants.TETRATION_API_ROLE)
+
+        assert resp.status_code == 429
+        assert float(resp.headers['Retry-After']) > 0
+
+    def test_annotations_round_trip(self, tetration_simulator, tmp_path):
+        rest_client = self.client(tetration_simulator)
+        upload = tmp_path / 'upload.csv'
+        upload.write_text('IP,VRF,owner\n10.0.0.1,Default,me\n10.1.0.0/16,Default,net\n')
+        download = tmp_path / 'download.csv'
+
+        resp = rest_client.upload(str(upload), f"{tetration_constants.TETRATION_API_INVENTORY_TAG_UPLOAD}/Default",
+                                  [tetration.MultiPartOption('X-Tetration-Oper', 'add')])
+        assert resp.status_code == 200
+        rest_client.download(str(download), f"{tetration_constants.TETRATION_API_INVENTORY_TAG_DOWNLOAD}/Default")
+        resp = rest_client.get(f"{tetration_constants.TETRATION_API_INVENTORY_TAG}/Default", params={'ip': '10.0.0.1'})
+
+        assert download.read_text().splitlines() == ['IP,VRF,owner', '10.0.0.1,Default,me', '10.1.0.0/16,Default,net']
+        assert resp.json() == {'owner': 'me'}
+
+
+class TestTetrationIdLookup:
+    @pytest.fixture()
+    def lookup(self, tetration_simulator, tmp_path):
+        from ansible.plugins.loader import lookup_loader
+        lookup_loader.add_directory(os.path.join(os.path.dirname(__file__), '..', 'plugins', 'lookup'))
+        plugin = lookup_loader.get('tetration_id')
+        # Name indexes are memoized per process
+        sys.modules[type(plugin).__module__]._MEMO.clear()
+        options = dict(server_endpoint=tetration_simulator.endpoint, api_key=tetration_simulator.api_key,
+                       api_secret=tetration_simulator.api_secret, cache_dir=str(tmp_path))
+        return lambda *terms, **kwargs: plugin.run(list(terms), variables={}, **dict(options, **kwargs))
+
+    @pytest.mark.simulator(scopes=3, roles=3)
+    def test_resolves_names_with_one_listing(self, lookup, tetration_simulator):
+        scope = list(tetration_simulator.scopes.values())[-1]
+        roles = list(tetration_simulator.roles.values())
+
+        assert lookup('scope', scope['name']) == [scope['id']]
+        assert lookup('role', 'Role 2', 'Role 0') == [roles[2]['id'], roles[0]['id']]
+        assert lookup('role', 'Role 1') == [roles[1]['id']]
+        assert tetration_simulator.requests[('GET', '/openapi/v1/roles')] == 1
+
+    @pytest.mark.simulator(roles=3)
+    def test_forks_of_a_run_share_one_listing(self, lookup, tetration_simulator):
+        from ansible.plugins.loader import lookup_loader
+        roles = list(tetration_simulator.roles.values())
+
+        assert lookup('role', 'Role 0') == [roles[0]['id']]
+        # The fork of the next host or task starts without the memo of this one
+        sys.modules[type(lookup_loader.get('tetration_id')).__module__]._MEMO.clear()
+        assert lookup('role', 'Role 1') == [roles[1]['id']]
+        assert tetration_simulator.requests[('GET', '/openapi/v1/roles')] == 1
+
+    @pytest.mark.simulator(roles=3)
+    def test_missing_name_is_an_error_without_default(self, lookup):
+        from ansible.errors import AnsibleError
+
+        with pytest.raises(AnsibleError, match='There is no role named Missing'):
+            lookup('role', 'Missing')
+        assert lookup('role', 'Missing', default='none') == ['none']
+
+    @pytest.mark.simulator(inventory_filters=2)
+    def test_ambiguous_name_is_an_error(self, lookup, tetration_simulator):
+        from ansible.errors import AnsibleError
+        rest_client = tetration.RestClient(tetration_simulator.endpoint, api_key=tetration_simulator.api_key,
+                                           api_secret=tetration_simulator.api_secret)
+        rest_client.post(tetration_constants.TETRATION_API_INVENTORY_FILTER,
+                         json_body=json.dumps({'name': 'Filter 1', 'app_scope_id': tetration_simulator.root_scope['id']}))
+
+        assert lookup('filter', 'Filter 0') == [list(tetration_simulator.inventory_filters)[0]]
+        with pytest.raises(AnsibleError, match='More than one filter is named Filter 1'):
+            lookup('filter', 'Filter 1')
+
+
+class TestRequestMetrics:
+    def test_route_template_replaces_object_ids(self):
+        assert tetration_metrics.route_template('/app_scopes/5f0000000000000000000001/policies') == \
+            '/app_scopes/{id}/policies'
+        assert tetration_metrics.route_template('/sensors/' + '0' * 39 + '1') == '/sensors/{id}'
+        assert tetration_metrics.route_template('/assets/cmdb/download/Default') == '/assets/cmdb/download/Default'
+
+    def test_results_have_no_metrics_unless_enabled(self, offline_tet_client):
+        tet_module = offline_tet_client()
+
+        assert tet_module.metrics is None
+        assert 'tet_metrics' not in tet_module._add_result_stats({})
+
+    def test_records_requests_and_retries(self, tetration_simulator, offline_tet_client):
+        tet_module = offline_tet_client(server_endpoint=tetration_simulator.endpoint,
+                                        api_key=tetration_simulator.api_key,
+                                        api_secret=tetration_simulator.api_secret,
+                                        metrics=True)
+        tetration_simulator.inject(429, count=1, headers={'Retry-After': '0'})
+
+        scopes = tet_module.run_method('GET', tetration_constants.TETRATION_API_SCOPES)
+        for scope in scopes[:2]:
+            tet_module.run_method('GET', f"{tetration_constants.TETRATION_API_SCOPES}/{scope['id']}")
+        metrics = tet_module._add_result_stats({})['tet_metrics']
+
+        assert metrics['summary']['requests'] == 3
+        assert metrics['summary']['retries'] == 1
+        assert metrics['summary']['errors'] == 0
+        assert metrics['calls'][0]['status'] == 200
+        assert metrics['calls'][0]['response_bytes'] > 0
+        routes = dict((r['route'], r) for r in metrics['routes'])
+        assert routes['/app_scopes/{id}']['requests'] == 2
+        assert routes['/app_scopes']['retries'] == 1
+
+    def test_counts_gets_served_without_a_request(self, offline_tet_client, tmp_path):
+        tet_module = offline_tet_client(metrics=True, cache_ttl=60, cache_dir=str(tmp_path))
+        tet_module.rc = FakeRestClient({tetration_constants.TETRATION_API_ROLE: [{'id': '1'}]})
+        tet_module.preloaded = {tetration_constants.TETRATION_API_SCOPES: [{'id': '2'}]}
+
+        tet_module.run_method('GET', tetration_constants.TETRATION_API_SCOPES)
+        tet_module.run_method('GET', tetration_constants.TETRATION_API_ROLE)
+        tet_module.run_method('GET', tetration_constants.TETRATION_API_ROLE)
+        summary = tet_module.metrics.as_result()['summary']
+
+        assert summary['served_preloaded'] == 1
+        assert summary['served_from_cache'] == 1
+
+    def test_keeps_at_most_max_calls(self):
+        metrics = tetration_metrics.RequestMetrics()
+        for _ in range(metrics.MAX_CALLS + 5):
+            metrics.record('GET', '/sensors', 200, 0.01, 10)
+        result = metrics.as_result()
+
+        assert len(result['calls']) == metrics.MAX_CALLS
+        assert result['dropped_calls'] == 5
+        assert result['summary']['requests'] == metrics.MAX_CALLS + 5
+
+    def test_records_throttled_responses(self, tetration_simulator):
+        tetration_simulator.inject(429, count=2, headers={'Retry-After': '0'})
+        rest_client = tetration.RestClient(tetration_simulator.endpoint, api_key=tetration_simulator.api_key,
+                                           api_secret=tetration_simulator.api_secret, metrics=True)
+
+        rest_client.get(tetration_constants.TETRATION_API_ROLE)
+
+        assert rest_client.metrics.calls[0]['throttled'] == 2
+        assert rest_client.metrics.calls[0]['retries'] == 2
+        assert rest_client.metrics.calls[0]['status'] == 200
+
+    def test_tetration_rest_returns_metrics(self, tetration_simulator, tmp_path):
+        args_path, result_path = tmp_path / 'args.json', tmp_path / 'result.json'
+        args_path.write_text(json.dumps(dict(route='roles', method='get', provider=dict(
+            server_endpoint=tetration_simulator.endpoint, api_key=tetration_simulator.api_key,
+            api_secret=tetration_simulator.api_secret, metrics=True))))
+        runner = os.path.join(os.path.dirname(__file__), 'benchmarks', 'run_module.py')
+
+        subprocess.run([sys.executable, runner, 'tetration_rest', str(args_path), str(result_path)], check=True)
+        result = json.loads(result_path.read_text())['result']
+
+        assert result['status_code'] == 200
+        assert result['tet_retries']['retries'] == 0
+        assert result['tet_metrics']['summary']['requests'] == 1
+        assert result['tet_metrics']['routes'][0]['route'] == '/roles'
+
+
+class TestPlayMetrics:
+    def task_metrics(self, *latencies, **summary):
+        metrics = tetration_metrics.RequestMetrics()
+        for latency in latencies:
+            metrics.record('GET', '/app_scopes/5f0000000000000000000001', 200, latency, 100, throttled=1, retries=1)
+        result = metrics.as_result()
+        result['summary'].update(summary)
+        return result
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        assert tetration_metrics.percentile(values, 50) == 50
+        assert tetration_metrics.percentile(values, 99) == 99
+        assert tetration_metrics.percentile([7], 95) == 7
+        assert tetration_metrics.percentile([], 50) is None
+
+    def test_report_aggregates_routes_over_tasks(self):
+        play_metrics = tetration_metrics.PlayMetrics()
+        play_metrics.add('query', 'host1', 'tetration_scope', self.task_metrics(*[0.01] * 9))
+        play_metrics.add('query', 'host2', 'tetration_scope', self.task_metrics(1.0, served_preloaded=2))
+
+        report = play_metrics.report(slowest_tasks=1)
+        route = report['routes'][0]
+
+        assert route['route'] == '/app_scopes/{id}'
+        assert route['requests'] == 10
+        assert route['p50_seconds'] == 0.01
+        assert route['p99_seconds'] == 1.0
+        assert route['throttle_rate'] == 0.5
+        assert report['summary']['served_preloaded'] == 2
+        assert report['summary']['memo_hits'] == 0
+        assert [t['host'] for t in report['slowest_tasks']] == ['host2']
+
+
+class TestModuleProfiler:
+    def test_results_have_no_profile_unless_enabled(self, offline_tet_client):
+        tet_module = offline_tet_client()
+
+        assert tet_module.profiler is None
+        assert 'tet_profile' not in tet_module._add_result_stats({})
+
+    def test_profiles_cpu_and_memory_into_the_result_and_directory(self, offline_tet_client, tmp_path):
+        tet_module = offline_tet_client(profile=True, profile_memory=True, profile_dir=str(tmp_path))
+        tet_module.rc = FakeRestClient({tetration_constants.TETRATION_API_SCOPES: [{'id': str(i)} for i in range(500)]})
+
+        tet_module.run_method('GET', tetration_constants.TETRATION_API_SCOPES)
+        profile = tet_module._add_result_stats({})['tet_profile']
+
+        assert any('run_method' in f['function'] for f in profile['functions'])
+        assert profile['memory']['peak_bytes'] > 0
+        assert profile['memory']['allocations']
+        assert pstats.Stats(profile['cpu_profile_path']).total_calls == profile['total_calls']
+        assert os.path.exists(profile['memory_snapshot_path'])
+        assert not tracemalloc.is_tracing()
+
+    def test_stop_returns_the_first_profile(self):
+        profiler = tetration_profile.ModuleProfiler()
+
+        assert profiler.stop() is profiler.stop()
+
+
+class TestResponseMemo:
+    def test_repeated_get_is_sent_once_and_not_shared(self, offline_tet_client):
+        tet_module = offline_tet_client()
+        tet_module.rc = FakeRestClient({'/roles/1': {'id': '1', 'capabilities': []}})
+
+        first = tet_module.run_method('GET', '/roles/1')
+        first['capabilities'].append('changed')
+        second = tet_module.run_method('GET', '/roles/1')
+
+        assert len(tet_module.rc.calls) == 1
+        assert second == {'id': '1', 'capabilities': []}
+        assert tet_module.get_memo.stats() == {'hits': 1, 'misses': 1}
+
+    def test_params_are_part_of_the_key(self, offline_tet_client):
+        tet_module = offline_tet_client()
+        tet_module.rc = FakeRestClient({'/inventory/tags/Default': lambda kwargs: kwargs['params']})
+
+        assert tet_module.run_method('GET', '/inventory/tags/Default', params={'ip': '10.0.0.1'}) == {'ip': '10.0.0.1'}
+        assert tet_module.run_method('GET', '/inventory/tags/Default', params={'ip': '10.0.0.2'}) == {'ip': '10.0.0.2'}
+        assert len(tet_module.rc.calls) == 2
+
+    def test_writes_evict_overlapping_routes(self, offline_tet_client):
+        tet_module = offline_tet_client()
+        tet_module.rc = FakeRestClient()
+        for route in ('/roles', '/roles/1', '/roles/2', '/app_scopes'):
+            tet_module.run_method('GET', route)
+
+        tet_module.run_method('PUT', '/roles/1', req_payload={})
+        for route in ('/roles', '/roles/1', '/roles/2', '/app_scopes'):
+            tet_module.run_method('GET', route)
+
+        assert [c[1] for c in tet_module.rc.calls[5:]] == ['/roles', '/roles/1']
+
+    def test_run_many_coalesces_identical_gets(self, offline_tet_client):
+        tet_module = offline_tet_client(metrics=True)
+        tet_module.rc = FakeRestClient({'/applications/a': {'id': 'a'}})
+
+        results = tet_module.run_many([('GET', '/applications/a')] * 3)
+        results.append(tet_module.run_method('GET', '/applications/a'))
+
+        assert results == [{'id': 'a'}] * 4
+        assert len(tet_module.rc.calls) == 1
+        assert tet_module.metrics.as_result()['summary']['served_from_memo'] == 3
+        summary = tet_module._add_result_stats({})['tet_metrics']['summary']
+        assert (summary['memo_hits'], summary['memo_misses']) == (3, 1)
+
+    def test_run_many_does_not_memoize_gets_sent_with_a_write(self, offline_tet_client):
+        tet_module = offline_tet_client()
+        tet_module.rc = FakeRestClient()
+
+        tet_module.run_many([('GET', '/roles/1'), ('POST', '/roles/1/capabilities', None, {})])
+        tet_module.run_method('GET', '/roles/1')
+
+        assert [c[1] for c in tet_module.rc.calls if c[0] == 'GET'] == ['/roles/1', '/roles/1']
+
+    def test_can_be_disabled(self, offline_tet_client):
+        tet_module = offline_tet_client(memoize_gets=False)
+        tet_module.rc = FakeRestClient()
+
+        tet_module.run_method('GET', '/roles')
+        tet_module.run_method('GET', '/roles')
+
+        assert tet_module.get_memo is None
+        assert len(tet_module.rc.calls) == 2
@@ -0,0 +1,801 @@
+"""
+Offline stand-in for the Tetration OpenAPI, for tests and benchmarks.
+
+Serves the routes of `tetration_constants` from an in memory dataset over
+HTTP, verifying the HMAC signature `RestClient` adds to every request.
+Latency, throttling (429) and server errors can be injected, and the size of
+the dataset is configurable up to clusters with 100k software agents and 5k
+scopes. Software agents are generated on demand while paging, so large
+datasets cost little memory.
+
+It is started by the `tetration_simulator` fixture of `tests/conftest.py`, or
+as a standalone server to point molecule scenarios at:
+
+    python -m tests.tetration_simulator --port 8899 --sensors 100000 --scopes 5000
+"""
+
+import argparse
+import base64
+import collections
+import csv
+import hashlib
+import hmac
+import io
+import ipaddress
+import json
+import random
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from module_utils import tetration_constants
+
+URI_PREFIX = '/openapi/v1'
+PLATFORMS = ['CentOS-7.9', 'Ubuntu 20.04', 'MSWindows2019Server', 'RedHatEnterpriseServer-8.4']
+DEFAULT_SENSOR_PAGE_SIZE = 100
+
+
+class SimulatorError(Exception):
+    ''' Ends a request with `status_code` and the JSON `body` '''
+
+    def __init__(self, status_code, body=None):
+        super(SimulatorError, self).__init__(status_code)
+        self.status_code = status_code
+        self.body = body if body is not None else {'error': 'Error %s' % status_code}
+
+
+class Reply(object):
+    ''' A response of the simulator, `body` is JSON encoded unless it is bytes '''
+
+    def __init__(self, body=None, status_code=200, content_type='application/json', headers=None):
+        self.body = body
+        self.status_code = status_code
+        self.content_type = content_type
+        self.headers = headers or {}
+
+    def encoded(self):
+        if isinstance(self.body, bytes):
+            return self.body
+        return json.dumps(self.body).encode('utf-8')
+
+
+def not_found(what=''):
+    return SimulatorError(404, {'error': 'Not found %s' % what})
+
+
+class TetrationSimulator(object):
+    """
+    In memory Tetration cluster behind a threaded HTTP server.
+
+    Args:
+        api_key, api_secret: Credentials requests must be signed with
+        sensors: Int of software agents, generated on demand
+        scopes: Int of scopes including the root scope, in a tree of `fanout`
+        inventory_filters: Int of inventory filters
+        users, roles: Int of users and roles
+        latency: Float of seconds every response is delayed by
+        rate_limit: Float of requests per second answered before 429s are
+        returned, None to never throttle
+        rate_limit_burst: Int of requests answered at once before throttling
+        error_rate: Float between 0 and 1 of the share of requests failing
+        with a 500
+        seed: Int seeding the dataset and the injected errors
+
+    Attributes:
+        requests: collections.Counter of (method, path) of every request
+        bytes_received: Int of the bytes of every request body
+        bytes_sent: Int of the bytes of every response body
+        endpoint: String URL of the server once started
+    """
+
+    def __init__(self, api_key='simulator-key', api_secret='simulator-secret', sensors=25, scopes=10,
+                 inventory_filters=5, users=2, roles=3, fanout=10, latency=0.0, rate_limit=None,
+                 rate_limit_burst=None, error_rate=0.0, seed=0):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_limit_burst = rate_limit_burst or (int(rate_limit) if rate_limit else 0) or 1
+        self.error_rate = error_rate
+        self.requests = collections.Counter()
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.endpoint = None
+
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._ids = 0
+        self._tokens = float(self.rate_limit_burst)
+        self._tokens_at = time.time()
+        self._injected = []
+        self._server = None
+        self._thread = None
+
+        self.sensor_count = sensors
+        self.deleted_sensors = {}
+        self.scopes = collections.OrderedDict()
+        self.inventory_filters = collections.OrderedDict()
+        self.users = collections.OrderedDict()
+        self.roles = collections.OrderedDict()
+        self.applications = collections.OrderedDict()
+        self.policies = collections.OrderedDict()
+        self.profiles = collections.OrderedDict()
+        self.intents = collections.OrderedDict()
+        self.annotations = {}
+        self._build(scopes, fanout, inventory_filters, users, roles)
+
+    # =========================================================================
+    # Dataset
+
+    def new_id(self):
+        with self._lock:
+            self._ids += 1
+            return '%024x' % (0x5f0000000000000000000000 + self._ids)
+
+    def _build(self, scopes, fanout, inventory_filters, users, roles):
+        root = self._add_scope('Default', None, {'type': 'eq', 'field': 'vrf_id', 'value': 1})
+        scope_ids = [root['id']]
+        for index in range(1, max(scopes, 1)):
+            parent = self.scopes[scope_ids[(index - 1) // fanout]]
+            query = {'type': 'subnet', 'field': 'ip', 'value': '10.%d.%d.0/24' % (index // 256, index % 256)}
+            scope_ids.append(self._add_scope('Scope %d' % index, parent['id'], query)['id'])
+        self.root_scope = root
+        # Software agents are spread over the generated scopes
+        self._sensor_scope_ids = scope_ids
+
+        for index in range(inventory_filters):
+            filter_id = self.new_id()
+            self.inventory_filters[filter_id] = {
+                'id': filter_id,
+                'name': 'Filter %d' % index,
+                'app_scope_id': root['id'],
+                'short_query': {'type': 'eq', 'field': 'host_name', 'value': 'host-%06d' % index},
+                'query': {'type': 'eq', 'field': 'host_name', 'value': 'host-%06d' % index},
+                'primary': False,
+                'public': False,
+            }
+        for index in range(roles):
+            role_id = self.new_id()
+            self.roles[role_id] = {
+                'id': role_id,
+                'name': 'Role %d' % index,
+                'description': '',
+                'app_scope_id': root['id'],
+                'capabilities': [],
+            }
+        for index in range(users):
+            self._create_user({'email': 'user%d@example.com' % index, 'first_name': 'User',
+                               'last_name': str(index), 'app_scope_id': root['id']})
+
+    def _add_scope(self, short_name, parent_id, short_query, **attributes):
+        parent = self.scopes.get(parent_id)
+        scope_id = self.new_id()
+        scope = {
+            'id': scope_id,
+            'short_name': short_name,
+            'name': '%s:%s' % (parent['name'], short_name) if parent else short_name,
+            'description': attributes.get('description'),
+            'parent_app_scope_id': parent_id,
+            'root_app_scope_id': parent['root_app_scope_id'] if parent else scope_id,
+            'child_app_scope_ids': [],
+            'short_query': short_query,
+            'query': short_query,
+            'dirty': bool(attributes.get('dirty')),
+            'dirty_short_query': short_query if attributes.get('dirty') else None,
+            'policy_priority': attributes.get('policy_priority'),
+            'vrf_id': 1,
+        }
+        self.scopes[scope_id] = scope
+        if parent:
+            parent['child_app_scope_ids'].append(scope_id)
+        return scope
+
+    def sensor(self, index):
+        ''' Returns the generated software agent `index` '''
+        scope_id = self._sensor_scope_ids[index % len(self._sensor_scope_ids)]
+        return {
+            'uuid': '%040x' % (index + 1),
+            'host_name': 'host-%06d' % index,
+            'platform': PLATFORMS[index % len(PLATFORMS)],
+            'agent_type': 'ENFORCER' if index % 3 else 'SENSOR',
+            'current_sw_version': '3.6.1.%d' % (index % 5),
+            'created_at': 1600000000 + index,
+            'last_config_fetch_at': 1700000000 + index,
+            'interfaces': [
+                {'name': 'lo', 'ip': '127.0.0.1', 'vrf_id': 1, 'tags_scope_id': []},
+                {'name': 'eth0', 'ip': str(ipaddress.ip_address(0x0a000000 + index + 1)), 'vrf_id': 1,
+                 'mac': '00:50:56:%02x:%02x:%02x' % ((index >> 16) & 255, (index >> 8) & 255, index & 255),
+                 'tags_scope_id': [self.root_scope['id'], scope_id]},
+            ],
+        }
+
+    def _sensor_index(self, uuid):
+        try:
+            index = int(uuid, 16) - 1
+        except ValueError:
+            return None
+        if 0 <= index < self.sensor_count and index not in self.deleted_sensors:
+            return index
+        return None
+
+    def _create_user(self, payload):
+        user_id = self.new_id()
+        self.users[user_id] = {
+            'id': user_id,
+            'email': payload.get('email'),
+            'first_name': payload.get('first_name'),
+            'last_name': payload.get('last_name'),
+            'app_scope_id': payload.get('app_scope_id'),
+            'role_ids': list(payload.get('role_ids') or []),
+            'created_at': int(time.time()),
+            'disabled_at': None,
+        }
+        return self.users[user_id]
+
+    # =========================================================================
+    # Server
+
+    def start(self, host='127.0.0.1', port=0):
+        simulator = self
+
+        class Handler(SimulatorRequestHandler):
+            pass
+
+        Handler.simulator = simulator
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.endpoint = 'http://%s:%d' % self._server.server_address[:2]
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def reset_stats(self):
+        ''' Forgets the requests and bytes counted so far '''
+        with self._lock:
+            self.requests.clear()
+            self.bytes_received = 0
+            self.bytes_sent = 0
+
+    def count_bytes(self, received, sent):
+        with self._lock:
+            self.bytes_received += received
+            self.bytes_sent += sent
+
+    def inject(self, status_code, count=1, path=None, body=None, headers=None):
+        ''' Fails the next `count` requests, of `path` only when given, with `status_code` '''
+        with self._lock:
+            self._injected.append([status_code, count, path, body, headers or {}])
+
+    def _take_token(self):
+        ''' Returns the seconds to wait before a request is answered, 0 when it is '''
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.rate_limit_burst, self._tokens + (now - self._tokens_at) * self.rate_limit)
+            self._tokens_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate_limit
+
+    def _injected_reply(self, path):
+        with self._lock:
+            for injected in self._injected:
+                status_code, count, injected_path, body, headers = injected
+                if injected_path is None or injected_path == path:
+                    injected[1] -= 1
+                    if injected[1] <= 0:
+                        self._injected.remove(injected)
+                    return Reply(body or {'error': 'Injected error'}, status_code, headers=headers)
+            if self.error_rate and self._random.random() < self.error_rate:
+                return Reply({'error': 'Internal Server Error'}, 500)
+        return None
+
+    def verify_signature(self, method, path_url, headers, body):
+        ''' Raises SimulatorError unless the request is signed like RestClient signs it '''
+        if headers.get('Id') != self.api_key:
+            raise SimulatorError(403, {'error': 'Invalid API key'})
+        checksum = headers.get('X-Tetration-Cksum', '')
+        if body and checksum and checksum != hashlib.sha256(body).hexdigest():
+            raise SimulatorError(403, {'error': 'Checksum mismatch'})
+        signer = hmac.new(self.api_secret.encode('utf-8'), digestmod=hashlib.sha256)
+        for part in (method, path_url, checksum, headers.get('Content-Type', ''), headers.get('Timestamp', '')):
+            signer.update((part + '\n').encode('utf-8'))
+        expected = base64.b64encode(signer.digest()).decode('ascii')
+        if not hmac.compare_digest(expected, headers.get('Authorization', '')):
+            raise SimulatorError(403, {'error': 'Invalid signature'})
+
+    def handle(self, method, path_url, headers, body):
+        ''' Answers a request, returns a Reply '''
+        split = urlsplit(path_url)
+        path = split.path
+        self.requests[(method, path)] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        try:
+            self.verify_signature(method, path_url, headers, body)
+            if self.rate_limit:
+                wait = self._take_token()
+                if wait:
+                    return Reply({'error': 'Too Many Requests'}, 429, headers={'Retry-After': '%.3f' % wait})
+            injected = self._injected_reply(path[len(URI_PREFIX):])
+            if injected is not None:
+                return injected
+            if not path.startswith(URI_PREFIX + '/'):
+                raise not_found(path)
+            params = dict((k, v[-1]) for k, v in parse_qs(split.query, keep_blank_values=True).items())
+            with self._lock:
+                return self.route(method, path[len(URI_PREFIX):], params, headers, body)
+        except SimulatorError as exc:
+            return Reply(exc.body, exc.status_code)
+
+    # =========================================================================
+    # Routes
+
+    def route(self, method, path, params, headers, body):
+        segments = [s for s in path.split('/') if s]
+        payload = {}
+        if body and headers.get('Content-Type', '').startswith('application/json'):
+            try:
+                payload = json.loads(body.decode('utf-8'))
+            except ValueError:
+                raise SimulatorError(400, {'error': 'Invalid JSON'})
+        collections_by_route = {
+            tetration_constants.TETRATION_API_INVENTORY_FILTER: self.inventory_filters,
+            tetration_constants.TETRATION_API_ROLE: self.roles,
+            tetration_constants.TETRATION_API_AGENT_CONFIG_PROFILES: self.profiles,
+            tetration_constants.TETRATION_API_AGENT_CONFIG_INTENTS: self.intents,
+        }
+        for route, objects in collections_by_route.items():
+            route_segments = route.strip('/').split('/')
+            if segments[:len(route_segments)] == route_segments:
+                return self._crud(objects, method, segments[len(route_segments):], payload)
+
+        handlers = {
+            'sensors': self._sensors,
+            'app_scopes': self._app_scopes,
+            'users': self._users,
+            'applications': self._applications,
+            'policies': self._policies,
+            'inventory': self._inventory_tags,
+            'assets': self._assets,
+        }
+        if segments and segments[0] in handlers:
+            return handlers[segments[0]](method, segments[1:], params, payload, headers, body)
+        raise not_found(path)
+
+    def _crud(self, objects, method, segments, payload):
+        if not segments:
+            if method == 'GET':
+                return Reply(list(objects.values()))
+            if method == 'POST':
+                object_id = self.new_id()
+                objects[object_id] = dict(payload, id=object_id)
+                return Reply(objects[object_id])
+        elif len(segments) == 1:
+            obj = objects.get(segments[0])
+            if obj is None:
+                raise not_found(segments[0])
+            if method == 'GET':
+                return Reply(obj)
+            if method == 'PUT':
+                obj.update(payload)
+                return Reply(obj)
+            if method == 'DELETE':
+                del objects[segments[0]]
+                return Reply({})
+        elif len(segments) == 2 and method == 'POST' and segments[0] in objects:
+            # e.g. the capabilities of a role
+            obj = objects[segments[0]]
+            obj.setdefault(segments[1], []).append(payload)
+            return Reply(obj)
+        raise SimulatorError(405 if len(segments) < 2 else 404)
+
+    def _sensors(self, method, segments, params, payload, headers, body):
+        if not segments and method == 'GET':
+            limit = min(int(params.get('limit') or DEFAULT_SENSOR_PAGE_SIZE),
+                        tetration_constants.TETRATION_API_MAX_PAGINATION_SIZE)
+            start = int(params.get('offset') or 0)
+            results = []
+            index = start
+            while index < self.sensor_count and len(results) < limit:
+                if index not in self.deleted_sensors:
+                    results.append(self.sensor(index))
+                index += 1
+            page = {'results': results}
+            if index < self.sensor_count:
+                page['offset'] = str(index)
+            return Reply(page)
+        if len(segments) == 1:
+            index = self._sensor_index(segments[0])
+            if index is None:
+                raise not_found(segments[0])
+            if method == 'GET':
+                return Reply(self.sensor(index))
+            if method == 'DELETE':
+                self.deleted_sensors[index] = int(time.time())
+                return Reply({})
+        raise SimulatorError(405)
+
+    def _app_scopes(self, method, segments, params, payload, headers, body):
+        if not segments:
+            if method == 'GET':
+                return Reply(list(self.scopes.values()))
+            if method == 'POST':
+                if payload.get('parent_app_scope_id') not in self.scopes or not payload.get('short_name'):
+                    raise SimulatorError(422, {'error': 'A scope needs a short_name and an existing parent'})
+                scope = self._add_scope(payload['short_name'], payload['parent_app_scope_id'],
+                                        payload.get('short_query'), dirty=True,
+                                        description=payload.get('description'),
+                                        policy_priority=payload.get('policy_priority'))
+                return Reply(scope)
+        elif segments == ['commit_dirty'] and method == 'POST':
+            root_id = payload.get('root_app_scope_id')
+            for scope in self.scopes.values():
+                if scope['root_app_scope_id'] == root_id and scope['dirty']:
+                    scope['query'] = scope['dirty_short_query'] or scope['short_query']
+                    scope['dirty'] = False
+                    scope['dirty_short_query'] = None
+            return Reply({})
+        elif len(segments) == 1:
+            scope = self.scopes.get(segments[0])
+            if scope is None:
+                raise not_found(segments[0])
+            if method == 'GET':
+                return Reply(scope)
+            if method == 'PUT':
+                for key in ('description', 'policy_priority'):
+                    if key in payload:
+                        scope[key] = payload[key]
+                if 'short_query' in payload and payload['short_query'] != scope['short_query']:
+                    scope['short_query'] = payload['short_query']
+                    scope['dirty_short_query'] = payload['short_query']
+                    scope['dirty'] = True
+                if payload.get('short_name') and payload['short_name'] != scope['short_name']:
+                    scope['short_name'] = payload['short_name']
+                    self._rename(scope)
+                return Reply(scope)
+            if method == 'DELETE':
+                if scope['child_app_scope_ids']:
+                    details = [{'key': 'child_app_scope', 'id': i} for i in scope['child_app_scope_ids']]
+                    return Reply({'details': details}, 422)
+                if scope['parent_app_scope_id']:
+                    self.scopes[scope['parent_app_scope_id']]['child_app_scope_ids'].remove(scope['id'])
+                del self.scopes[scope['id']]
+                return Reply({})
+        raise SimulatorError(405)
+
+    def _rename(self, scope):
+        parent = self.scopes.get(scope['parent_app_scope_id'])
+        scope['name'] = '%s:%s' % (parent['name'], scope['short_name']) if parent else scope['short_name']
+        for child_id in scope['child_app_scope_ids']:
+            self._rename(self.scopes[child_id])
+
+    def _active_user(self, user_id):
+        user = self.users.get(user_id)
+        if user is None or user['disabled_at'] is not None:
+            raise not_found(user_id)
+        return user
+
+    def _users(self, method, segments, params, payload, headers, body):
+        if not segments:
+            if method == 'GET':
+                include_disabled = str(params.get('include_disabled', '')).lower() == 'true'
+                return Reply([u for u in self.users.values() if include_disabled or u['disabled_at'] is None])
+            if method == 'POST':
+                for user in self.users.values():
+                    if user['email'] == payload.get('email'):
+                        raise SimulatorError(422 if user['disabled_at'] else 400, {'error': 'User exists'})
+                return Reply(self._create_user(payload))
+        elif len(segments) == 1:
+            user = self._active_user(segments[0])
+            if method == 'GET':
+                return Reply(user)
+            if method == 'PUT':
+                user.update((k, v) for k, v in payload.items() if k in ('email', 'first_name', 'last_name', 'app_scope_id'))
+                return Reply(user)
+            if method == 'DELETE':
+                user['disabled_at'] = int(time.time())
+                return Reply(user)
+        elif len(segments) == 2:
+            if segments[1] == 'enable' and method == 'POST':
+                user = self.users.get(segments[0])
+                if user is None:
+                    raise not_found(segments[0])
+                user['disabled_at'] = None
+                return Reply(user)
+            user = self._active_user(segments[0])
+            if segments[1] == 'add_role' and method == 'PUT':
+                if payload.get('role_id') not in self.roles:
+                    raise not_found(payload.get('role_id'))
+                if payload['role_id'] not in user['role_ids']:
+                    user['role_ids'].append(payload['role_id'])
+                return Reply(user)
+            if segments[1] == 'remove_role' and method == 'DELETE':
+                if payload.get('role_id') in user['role_ids']:
+                    user['role_ids'].remove(payload['role_id'])
+                return Reply(user)
+        raise SimulatorError(405)
+
+    def _application_policies(self, app_id, rank):
+        return [p for p in self.policies.values() if p['application_id'] == app_id and p['rank'] == rank]
+
+    def _applications(self, method, segments, params, payload, headers, body):
+        if not segments:
+            if method == 'GET':
+                return Reply(list(self.applications.values()))
+            if method == 'POST':
+                app_id = self.new_id()
+                policies = {'absolute_policies': 'ABSOLUTE', 'default_policies': 'DEFAULT'}
+                self.applications[app_id] = dict(
+                    (k, v) for k, v in payload.items() if k not in policies)
+                self.applications[app_id].update(id=app_id, version='v1', enforcement_enabled=False)
+                self.applications[app_id].setdefault('catch_all_action', 'DENY')
+                for key, rank in policies.items():
+                    for policy in payload.get(key) or []:
+                        self._add_policy(app_id, dict(policy, rank=rank))
+                return Reply(self.applications[app_id])
+            raise SimulatorError(405)
+
+        app = self.applications.get(segments[0])
+        if app is None:
+            raise not_found(segments[0])
+        action = segments[1] if len(segments) > 1 else None
+        if action is None:
+            if method == 'GET':
+                return Reply(app)
+            if method == 'PUT':
+                app.update((k, v) for k, v in payload.items() if k in ('name', 'description', 'primary'))
+                return Reply(app)
+            if method == 'DELETE':
+                if app['enforcement_enabled']:
+                    raise SimulatorError(422, {'error': 'Enforcement is enabled'})
+                for policy in [p for p in self.policies.values() if p['application_id'] == app['id']]:
+                    del self.policies[policy['id']]
+                del self.applications[app['id']]
+                return Reply({})
+        elif action == 'details' and method == 'GET':
+            return Reply(dict(app, absolute_policies=self._application_policies(app['id'], 'ABSOLUTE'),
+                              default_policies=self._application_policies(app['id'], 'DEFAULT')))
+        elif action in ('absolute_policies', 'default_policies') and method == 'GET':
+            return Reply(self._application_policies(app['id'], action.split('_')[0].upper()))
+        elif action == 'policies' and method == 'POST':
+            return Reply(self._add_policy(app['id'], payload))
+        elif action == 'catch_all' and method == 'PUT':
+            app['catch_all_action'] = payload.get('policy_action', app['catch_all_action'])
+            return Reply(app)
+        elif action in ('enable_enforce', 'disable_enforce') and method == 'POST':
+            app['enforcement_enabled'] = action == 'enable_enforce'
+            return Reply(app)
+        raise SimulatorError(405)
+
+    def _add_policy(self, app_id, payload):
+        for key in ('consumer_filter_id', 'provider_filter_id'):
+            if payload.get(key) not in self.scopes and payload.get(key) not in self.inventory_filters:
+                raise SimulatorError(422, {'error': 'Unknown %s' % key})
+        policy_id = self.new_id()
+        self.policies[policy_id] = {
+            'id': policy_id,
+            'application_id': app_id,
+            'rank': payload.get('rank', 'DEFAULT'),
+            'priority': payload.get('priority', 100),
+            'action': payload.get('policy_action') or payload.get('action') or 'ALLOW',
+            'consumer_filter_id': payload['consumer_filter_id'],
+            'provider_filter_id': payload['provider_filter_id'],
+            'l4_params': [],
+        }
+        for l4_param in payload.get('l4_params') or []:
+            self._add_l4_param(self.policies[policy_id], l4_param)
+        return self.policies[policy_id]
+
+    def _add_l4_param(self, policy, payload):
+        l4_param = {'id': self.new_id(), 'proto': payload.get('proto'), 'description': payload.get('description')}
+        if payload.get('start_port') is not None:
+            l4_param['port'] = [payload['start_port'], payload.get('end_port', payload['start_port'])]
+        elif payload.get('port'):
+            l4_param['port'] = list(payload['port'])
+        policy['l4_params'].append(l4_param)
+        return l4_param
+
+    def _policies(self, method, segments, params, payload, headers, body):
+        policy = self.policies.get(segments[0]) if segments else None
+        if policy is None:
+            raise not_found(segments[0] if segments else '')
+        if len(segments) == 1:
+            if method == 'GET':
+                return Reply(policy)
+            if method == 'PUT':
+                if 'policy_action' in payload:
+                    payload = dict(payload, action=payload.pop('policy_action'))
+                policy.update((k, v) for k, v in payload.items()
+                              if k in ('priority', 'action', 'consumer_filter_id', 'provider_filter_id'))
+                return Reply(policy)
+            if method == 'DELETE':
+                del self.policies[policy['id']]
+                return Reply({})
+        elif segments[1] == 'l4_params':
+            if len(segments) == 2 and method == 'POST':
+                return Reply(self._add_l4_param(policy, payload))
+            if len(segments) == 3 and method == 'DELETE':
+                remaining = [p for p in policy['l4_params'] if p['id'] != segments[2]]
+                if len(remaining) == len(policy['l4_params']):
+                    raise not_found(segments[2])
+                policy['l4_params'] = remaining
+                return Reply({})
+        raise SimulatorError(405)
+
+    # =========================================================================
+    # Annotations
+
+    def _annotation_key(self, ip):
+        try:
+            network = ipaddress.ip_network(ip, strict=False)
+        except ValueError:
+            raise SimulatorError(400, {'error': 'Invalid IP %s' % ip})
+        return str(network.network_address) if network.num_addresses == 1 else str(network)
+
+    def _root_annotations(self, root_scope_name):
+        if root_scope_name not in [s['name'] for s in self.scopes.values() if not s['parent_app_scope_id']]:
+            raise not_found(root_scope_name)
+        return self.annotations.setdefault(root_scope_name, collections.OrderedDict())
+
+    def _inventory_tags(self, method, segments, params, payload, headers, body):
+        if len(segments) < 2 or segments[0] != 'tags':
+            raise not_found('/'.join(segments))
+        annotations = self._root_annotations(segments[1])
+        if len(segments) == 3 and segments[2] == 'search' and method == 'GET':
+            subnet = ipaddress.ip_network(params.get('ip', ''), strict=False)
+            found = []
+            for key, attributes in annotations.items():
+                network = ipaddress.ip_network(key)
+                if network.version == subnet.version and network.subnet_of(subnet):
+                    found.append({'ip': key, 'attributes': attributes})
+            return Reply(found)
+        if len(segments) != 2:
+            raise SimulatorError(405)
+        if method == 'GET':
+            return Reply(annotations.get(self._annotation_key(params.get('ip', '')), {}))
+        key = self._annotation_key(payload.get('ip', ''))
+        if method == 'POST':
+            annotations[key] = dict(payload.get('attributes') or {})
+            return Reply({})
+        if method == 'DELETE':
+            annotations.pop(key, None)
+            return Reply({})
+        raise SimulatorError(405)
+
+    def _assets(self, method, segments, params, payload, headers, body):
+        if len(segments) != 3 or segments[0] != 'cmdb':
+            raise not_found('/'.join(segments))
+        annotations = self._root_annotations(segments[2])
+        columns = []
+        for attributes in annotations.values():
+            columns.extend(c for c in attributes if c not in columns)
+        if segments[1] == 'attributenames' and method == 'GET':
+            return Reply(columns)
+        if segments[1] == 'download' and method == 'GET':
+            out = io.StringIO()
+            writer = csv.writer(out)
+            writer.writerow(['IP', 'VRF'] + columns)
+            for key, attributes in annotations.items():
+                writer.writerow([key, 'Default'] + [attributes.get(c, '') for c in columns])
+            return Reply(out.getvalue().encode('utf-8'), content_type='text/csv')
+        if segments[1] == 'upload' and method == 'POST':
+            fields, csv_data = parse_multipart(headers.get('Content-Type', ''), body)
+            operation = fields.get('X-Tetration-Oper', 'add')
+            if operation not in tetration_constants.TETRATION_API_INVENTORY_TAG_UPLOAD_OPERATIONS:
+                raise SimulatorError(400, {'error': 'Invalid operation %s' % operation})
+            reader = csv.reader(io.StringIO(csv_data.decode('utf-8')))
+            header = next(reader, [])
+            names = [c.strip().lower() for c in header]
+            if 'ip' not in names:
+                raise SimulatorError(400, {'error': 'The CSV has no IP column'})
+            ip_index = names.index('ip')
+            value_columns = [(i, c) for i, c in enumerate(header) if names[i] not in ('ip', 'vrf')]
+            for row in reader:
+                if not row:
+                    continue
+                key = self._annotation_key(row[ip_index])
+                values = dict((c, row[i]) for i, c in value_columns if i < len(row) and row[i] != '')
+                if operation == 'delete':
+                    annotations.pop(key, None)
+                elif operation == 'merge':
+                    annotations.setdefault(key, {}).update(values)
+                else:
+                    annotations[key] = values
+            return Reply({'warnings': []})
+        raise SimulatorError(405)
+
+
+def parse_multipart(content_type, body):
+    ''' Returns the form fields and the file of a multipart body as built by RestClient.upload '''
+    boundary = content_type.split('boundary=')[-1].strip().encode('utf-8')
+    fields = {}
+    file_data = b''
+    for part in body.split(b'--' + boundary):
+        if b'\r\n\r\n' not in part:
+            continue
+        head, data = part.split(b'\r\n\r\n', 1)
+        if data.endswith(b'\r\n'):
+            data = data[:-2]
+        disposition = head.decode('utf-8')
+        name = disposition.split('name="', 1)[1].split('"', 1)[0]
+        if 'filename="' in disposition:
+            file_data = data
+        else:
+            fields[name] = data.decode('utf-8')
+    return fields, file_data
+
+
+class SimulatorRequestHandler(BaseHTTPRequestHandler):
+    ''' Hands every request to the TetrationSimulator set as `simulator` '''
+
+    simulator = None
+    protocol_version = 'HTTP/1.1'
+    # The headers and the body are written separately, with Nagle's algorithm
+    # every response would wait for the delayed ACK of the client
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _dispatch(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        reply = self.simulator.handle(self.command, self.path, self.headers, body)
+        data = reply.encoded()
+        self.simulator.count_bytes(len(body), len(data))
+        self.send_response(reply.status_code)
+        self.send_header('Content-Type', reply.content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in reply.headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_PATCH = _dispatch
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serves an offline Tetration OpenAPI')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8899)
+    parser.add_argument('--api-key', default='simulator-key')
+    parser.add_argument('--api-secret', default='simulator-secret')
+    parser.add_argument('--sensors', type=int, default=25)
+    parser.add_argument('--scopes', type=int, default=10)
+    parser.add_argument('--inventory-filters', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    simulator = TetrationSimulator(
+        api_key=args.api_key, api_secret=args.api_secret, sensors=args.sensors, scopes=args.scopes,
+        inventory_filters=args.inventory_filters, latency=args.latency, rate_limit=args.rate_limit,
+        error_rate=args.error_rate)
+    simulator.start(args.host, args.port)
+    print('Serving on %s, TETRATION_API_KEY=%s TETRATION_API_SECRET=%s' % (
+        simulator.endpoint, args.api_key, args.api_secret))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == '__main__':
+    main()